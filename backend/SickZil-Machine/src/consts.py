@@ -25,28 +25,11 @@ PREV_MASKDIR = 'prev_' + MASKDIR
 TF_CPP_MIN_LOG_LEVEL = '3'
 SNETPATH = os.path.abspath(os.path.join(BASE_DIR, "../resource/snet/snet-0.1.0.pb"))
 CNETPATH = os.path.abspath(os.path.join(BASE_DIR, "../resource/cnet/cnet-0.1.0.pb"))
-#TODO: it.. has.. some... smell...
-def model_name(mpath, version):
-    return {
-        '0.1.0': 'snet' if mpath == SNETPATH else ''
-    }[version]
-
-def snet_in(version, sess):
-    return {
-        '0.1.0': sess.graph.get_tensor_by_name('input_1:0')  # Correct input tensor name
-    }[version]
-def snet_out(version, sess):
-    return {
-        '0.1.0': sess.graph.get_tensor_by_name('conv2d_19/truediv:0')
-    }[version]
-def cnet_in(version, sess):
-    return {
-        '0.1.0': sess.graph.get_tensor_by_name('INPUT:0')
-    }[version]
-def cnet_out(version, sess):
-    return {
-        '0.1.0': sess.graph.get_tensor_by_name('OUTPUT:0')
-    }[version]
+SNET_ONNX_PATH = os.path.abspath(os.path.join(BASE_DIR, "../resource/snet/snet-0.1.0.onnx"))
+CNET_ONNX_PATH = os.path.abspath(os.path.join(BASE_DIR, "../resource/cnet/cnet-0.1.0.onnx"))
+# (input, output) tensor names of the 0.1.0 graphs
+SNET_IO = ('input_1:0', 'conv2d_19/truediv:0')
+CNET_IO = ('INPUT:0', 'OUTPUT:0')
 
 # open_project(TYPE)s
 FLAT_IMGDIR = 'flat_imgdir'
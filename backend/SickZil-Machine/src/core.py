@@ -1,7 +1,12 @@
 # core.py (in SickZil-Machine/src/core.py)
 import os
+import json
+import time
+import threading
+from collections import Counter
 import consts
-import tensorflow as tf
+import engines
+import precision_gate
 import numpy as np
 import utils.imutils as iu
 import utils.fp as fp
@@ -9,128 +14,610 @@ import utils.fp as fp
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = consts.TF_CPP_MIN_LOG_LEVEL
 
 # ------------------------------------------------------------------
-# SINGLE GLOBAL SESSION (No 'with Session()' calls for segmap/inpaint)
+# NETS: SNET and CNET are each loaded by the selected engine (see
+# engines.py) on first use, so a mask-only process never loads CNET.
 # ------------------------------------------------------------------
-_global_sess = None   # Our single TF session
-_snet_in = None
-_snet_out = None
-_cnet_in = None
-_cnet_out = None
+engine = 'tf'
+precision = 'fp32'  # 'fp16'/'int8' use reduced precision models, see precision_gate.py
+_snet = None
+_cnet = None
+_load_lock = threading.Lock()
+load_times = {}  # 'snet'/'cnet' -> seconds spent loading
 
-# For big images
+# Prune graphs to their input->output subgraph and drop training-only
+# nodes (tf), or keep ONNX Runtime's optimized model (onnx). The optimized
+# graph is cached in graph_cache_dir if set.
+optimize_graphs = False
+graph_cache_dir = None
+
+# For big images: largest pixel count each net runs in one piece.
 seg_limit = 4000000
 compl_limit = 657666
+limits_path = None
+
+# An OOM lowers the limit of that net below the failing size. The lowered
+# limit is saved to `limits_path` so later runs start from it, but it decays:
+# after `reprobe_after` runs that fit, the configured limit is tried again
+# (and saved), so a transient OOM doesn't shrink the limit for good.
+reprobe_after = 50
+_oom_limits = {'seg': None, 'compl': None}
+_fits_since_oom = {'seg': 0, 'compl': 0}
+
+# Memory-budget mode: if set (bytes), pages are split up front so that
+# pixels * bytes_per_pixel stays within the budget, instead of waiting for
+# an OOM. The defaults assume the original static limits fit in 4GiB.
+memory_budget = None
+seg_bytes_per_pixel = 4 * 2**30 // 4000000
+compl_bytes_per_pixel = 4 * 2**30 // 657666
+
+# For full-resolution pages: side of the square tiles fed to the nets
+# (0 = no tiling) and how many pixels neighbouring tiles share.
+tile_size = 0
+tile_overlap = 64
 
 def set_limits(slimit, climit):
     global seg_limit, compl_limit
     seg_limit = slimit
     compl_limit = climit
 
+def load_limits(path):
+    '''
+    Persist learned limits in `path` (json). If it already exists,
+    its limits replace the current ones.
+    '''
+    global limits_path
+    limits_path = path
+    if os.path.exists(path):
+        with open(path) as f:
+            limits = json.load(f)
+        set_limits(limits.get('seg_limit', seg_limit),
+                   limits.get('compl_limit', compl_limit))
+        for net, lowered in limits.get('oom_limits', {}).items():
+            if net in _oom_limits:
+                _oom_limits[net] = lowered
+                _fits_since_oom[net] = 0
+
+def save_limits():
+    if limits_path is None:
+        return
+    tmp_path = f'{limits_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'seg_limit': seg_limit, 'compl_limit': compl_limit,
+                   'oom_limits': _oom_limits}, f)
+    os.replace(tmp_path, limits_path)
+
+def ran_out_of_memory(net, pixels):
+    ''' `net` ('seg'/'compl') failed on `pixels`: run less than that until re-probed '''
+    lowered = _oom_limits[net]
+    _oom_limits[net] = pixels if lowered is None else min(lowered, pixels)
+    _fits_since_oom[net] = 0
+    if _oom_limits[net] != lowered:
+        save_limits()
+
+def ran_fine(net):
+    if _oom_limits[net] is None:
+        return
+    _fits_since_oom[net] += 1
+    if _fits_since_oom[net] >= reprobe_after:
+        _oom_limits[net] = None
+        save_limits()
+
+def reset_oom_limits():
+    for net in _oom_limits:
+        _oom_limits[net] = None
+        _fits_since_oom[net] = 0
+
+def set_memory_budget(budget, seg_bpp=None, compl_bpp=None):
+    ''' budget in bytes (None = off), optionally with bytes per pixel of each net '''
+    global memory_budget, seg_bytes_per_pixel, compl_bytes_per_pixel
+    memory_budget = budget
+    seg_bytes_per_pixel = seg_bpp or seg_bytes_per_pixel
+    compl_bytes_per_pixel = compl_bpp or compl_bytes_per_pixel
+
+def _pixel_limit(limit, lowered, bytes_per_pixel):
+    if lowered is not None:
+        limit = min(limit, lowered)
+    if memory_budget is None:
+        return limit
+    return min(limit, memory_budget // bytes_per_pixel)
+
+def seg_pixel_limit():
+    return _pixel_limit(seg_limit, _oom_limits['seg'], seg_bytes_per_pixel)
+
+def compl_pixel_limit():
+    return _pixel_limit(compl_limit, _oom_limits['compl'], compl_bytes_per_pixel)
+
+is_oom = engines.is_oom
+
+# For chapters: images fed to one sess.run and bytes of (float32) net input one batch may use
+batch_size = 4
+batch_memory = 512 * 2**20
+
+def set_batching(size, memory=512 * 2**20):
+    global batch_size, batch_memory
+    batch_size = size
+    batch_memory = memory
+
+# Canonical sizes (multiples of 16) that net input heights/widths are padded up to,
+# so a long run reuses a few input shapes instead of one per page size.
+shape_buckets = ()
+_bucket_stats = Counter()
+_buffers = threading.local()  # per-thread reusable input buffers of bucket shapes
+
+def set_buckets(sizes):
+    global shape_buckets
+    assert all(size % 16 == 0 for size in sizes), sizes
+    shape_buckets = tuple(sorted(sizes))
+    _buffers.__dict__.clear()
+
+def bucket_stats(counts=None):
+    '''
+    Bucket hit rates and how many net input pixels were padding, of this
+    process or of `counts` (stats_counts()['buckets'], e.g. merged from workers)
+    '''
+    stats = Counter(stats_counts()['buckets'] if counts is None else counts)
+    pixels, padded = stats['pixels'], stats['padded_pixels']
+    inputs = stats['hits'] + stats['misses']
+    return {
+        'hits': stats['hits'],
+        'misses': stats['misses'],
+        'hit_rate': stats['hits'] / inputs if inputs else 0.0,
+        'per_bucket': {'%dx%d' % k[1]: v for k, v in stats.items()
+                       if isinstance(k, tuple) and k[0] == 'bucket'},
+        'padding_waste': (padded - pixels) / padded if padded else 0.0,
+    }
+
+def reset_bucket_stats():
+    with _stats_lock:
+        _bucket_stats.clear()
+
+# Check net inputs are within 0~1 after conversion (a full scan per page)
+debug_checks = False
+
+def set_debug_checks(on):
+    global debug_checks
+    debug_checks = on
+
+# ROI inpainting: CNET only runs on boxes around masked regions, grown by
+# roi_margin pixels of context and merged when closer than roi_merge_gap.
+# Pages whose boxes cover more than roi_max_fraction are inpainted whole.
+roi_mode = False
+roi_margin = 32
+roi_merge_gap = 16
+roi_max_fraction = 0.5
+_roi_stats = Counter()
+_stats_lock = threading.Lock()  # guards _bucket_stats and _roi_stats
+
+def set_roi(on, margin=32, merge_gap=16, max_fraction=0.5):
+    global roi_mode, roi_margin, roi_merge_gap, roi_max_fraction
+    roi_mode = on
+    roi_margin = margin
+    roi_merge_gap = merge_gap
+    roi_max_fraction = max_fraction
+
+def roi_stats(counts=None):
+    ''' How many page pixels CNET got to see in ROI mode (see bucket_stats for `counts`) '''
+    stats = Counter(stats_counts()['roi'] if counts is None else counts)
+    page, fed = stats['page_pixels'], stats['cnet_pixels']
+    return {
+        'pages': stats['pages'],
+        'boxes': stats['boxes'],
+        'cnet_fraction': fed / page if page else 0.0,
+    }
+
+def stats_counts():
+    ''' Raw bucket and ROI counters of this process, which add up across processes '''
+    with _stats_lock:
+        return {'buckets': dict(_bucket_stats), 'roi': dict(_roi_stats)}
+
+def merge_stats_counts(counts_list):
+    ''' Sum of several stats_counts(), e.g. one per inference worker '''
+    merged = {'buckets': Counter(), 'roi': Counter()}
+    for counts in counts_list:
+        for kind in merged:
+            merged[kind].update(counts[kind])
+    return {kind: dict(counter) for kind, counter in merged.items()}
+
+def set_tiling(size, overlap=64):
+    global tile_size, tile_overlap
+    assert size == 0 or size > 2 * overlap, (size, overlap)
+    tile_size = size
+    tile_overlap = overlap
+
+# Engine configuration, applied when a net is loaded.
+# 0 threads lets the runtime size the pools; cpus = ids this process is pinned
+# to (empty = no pinning); graph_optimizations toggles the runtime's graph rewrites.
+intra_op_threads = 0
+inter_op_threads = 0
+cpus = ()
+graph_optimizations = True
+
+def set_session_config(intra_op=0, inter_op=0, cpu_ids=(), optimize=True):
+    global intra_op_threads, inter_op_threads, cpus, graph_optimizations
+    intra_op_threads = intra_op
+    inter_op_threads = inter_op
+    cpus = tuple(cpu_ids)
+    graph_optimizations = optimize
+
+def parse_cpus(spec):
+    ''' '0-3,6' -> [0,1,2,3,6] '''
+    ids = []
+    for part in str(spec).split(','):
+        part = part.strip()
+        if '-' in part:
+            beg, end = map(int, part.split('-'))
+            ids.extend(range(beg, end + 1))
+        elif part:
+            ids.append(int(part))
+    return ids
+
+def set_cpu_affinity(cpu_ids):
+    ''' Pin this process to `cpu_ids`; only Linux has sched_setaffinity '''
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpu_ids)
+    else:
+        print('CPU affinity is not supported on this platform, ignoring cpus %s' % list(cpu_ids))
+
+def set_graph_loading(optimize=False, cache_dir=None):
+    global optimize_graphs, graph_cache_dir
+    optimize_graphs = optimize
+    graph_cache_dir = cache_dir
+
+def set_engine(name):
+    ''' 'tf', 'onnx' or 'stub'; applies to nets loaded after this '''
+    global engine
+    assert name in engines.ENGINES, name
+    engine = name
+
+def set_precision(name, report_path=precision_gate.REPORT_PATH,
+                  min_iou=precision_gate.MIN_MASK_IOU, min_psnr=precision_gate.MIN_INPAINT_PSNR):
+    '''
+    Use reduced precision models for nets loaded after this, if their
+    evaluation report passes the thresholds. Returns the precision in use.
+    '''
+    global precision
+    assert name in engines.PRECISIONS, name
+    ok, reason = precision_gate.check(name, engine, report_path, min_iou, min_psnr)
+    if not ok:
+        print('Not using %s inference: %s' % (name, reason))
+        name = 'fp32'
+    precision = name
+    return precision
+
+def engine_settings():
+    return {
+        'precision': precision,
+        'intra_op_threads': intra_op_threads,
+        'inter_op_threads': inter_op_threads,
+        'graph_optimizations': graph_optimizations,
+        'optimize_graphs': optimize_graphs,
+        'graph_cache_dir': graph_cache_dir,
+    }
+
+def load_net(name):
+    ''' Load net `name` ('snet'/'cnet') with the selected engine '''
+    start = time.perf_counter()
+    if cpus:
+        set_cpu_affinity(cpus)
+    net = engines.create(engine, name, engine_settings())
+    load_times[name] = time.perf_counter() - start
+    print('Loaded %s (%s, %s) in %.2fs: %s' % (name, engine, precision, load_times[name], net.describe()))
+    return net
+
+def init_snet():
+    global _snet
+    with _load_lock:
+        if _snet is None:
+            _snet = load_net('snet')
+
+def init_cnet():
+    global _cnet
+    with _load_lock:
+        if _cnet is None:
+            _cnet = load_net('cnet')
+
 def init_global_session():
+    ''' Load both nets (each is also loaded on first use) '''
+    init_snet()
+    init_cnet()
+
+def close_global_session():
+    ''' Close the nets so the next load uses the current engine and config '''
+    global _snet, _cnet
+    with _load_lock:
+        for net in (_snet, _cnet):
+            if net is not None:
+                net.close()
+        _snet = _cnet = None
+
+def warmup(h=64, w=64, inpaint=True):
     """
-    Creates exactly one global session and imports both SNET and CNET models
-    with no prefix. That way, we can reference 'input_1:0'.
+    Run one dummy inference through SNET (and CNET if `inpaint`) so the first
+    real page doesn't pay for session initialization and kernel setup.
     """
-    global _global_sess, _snet_in, _snet_out, _cnet_in, _cnet_out
-    if _global_sess is not None:
-        return  # Already initialized
-
-    print("DEBUG: Initializing global TF session in core.py")
-    _global_sess = tf.compat.v1.Session()
-
-    # Force model_name to return no prefix
-    def no_prefix(mpath, version):
-        return ''
-    consts.model_name = no_prefix
-
-    # --- Import the segmentation model into this session ---
-    with _global_sess.graph.as_default():
-        graph_def = tf.compat.v1.GraphDef()
-        with tf.io.gfile.GFile(consts.SNETPATH, 'rb') as f:
-            graph_def.ParseFromString(f.read())
-            tf.import_graph_def(graph_def, name='')  # no prefix
-    # Now we can resolve snet_in, snet_out
-    _snet_in  = consts.snet_in('0.1.0', _global_sess)
-    _snet_out = consts.snet_out('0.1.0', _global_sess)
-
-    # --- Import the completion model into the same session ---
-    with _global_sess.graph.as_default():
-        graph_def2 = tf.compat.v1.GraphDef()
-        with tf.io.gfile.GFile(consts.CNETPATH, 'rb') as f:
-            graph_def2.ParseFromString(f.read())
-            tf.import_graph_def(graph_def2, name='')  # no prefix
-    # Now we can resolve cnet_in, cnet_out
-    _cnet_in  = consts.cnet_in('0.1.0', _global_sess)
-    _cnet_out = consts.cnet_out('0.1.0', _global_sess)
-
-    # Optional: print out all ops to confirm we have "input_1"
-    ops = [op.name for op in _global_sess.graph.get_operations()]
-    print("DEBUG: All ops in the global graph:")
-    for name in ops:
-        print(" ", name)
-    print("DEBUG: End of ops list")
+    dummy = np.zeros((h, w, 3), dtype=np.uint8)
+    mask = segmap(dummy)
+    if inpaint:
+        inpainted(dummy, mask)
+
+
+# -------------------------------------------------------------------------
+# TILING
+# -------------------------------------------------------------------------
+def tile_spans(length, size, overlap):
+    ''' [(start, end) ..] covering 0~length with tiles sharing `overlap` pixels '''
+    if length <= size:
+        return [(0, length)]
+    stride = size - overlap
+    starts = list(range(0, length - size, stride)) + [length - size]
+    return [(s, s + size) for s in starts]
+
+def blend_ramp(length, overlap, ramp_start, ramp_end):
+    ''' 1d weights: linear ramps of `overlap` px on the sides shared with other tiles '''
+    ramp = np.ones(length, dtype=np.float32)
+    n = min(overlap, length)
+    if n > 0:
+        up = np.arange(1, n + 1, dtype=np.float32) / (n + 1)
+        if ramp_start:
+            ramp[:n] = np.minimum(ramp[:n], up)
+        if ramp_end:
+            ramp[-n:] = np.minimum(ramp[-n:], up[::-1])
+    return ramp
+
+def tiled(net, imgs, size, overlap):
+    '''
+    Run `net(*crops)` on overlapping size x size tiles of `imgs`
+    (images of the same height/width) and blend the outputs back together.
+    Overlaps are cross-faded with linear weights, so there are no seams.
+    Memory is bounded by one tile plus the float32 output accumulator.
+    '''
+    h, w = imgs[0].shape[:2]
+    ys = tile_spans(h, size, overlap)
+    xs = tile_spans(w, size, overlap)
+    out = weights = None
+    for y0, y1 in ys:
+        wy = blend_ramp(y1 - y0, overlap, y0 > 0, y1 < h)
+        for x0, x1 in xs:
+            wx = blend_ramp(x1 - x0, overlap, x0 > 0, x1 < w)
+            tile_out = net(*[img[y0:y1, x0:x1] for img in imgs])
+            if out is None:
+                out_dtype = tile_out.dtype
+                out = np.zeros((h, w) + tile_out.shape[2:], dtype=np.float32)
+                weights = np.zeros((h, w), dtype=np.float32)
+            weight = np.outer(wy, wx)
+            out[y0:y1, x0:x1] += tile_out * (weight if tile_out.ndim == 2 else weight[..., None])
+            weights[y0:y1, x0:x1] += weight
+    out /= (weights if out.ndim == 2 else weights[..., None])
+    if np.issubdtype(out_dtype, np.integer):
+        out = np.rint(out)
+    return out.astype(out_dtype)
 
+# -------------------------------------------------------------------------
+# PADDING
+# -------------------------------------------------------------------------
+def padded_size(length, modulo):
+    ''' Smallest bucket >= length, or the next multiple of modulo if none fits '''
+    for size in shape_buckets:
+        if size >= length:
+            return size
+    return length + (modulo - length % modulo) % modulo
+
+def padded_shape(h, w, modulo):
+    return padded_size(h, modulo), padded_size(w, modulo)
+
+def input_buffer(shape, dtype, reuse):
+    ''' Per-thread reusable buffer if `reuse` (bucket shapes), a fresh one otherwise '''
+    if not reuse:
+        return np.empty(shape, dtype)
+    key = (shape, np.dtype(dtype).str)
+    buf = _buffers.__dict__.get(key)
+    if buf is None:
+        buf = _buffers.__dict__[key] = np.empty(shape, dtype)
+    return buf
+
+def padded_batch(pages, modulo, normalize=False):
+    '''
+    Net input batch: each page is a tuple of same-size images that are
+    reflect-padded to the page's bucket shape and placed side by side
+    (CNET takes image|segmap). All pages must share one padded shape.
+    If normalize, uint8 pages become float32 (0. ~ 1.) in the same pass.
+    The returned array may be a reused buffer: consume it before the next call.
+    '''
+    h, w = pages[0][0].shape[:2]
+    H, W = padded_shape(h, w, modulo)
+    first = pages[0][0]
+    channels = first.shape[2:]
+    dtype = np.float32 if normalize else first.dtype
+    bucketed = H in shape_buckets and W in shape_buckets
+    bat = input_buffer((len(pages), H, W * len(pages[0])) + channels, dtype, bucketed)
+    for k, imgs in enumerate(pages):
+        h, w = imgs[0].shape[:2]
+        assert padded_shape(h, w, modulo) == (H, W)
+        for j, img in enumerate(imgs):
+            iu.pad_into(bat[k, :, j*W:(j+1)*W], img, normalize)
+        if normalize and debug_checks:
+            assert_img_range(bat[k])
+
+        with _stats_lock:
+            _bucket_stats['hits' if bucketed else 'misses'] += 1
+            if bucketed:
+                _bucket_stats[('bucket', (H, W))] += 1
+            _bucket_stats['pixels'] += h * w
+            _bucket_stats['padded_pixels'] += H * W
+    return bat
+
+# -------------------------------------------------------------------------
+# BATCHING
+# -------------------------------------------------------------------------
+def windows(iterable, n):
+    ''' Consume `iterable` in lists of up to n items '''
+    window = []
+    for x in iterable:
+        window.append(x)
+        if len(window) == n:
+            yield window
+            window = []
+    if window:
+        yield window
+
+def batched(idxs, key, cost, size, memory):
+    '''
+    Group `idxs` with the same key(idx) into batches of at most `size`
+    items whose total cost(idx) stays within `memory` (a single item
+    always gets a batch even if it alone exceeds it).
+    '''
+    groups = {}
+    for i in idxs:
+        groups.setdefault(key(i), []).append(i)
+    batches = []
+    for group in groups.values():
+        batch, used = [], 0
+        for i in group:
+            c = cost(i)
+            if batch and (len(batch) == size or used + c > memory):
+                batches.append(batch)
+                batch, used = [], 0
+            batch.append(i)
+            used += c
+        batches.append(batch)
+    return batches
+
+def too_big(h, w, limit):
+    ''' True if the page must go through tiling or splitting instead of a batch '''
+    return (tile_size and max(h, w) > tile_size) or h*w >= limit
 
 # -------------------------------------------------------------------------
 # SEGMENTATION
 # -------------------------------------------------------------------------
-def segment_or_oom(segnet, inp, modulo=16):
+def segment_or_oom(segnet, inp, modulo=16, normalize=False):
     """If image is too big, return None."""
     h, w = inp.shape[:2]
-    img = iu.modulo_padded(inp, modulo)
-    img_bat = np.expand_dims(img, 0)
-    segmap_result = segnet(img_bat)  # calls sess.run(...)
+    try:
+        img_bat = padded_batch([(inp,)], modulo, normalize)
+        segmap_result = segnet(img_bat)  # calls sess.run(...)
+    except Exception as e:
+        if not is_oom(e):
+            raise
+        return None
     segmap_result = np.squeeze(segmap_result[:,:h,:w,:], 0)
     return segmap_result
 
-def segment(segnet, inp, modulo=16):
-    """Segment the image. If too large, split it."""
-    global seg_limit
+def segment(segnet, inp, modulo=16, normalize=False):
+    """
+    Segment the image. If too large, split it.
+    normalize: inp is uint8, convert it to float32 (0. ~ 1.) on the way into the net.
+    """
     h, w = inp.shape[:2]
+    if tile_size and max(h, w) > tile_size:
+        return tiled(lambda tile: segment(segnet, tile, modulo, normalize),
+                     [inp], tile_size, tile_overlap)
     result = None
-    if h*w < seg_limit:
-        result = segment_or_oom(segnet, inp, modulo)
+    if h*w < seg_pixel_limit():
+        result = segment_or_oom(segnet, inp, modulo, normalize)
         if result is None:
-            seg_limit = h*w
+            ran_out_of_memory('seg', h*w)
+        else:
+            ran_fine('seg')
     if result is None:  # fallback if OOM
         if h > w:
-            upper  = segment(segnet, inp[:h//2,:], modulo)
-            lower  = segment(segnet, inp[h//2:,:], modulo)
+            upper  = segment(segnet, inp[:h//2,:], modulo, normalize)
+            lower  = segment(segnet, inp[h//2:,:], modulo, normalize)
             return np.concatenate((upper, lower), axis=0)
         else:
-            left  = segment(segnet, inp[:,:w//2], modulo)
-            right = segment(segnet, inp[:,w//2:], modulo)
+            left  = segment(segnet, inp[:,:w//2], modulo, normalize)
+            right = segment(segnet, inp[:,w//2:], modulo, normalize)
             return np.concatenate((left, right), axis=1)
     return result
 
+def segment_batch(segnet, inps, modulo=16, normalize=False):
+    '''
+    Segment several images, calling segnet once per batch of images with
+    the same padded shape. Pages too big for a batch go through segment.
+    '''
+    results = [None] * len(inps)
+    direct = []
+    for i, inp in enumerate(inps):
+        h, w = inp.shape[:2]
+        if too_big(h, w, seg_pixel_limit()):
+            results[i] = segment(segnet, inp, modulo, normalize)
+        else:
+            direct.append(i)
+
+    def shape(i):
+        return padded_shape(*inps[i].shape[:2], modulo)
+    for bat in batched(direct, shape, lambda i: np.prod(shape(i)) * 3 * 4,
+                       batch_size, batch_memory):
+        try:
+            out = segnet(padded_batch([(inps[i],) for i in bat], modulo, normalize))
+        except Exception as e:
+            if not is_oom(e):
+                raise
+            # The batch didn't fit: fall back to one page at a time
+            for i in bat:
+                results[i] = segment(segnet, inps[i], modulo, normalize)
+            continue
+        ran_fine('seg')
+        for k, i in enumerate(bat):
+            h, w = inps[i].shape[:2]
+            results[i] = out[k, :h, :w, :]
+    return results
+
+def assert_img_range(img):
+    # Must be [0..1] for the net
+    assert (img >= 0.0).all(), img.min()
+    assert (img <= 1.0).all(), img.max()
+    return img
+
+def decategorize(mask):
+    return iu.decategorize(mask, iu.rgb2wk_map)
+
+def snet(img_bat):
+    return _snet.run(img_bat)
+
+# uint8 -> float32 conversion (and range checks in debug mode) happens
+# while padding into the net input buffer, see padded_batch.
+segmap_input = iu.channel3img
+def segmask_output(seg, out=None):
+    ''' snet class scores -> single channel uint8 mask (text=255) '''
+    return iu.argmax_lut(seg, iu.rgb2wk_lut, out)
+
+segmap_output = fp.pipe(segmask_output, iu.channel3img)
+
+def segmask(image, out=None):
+    """
+    Like segmap, but returns the (h,w) uint8 mask (text=255, background=0),
+    written into `out` if given.
+    """
+    init_snet()
+    return segmask_output(segment(snet, segmap_input(image), normalize=True), out)
+
 def segmap(image):
     """
     Returns a uint8 mask image (background=black).
-    If 'image' is not float32 or 3 channels, convert it.
+    'image' is uint8; it becomes 3 channel float32 on its way into the net.
     """
-    init_global_session()  # ensure the single session is ready
-
-    def assert_img_range(img):
-        # Must be [0..1] for the net
-        assert (img >= 0.0).all(), img.min()
-        assert (img <= 1.0).all(), img.max()
-        return img
-
-    def decategorize(mask):
-        return iu.decategorize(mask, iu.rgb2wk_map)
-
-    # snet is a local function that calls sess.run(_snet_out, feed_dict=...)
-    def snet(img_bat):
-        return _global_sess.run(_snet_out, feed_dict={_snet_in: img_bat})
+    init_snet()
 
     return fp.go(
         image,
-        iu.channel3img, iu.float32,
-        assert_img_range,
-        lambda img: segment(snet, img),
-        iu.map_max_row, decategorize, iu.uint8
+        segmap_input,
+        lambda img: segment(snet, img, normalize=True),
+        segmap_output
     )
 
+def segmaps(images):
+    """
+    segmap for many images (e.g. a chapter), batching compatible pages into
+    one sess.run. Yields masks in the order of `images`, reading at most
+    batch_size * 4 images ahead.
+    """
+    init_snet()
+
+    for window in windows(images, batch_size * 4):
+        inps = [segmap_input(img) for img in window]
+        for seg in segment_batch(snet, inps, normalize=True):
+            yield segmap_output(seg)
+
 # -------------------------------------------------------------------------
 # COMPLETION / INPAINTING
 # -------------------------------------------------------------------------
@@ -139,23 +626,27 @@ def inpaint_or_oom(complnet, image, segmap):
     assert image.shape == segmap.shape
     h, w = image.shape[:2]
 
-    image = iu.modulo_padded(image, 8)
-    segmap = iu.modulo_padded(segmap, 8)
-
-    image = np.expand_dims(image, 0)
-    segmap = np.expand_dims(segmap, 0)
-    input_image = np.concatenate([image, segmap], axis=2)
-
-    return complnet(input_image)[0][:h, :w, ::-1]
+    # image and segmap side by side
+    try:
+        input_image = padded_batch([(image, segmap)], 8)
+        return complnet(input_image)[0][:h, :w, ::-1]
+    except Exception as e:
+        if not is_oom(e):
+            raise
+        return None
 
 def inpaint(complnet, img, mask):
-    global compl_limit
     h, w = img.shape[:2]
+    if tile_size and max(h, w) > tile_size:
+        return tiled(lambda img_tile, mask_tile: inpaint(complnet, img_tile, mask_tile),
+                     [img, mask], tile_size, tile_overlap)
     result = None
-    if h*w < compl_limit:
+    if h*w < compl_pixel_limit():
         result = inpaint_or_oom(complnet, img, mask)
         if result is None:
-            compl_limit = h*w
+            ran_out_of_memory('compl', h*w)
+        else:
+            ran_fine('compl')
     if result is None:
         if h > w:
             top    = inpaint(complnet, img[:h//2,:], mask[:h//2,:])
@@ -167,15 +658,102 @@ def inpaint(complnet, img, mask):
             return np.concatenate((left, right), axis=1)
     return result
 
+def inpaint_batch(complnet, imgs, masks):
+    '''
+    Inpaint several images, calling complnet once per batch of images with
+    the same padded shape. Pages too big for a batch go through inpaint.
+    '''
+    results = [None] * len(imgs)
+    direct = []
+    for i, (img, mask) in enumerate(zip(imgs, masks)):
+        assert img.shape == mask.shape
+        h, w = img.shape[:2]
+        if too_big(h, w, compl_pixel_limit()):
+            results[i] = inpaint(complnet, img, mask)
+        else:
+            direct.append(i)
+
+    # image and segmap side by side, like inpaint_or_oom
+    def shape(i):
+        return padded_shape(*imgs[i].shape[:2], 8)
+    for bat in batched(direct, shape, lambda i: np.prod(shape(i)) * 2 * 3 * 4,
+                       batch_size, batch_memory):
+        try:
+            out = complnet(padded_batch([(imgs[i], masks[i]) for i in bat], 8))
+        except Exception as e:
+            if not is_oom(e):
+                raise
+            # The batch didn't fit: fall back to one page at a time
+            for i in bat:
+                results[i] = inpaint(complnet, imgs[i], masks[i])
+            continue
+        ran_fine('compl')
+        for k, i in enumerate(bat):
+            h, w = imgs[i].shape[:2]
+            results[i] = out[k][:h, :w, ::-1]
+    return results
+
+def inpaint_rois(complnet, imgs, masks):
+    '''
+    Inpaint only the masked regions (plus roi_margin context) of each page.
+    The crops of every page go through inpaint_batch together and are
+    composited back under their mask: unmasked pixels stay bit-identical.
+    '''
+    results = [None] * len(imgs)
+    crops = []  # (page index, box)
+    whole = []
+    for i, (img, mask) in enumerate(zip(imgs, masks)):
+        assert img.shape == mask.shape
+        h, w = img.shape[:2]
+        boxes = iu.mask_boxes(mask[:, :, 0], roi_margin, roi_merge_gap)
+        area = sum((y1 - y0) * (x1 - x0) for y0, y1, x0, x1 in boxes)
+        if area > roi_max_fraction * h * w:
+            whole.append(i)
+            with _stats_lock:
+                _roi_stats.update(pages=1, page_pixels=h * w, cnet_pixels=h * w)
+            continue
+        results[i] = img.copy()
+        crops.extend((i, box) for box in boxes)
+        with _stats_lock:
+            _roi_stats.update(pages=1, page_pixels=h * w, boxes=len(boxes), cnet_pixels=area)
+
+    outs = inpaint_batch(
+        complnet,
+        [imgs[i][y0:y1, x0:x1] for i, (y0, y1, x0, x1) in crops] + [imgs[i] for i in whole],
+        [masks[i][y0:y1, x0:x1] for i, (y0, y1, x0, x1) in crops] + [masks[i] for i in whole])
+    for (i, (y0, y1, x0, x1)), out in zip(crops, outs):
+        masked = masks[i][y0:y1, x0:x1] > 0
+        results[i][y0:y1, x0:x1][masked] = out[masked]
+    for i, out in zip(whole, outs[len(crops):]):
+        results[i] = out
+    return results
+
+def cnet(img_bat):
+    return _cnet.run(img_bat)
+
 def inpainted(image, segmap):
     """
     Return a uint8 text-removed image.
     'image':  BGR, uint8
     'segmap': BGR, uint8 (black=bg)
     """
-    init_global_session()
-
-    def cnet(img_bat):
-        return _global_sess.run(_cnet_out, feed_dict={_cnet_in: img_bat})
+    init_cnet()
 
+    if roi_mode:
+        return inpaint_rois(cnet, [image], [segmap])[0]
     return inpaint(cnet, image, segmap)
+
+def inpainteds(images, segmaps):
+    """
+    inpainted for many images, batching compatible pages into one sess.run.
+    Yields results in the order of `images`, reading at most
+    batch_size * 4 images ahead.
+    """
+    init_cnet()
+
+    for window in windows(zip(images, segmaps), batch_size * 4):
+        imgs, masks = zip(*window)
+        if roi_mode:
+            yield from inpaint_rois(cnet, imgs, masks)
+        else:
+            yield from inpaint_batch(cnet, imgs, masks)
@@ -0,0 +1,301 @@
+'''
+Inference engines for SNET/CNET.
+
+An engine loads one net and runs batches through it:
+    engine = create('tf', 'snet', settings)   # load
+    out = engine.run(batch)                   # run
+    engine.describe()                         # {'inputs': [..], 'outputs': [..]}
+Engines:
+    tf   - frozen TF1 graph (.pb) in a tf.compat.v1.Session
+    onnx - the nets converted to ONNX (see export_onnx.py), on ONNX Runtime
+    stub - deterministic NumPy stand-in for tests (no model files needed)
+TensorFlow and ONNX Runtime are only imported by the engine that needs them.
+`settings` is the dict core.engine_settings() builds; its 'precision'
+('fp32', 'fp16' or 'int8') picks the reduced precision models that
+export_onnx.py produces (onnx engine only).
+'''
+import os
+import sys
+import abc
+import json
+import hashlib
+
+import numpy as np
+
+import consts
+
+# net -> model file per engine and (input, output) tensor names
+NETS = {
+    'snet': {'tf': consts.SNETPATH, 'onnx': consts.SNET_ONNX_PATH, 'io': consts.SNET_IO},
+    'cnet': {'tf': consts.CNETPATH, 'onnx': consts.CNET_ONNX_PATH, 'io': consts.CNET_IO},
+}
+PRECISIONS = ('fp32', 'fp16', 'int8')
+
+def model_path(net, engine, precision='fp32'):
+    ''' snet-0.1.0.onnx -> snet-0.1.0.fp16.onnx for precision fp16 '''
+    path = NETS[net][engine]
+    if precision == 'fp32':
+        return path
+    base, ext = os.path.splitext(path)
+    return '%s.%s%s' % (base, precision, ext)
+
+def model_fingerprint(engine, precision='fp32'):
+    ''' {path: [size, mtime]} of the model files, to tell when they change '''
+    if engine == 'stub':
+        return {}
+    fingerprint = {}
+    for net in NETS:
+        path = model_path(net, engine, precision)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            fingerprint[path] = [stat.st_size, stat.st_mtime_ns]
+    return fingerprint
+
+def is_oom(err):
+    ''' True if err means the net ran out of (host or device) memory '''
+    if isinstance(err, MemoryError):
+        return True
+    tf = sys.modules.get('tensorflow')
+    if tf is not None and isinstance(err, tf.errors.ResourceExhaustedError):
+        return True
+    # onnxruntime raises plain RuntimeExceptions
+    return (type(err).__module__.startswith('onnxruntime')
+            and 'allocat' in str(err).lower())
+
+def cached_model_path(path, key_parts, cache_dir, ext):
+    ''' Where an optimized copy of the model in `path` is cached (None = no caching) '''
+    if not cache_dir:
+        return None
+    stat = os.stat(path)
+    key = hashlib.sha1(json.dumps(
+        [os.path.abspath(path), stat.st_mtime_ns, stat.st_size] + list(key_parts)
+    ).encode()).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(cache_dir, '%s-%s%s' % (name, key, ext))
+
+#---------------------------------------------------------------------------------
+class Engine(abc.ABC):
+    name = None
+
+    @classmethod
+    @abc.abstractmethod
+    def for_net(cls, net, precision='fp32'):
+        ''' Engine for `net` at `precision` (not loaded yet) '''
+
+    @abc.abstractmethod
+    def load(self, settings):
+        ''' Load the model, return self '''
+
+    @abc.abstractmethod
+    def run(self, batch):
+        ''' Output batch of the net for the input `batch` '''
+
+    @abc.abstractmethod
+    def describe(self):
+        ''' {'inputs': [(name, shape, dtype)..], 'outputs': [..]} '''
+
+    def close(self):
+        pass
+
+#---------------------------------------------------------------------------------
+def session_config(settings):
+    import tensorflow as tf
+    config = tf.compat.v1.ConfigProto(
+        intra_op_parallelism_threads=settings['intra_op_threads'],
+        inter_op_parallelism_threads=settings['inter_op_threads'])
+    if not settings['graph_optimizations']:
+        config.graph_options.optimizer_options.opt_level = tf.compat.v1.OptimizerOptions.L0
+        config.graph_options.rewrite_options.disable_meta_optimizer = True
+    return config
+
+def load_graph_def(path, outputs, optimize=False, cache_dir=None):
+    '''
+    GraphDef of the frozen model in `path`. If optimize, only the nodes
+    `outputs` (op names) depend on are kept and the result is cached.
+    '''
+    import tensorflow as tf
+    cache_path = (cached_model_path(path, [outputs, tf.__version__], cache_dir, '.pb')
+                  if optimize else None)
+    graph_def = tf.compat.v1.GraphDef()
+    if cache_path and os.path.exists(cache_path):
+        with tf.io.gfile.GFile(cache_path, 'rb') as f:
+            graph_def.ParseFromString(f.read())
+        return graph_def
+
+    with tf.io.gfile.GFile(path, 'rb') as f:
+        graph_def.ParseFromString(f.read())
+    if optimize:
+        graph_def = tf.compat.v1.graph_util.remove_training_nodes(graph_def, protected_nodes=outputs)
+        graph_def = tf.compat.v1.graph_util.extract_sub_graph(graph_def, outputs)
+        if cache_path:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = cache_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(graph_def.SerializeToString())
+            os.replace(tmp_path, cache_path)
+    return graph_def
+
+class TFEngine(Engine):
+    ''' Frozen graph imported (no prefix) into its own graph and session '''
+    name = 'tf'
+
+    def __init__(self, path, input_name, output_name):
+        self.path = path
+        self.input_name = input_name
+        self.output_name = output_name
+        self.sess = None
+
+    @classmethod
+    def for_net(cls, net, precision='fp32'):
+        if precision != 'fp32':
+            raise ValueError('the tf engine only runs fp32 graphs, use the onnx engine for ' + precision)
+        return cls(NETS[net]['tf'], *NETS[net]['io'])
+
+    def load(self, settings):
+        import tensorflow as tf
+        out_op = self.output_name.split(':')[0]
+        graph = tf.Graph()
+        with graph.as_default():
+            graph_def = load_graph_def(self.path, [out_op],
+                                       settings['optimize_graphs'], settings['graph_cache_dir'])
+            tf.import_graph_def(graph_def, name='')
+        self.sess = tf.compat.v1.Session(graph=graph, config=session_config(settings))
+        self._in = graph.get_tensor_by_name(self.input_name)
+        self._out = graph.get_tensor_by_name(self.output_name)
+        return self
+
+    def run(self, batch):
+        return self.sess.run(self._out, feed_dict={self._in: batch})
+
+    def describe(self):
+        def spec(t):
+            return (t.name, t.shape.as_list() if t.shape.rank is not None else None, t.dtype.name)
+        return {'inputs': [spec(self._in)], 'outputs': [spec(self._out)]}
+
+    def close(self):
+        if self.sess is not None:
+            self.sess.close()
+            self.sess = None
+
+#---------------------------------------------------------------------------------
+ONNX_DTYPES = {
+    'tensor(float)': np.float32,
+    'tensor(float16)': np.float16,
+    'tensor(double)': np.float64,
+    'tensor(uint8)': np.uint8,
+    'tensor(int32)': np.int32,
+    'tensor(int64)': np.int64,
+}
+
+class OnnxEngine(Engine):
+    name = 'onnx'
+
+    def __init__(self, path):
+        self.path = path
+        self.sess = None
+
+    @classmethod
+    def for_net(cls, net, precision='fp32'):
+        return cls(model_path(net, 'onnx', precision))
+
+    def load(self, settings):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = settings['intra_op_threads']
+        options.inter_op_num_threads = settings['inter_op_threads']
+        options.graph_optimization_level = (ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if settings['graph_optimizations'] else ort.GraphOptimizationLevel.ORT_DISABLE_ALL)
+        path = self.path
+        # Cache the graph ORT optimized, and load it as is next time
+        cache_path = (cached_model_path(self.path, [ort.__version__], settings['graph_cache_dir'], '.onnx')
+                      if settings['optimize_graphs'] else None)
+        if cache_path and os.path.exists(cache_path):
+            path = cache_path
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        elif cache_path:
+            os.makedirs(settings['graph_cache_dir'], exist_ok=True)
+            options.optimized_model_filepath = cache_path
+        self.sess = ort.InferenceSession(path, options, providers=ort.get_available_providers())
+        self._in = self.sess.get_inputs()[0]
+        self._out = self.sess.get_outputs()[0]
+        self._in_dtype = ONNX_DTYPES.get(self._in.type, np.float32)
+        return self
+
+    def run(self, batch):
+        feed = np.asarray(batch, dtype=self._in_dtype)  # no copy if it already matches
+        return self.sess.run([self._out.name], {self._in.name: feed})[0]
+
+    def describe(self):
+        def spec(arg):
+            return (arg.name, arg.shape, arg.type)
+        return {'inputs': [spec(self._in)], 'outputs': [spec(self._out)]}
+
+    def close(self):
+        self.sess = None
+
+#---------------------------------------------------------------------------------
+class StubEngine(Engine):
+    '''
+    Deterministic NumPy nets with the real I/O layout:
+    snet: dark pixels are text, class scores [bg, text] = [brightness, 1 - brightness]
+    cnet: image|segmap -> image with segmap pixels painted white (RGB, like CNET)
+    Reduced precisions round the snet input like the real models would.
+    '''
+    name = 'stub'
+
+    def __init__(self, net, precision='fp32'):
+        assert net in NETS, net
+        assert precision in PRECISIONS, precision
+        self.net = net
+        self.precision = precision
+
+    @classmethod
+    def for_net(cls, net, precision='fp32'):
+        return cls(net, precision)
+
+    def load(self, settings):
+        return self
+
+    def run(self, batch):
+        if self.net == 'snet':
+            if self.precision == 'fp16':
+                batch = batch.astype(np.float16)
+            elif self.precision == 'int8':
+                batch = np.round(batch * 127) / 127
+            brightness = batch.mean(axis=-1, dtype=np.float32)
+            return np.stack([brightness, 1 - brightness], axis=-1)
+        w = batch.shape[2] // 2
+        image, segmap = batch[:, :, :w], batch[:, :, w:]
+        out = np.where(segmap.max(axis=-1, keepdims=True) > 0, 255, image).astype(np.uint8)
+        return out[..., ::-1]
+
+    def describe(self):
+        if self.net == 'snet':
+            return {'inputs': [('image', [None, None, None, 3], 'float32')],
+                    'outputs': [('scores', [None, None, None, 2], 'float32')]}
+        return {'inputs': [('image|segmap', [None, None, None, 3], 'uint8')],
+                'outputs': [('image', [None, None, None, 3], 'uint8')]}
+
+#---------------------------------------------------------------------------------
+ENGINES = {
+    'tf': TFEngine,
+    'onnx': OnnxEngine,
+    'stub': StubEngine,
+}
+
+def available(engine, precision='fp32'):
+    ''' True if the engine's runtime is installed and both model files exist '''
+    if engine == 'stub':
+        return True
+    if engine == 'tf' and precision != 'fp32':
+        return False
+    module = {'tf': 'tensorflow', 'onnx': 'onnxruntime'}[engine]
+    try:
+        __import__(module)
+    except ImportError:
+        return False
+    return all(os.path.exists(model_path(net, engine, precision)) for net in NETS)
+
+def create(engine, net, settings):
+    ''' Load `net` ('snet'/'cnet') with `engine` ('tf'/'onnx'/'stub') '''
+    return ENGINES[engine].for_net(net, settings.get('precision', 'fp32')).load(settings)
@@ -0,0 +1,85 @@
+'''
+Convert the frozen SNET/CNET graphs to ONNX for the onnx engine, and
+optionally derive reduced precision models from them:
+    fp16 - weights and activations in float16 (inputs/outputs stay as they are)
+    int8 - statically quantized, calibrated on fixture pages and their masks
+Check them with precision_gate.py before use.
+Needs tf2onnx, plus onnxconverter-common (fp16) / onnxruntime (int8).
+
+Usage (from src/):
+    python export_onnx.py [--opset 13] [--precisions fp16 int8]
+'''
+import os
+import argparse
+
+import engines
+
+CALIBRATION_DIR = os.path.join(os.path.dirname(__file__), '../test/fixture/real_proj')
+
+def export(net, opset):
+    import tf2onnx
+    spec = engines.NETS[net]
+    input_name, output_name = spec['io']
+    graph_def = engines.load_graph_def(spec['tf'], [output_name.split(':')[0]], optimize=True)
+    tf2onnx.convert.from_graph_def(
+        graph_def, input_names=[input_name], output_names=[output_name],
+        opset=opset, output_path=spec['onnx'])
+    print('%s -> %s' % (spec['tf'], spec['onnx']))
+
+def to_fp16(net):
+    import onnx
+    from onnxconverter_common import float16
+    src, dst = engines.model_path(net, 'onnx'), engines.model_path(net, 'onnx', 'fp16')
+    onnx.save(float16.convert_float_to_float16(onnx.load(src), keep_io_types=True), dst)
+    print('%s -> %s' % (src, dst))
+
+def calibration_batches(net, project_dir=CALIBRATION_DIR):
+    ''' Net inputs made from the images (and masks) of a manga project dir '''
+    import core
+    import imgio
+    import consts
+    import utils.futils as fu
+    import utils.imutils as iu
+    img_dir = os.path.join(project_dir, consts.IMGDIR)
+    mask_dir = os.path.join(project_dir, consts.MASKDIR)
+    for path in fu.children(img_dir):
+        img = iu.channel3img(iu.imread(path))
+        if net == 'snet':
+            yield core.padded_batch([(img,)], 16, normalize=True).copy()
+            continue
+        mask_path = os.path.join(mask_dir, os.path.basename(path))
+        if os.path.exists(mask_path):
+            yield core.padded_batch([(img, imgio.load(mask_path, imgio.MASK))], 8).copy()
+
+def to_int8(net):
+    import onnxruntime as ort
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat,
+                                          QuantType, quantize_static)
+    src, dst = engines.model_path(net, 'onnx'), engines.model_path(net, 'onnx', 'int8')
+    input_name = ort.InferenceSession(src, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = iter(calibration_batches(net))
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {input_name: batch.astype('float32')}
+
+    quantize_static(src, dst, Reader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+    print('%s -> %s' % (src, dst))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert SNET/CNET to ONNX')
+    parser.add_argument('--opset', type=int, default=13)
+    parser.add_argument('--nets', nargs='+', default=['snet', 'cnet'])
+    parser.add_argument('--precisions', nargs='*', default=[], choices=['fp16', 'int8'])
+    parser.add_argument('--skip-fp32', action='store_true', help='reuse the existing fp32 .onnx files')
+    args = parser.parse_args()
+    for net in args.nets:
+        if not args.skip_fp32:
+            export(net, args.opset)
+        if 'fp16' in args.precisions:
+            to_fp16(net)
+        if 'int8' in args.precisions:
+            to_int8(net)
@@ -20,6 +20,15 @@ def imgpath2mask(imgpath):
         io.segmap2mask
     )
 
+def imgpaths2masks(imgpaths):
+    ''' Lazy masks of many images, segmented in batches '''
+    return fp.go(
+        imgpaths,
+        fp.map(lambda path: io.load(path, io.NDARR)),
+        core.segmaps,
+        fp.map(io.segmap2mask)
+    )
+
 class ImageProvider(QQuickImageProvider):
     def __init__(self):
         super(ImageProvider, self).__init__(
@@ -171,7 +180,7 @@ class MainWindow(QObject):
         '''
         if state.now_image() is None: return None
 
-        masks = fp.map(imgpath2mask, state.img_paths)
+        masks = imgpaths2masks(state.img_paths)
 
         for path,mask in tqdm(zip(state.mask_paths, masks),
                               total=len(state.img_paths),
@@ -194,9 +203,8 @@ class MainWindow(QObject):
             lambda pair: Path(pair.mask).exists(),
             state.img_mask_pairs()
         )
-        new_masks = fp.map(
-            lambda p: imgpath2mask(p.img),
-            no_mask_path_pairs
+        new_masks = imgpaths2masks(
+            fp.map(lambda p: p.img, no_mask_path_pairs)
         )
         for mask,pair in tqdm(zip(new_masks, no_mask_path_pairs),
                               total=len(no_mask_path_pairs),
@@ -206,7 +214,7 @@ class MainWindow(QObject):
         img_paths,mask_paths = state.project()
         images= fp.map(lambda p: io.load(p, io.IMAGE), img_paths)
         masks = fp.map(lambda p: io.load(p, io.MASK), mask_paths)
-        inpainteds = fp.map(core.inpainted, images,masks)
+        inpainteds = core.inpainteds(images,masks)
 
         for ipath,inpainted in tqdm(zip(img_paths, inpainteds),
                                     total=len(img_paths),
@@ -0,0 +1,274 @@
+'''
+Multi-process inference server.
+
+N worker processes each own their own SNET/CNET sessions (core's, one
+set per process) and take requests from one shared queue.
+Page pixels travel through multiprocessing.shared_memory, so only block
+names and shapes are pickled. InferenceServer.segmap/segmask/inpainted
+mirror the core functions of the same name. Each result comes back with
+the worker's counters (core.stats_counts), so InferenceServer.stats() can
+report the workers' bucket and ROI statistics.
+If a worker dies (e.g. OOM-killed), the requests it was running fail with
+WorkerDied instead of hanging.
+'''
+import importlib
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import traceback
+from concurrent.futures import Future, TimeoutError
+from multiprocessing import shared_memory
+
+import numpy as np
+
+DEFAULT_OPS = {
+    'segmap': 'core:segmap',
+    'segmask': 'core:segmask',
+    'inpainted': 'core:inpainted',
+}
+DEFAULT_INIT = 'core:init_global_session'
+DEFAULT_STATS = 'core:stats_counts'
+# Seconds between checks that the workers are still alive
+POLL_INTERVAL = 1.0
+
+class WorkerDied(RuntimeError):
+    pass
+
+def resolve(spec):
+    ''' 'module:function' -> function '''
+    module, name = spec.split(':')
+    return getattr(importlib.import_module(module), name)
+
+#---------------------------------------------------------------------------------
+def to_shm(arr):
+    ''' Copy arr into a new shared memory block, return (shm, descriptor) '''
+    arr = np.ascontiguousarray(arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+def from_shm(desc):
+    ''' Copy of the array in the block described by desc, return (shm, array) '''
+    name, shape, dtype = desc
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, np.dtype(dtype), buffer=shm.buf).copy()
+
+def release(shm, unlink=False):
+    shm.close()
+    if unlink:
+        shm.unlink()
+
+#---------------------------------------------------------------------------------
+def split_cpus(cpu_ids, n):
+    ''' Split cpu ids into n contiguous, near equal groups (one per worker) '''
+    cpu_ids = list(cpu_ids)
+    size, extra = divmod(len(cpu_ids), n)
+    groups, beg = [], 0
+    for i in range(n):
+        end = beg + size + (i < extra)
+        groups.append(cpu_ids[beg:end])
+        beg = end
+    return groups
+
+def worker_main(requests, responses, ops, init, cpu_ids=None, index=0, stats=None):
+    if cpu_ids and hasattr(os, 'sched_setaffinity'):  # Linux only
+        os.sched_setaffinity(0, cpu_ids)
+    if init:
+        resolve(init)()
+    funcs = {op: resolve(spec) for op, spec in ops.items()}
+    stats = resolve(stats) if stats else (lambda: None)
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        req_id, op, descs = request
+        responses.put(('started', req_id, index))
+        shms, args, result = [], None, None
+        try:
+            # raises if the request was abandoned (inputs unlinked) before we got to it
+            for desc in descs:
+                shms.append(shared_memory.SharedMemory(name=desc[0]))
+            args = [np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+                    for shm, (_, shape, dtype) in zip(shms, descs)]
+            result = np.asarray(funcs[op](*args))
+            out_shm, out_desc = to_shm(result)
+            out_shm.close()
+            responses.put(('done', req_id, out_desc, None, index, stats()))
+        except Exception:
+            responses.put(('done', req_id, None, traceback.format_exc(), index, stats()))
+        finally:
+            args = result = None  # drop views before closing the blocks
+            for shm in shms:
+                release(shm)
+
+#---------------------------------------------------------------------------------
+class InferenceServer:
+    def __init__(self, n_workers=2, ops=None, init=DEFAULT_INIT, start_method='spawn', cpus=None,
+                 timeout=None, stats=DEFAULT_STATS):
+        '''
+        cpus: cpu ids to share among the workers, each worker is pinned to its part
+        timeout: seconds segmap/segmask/inpainted wait for a result (None = forever)
+        stats: 'module:function' whose result each worker sends with its results (None = off)
+        '''
+        self.n_workers = n_workers
+        self.ops = dict(ops or DEFAULT_OPS)
+        self.timeout = timeout
+        ctx = mp.get_context(start_method)
+        cpu_groups = split_cpus(cpus, n_workers) if cpus else [None] * n_workers
+        self._requests = ctx.Queue()
+        self._responses = ctx.Queue()
+        self._workers = [
+            ctx.Process(target=worker_main, name=f'inference-worker-{i}', daemon=True,
+                        args=(self._requests, self._responses, self.ops, init, cpu_groups[i], i, stats))
+            for i in range(n_workers)]
+        self._pending = {}  # req_id -> (future, input shms)
+        self._running_on = {}  # req_id -> index of the worker running it
+        self._dead = set()  # indices of workers that died
+        self._stats = {}  # worker index -> latest stats it sent
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._collector = threading.Thread(target=self._collect, name='inference-collector', daemon=True)
+        self._running = False
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+        self._running = True
+        self._collector.start()
+        return self
+
+    def stop(self):
+        if not self._running:
+            return
+        for _ in self._workers:
+            self._requests.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._running = False
+        self._responses.put(None)
+        self._collector.join()
+        self._fail_pending(list(self._pending), 'inference server stopped')
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def submit(self, op, *arrays):
+        ''' Run `op` on a worker, return a Future of the resulting ndarray '''
+        assert op in self.ops, op
+        if len(self._dead) == self.n_workers:
+            raise WorkerDied('every inference worker died')
+        future = Future()
+        shms, descs = [], []
+        for arr in arrays:
+            shm, desc = to_shm(arr)
+            shms.append(shm)
+            descs.append(desc)
+        with self._lock:
+            req_id = next(self._ids)
+            self._pending[req_id] = (future, shms)
+        self._requests.put((req_id, op, descs))
+        return future
+
+    def _collect(self):
+        while True:
+            try:
+                response = self._responses.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if response is None:
+                return
+            if response[0] == 'started':
+                _, req_id, index = response
+                with self._lock:
+                    if req_id in self._pending:
+                        self._running_on[req_id] = index
+                continue
+            _, req_id, desc, error, index, stats = response
+            if stats is not None:
+                self._stats[index] = stats
+            with self._lock:
+                entry = self._pending.pop(req_id, None)
+                self._running_on.pop(req_id, None)
+            if entry is None:  # abandoned after a timeout
+                if desc is not None:
+                    release(from_shm(desc)[0], unlink=True)
+                continue
+            future, shms = entry
+            for shm in shms:
+                release(shm, unlink=True)
+            if error is not None:
+                future.set_exception(RuntimeError(error))
+                continue
+            shm, result = from_shm(desc)
+            release(shm, unlink=True)
+            future.set_result(result)
+
+    def _check_workers(self):
+        for i, worker in enumerate(self._workers):
+            if i in self._dead or worker.is_alive():
+                continue
+            self._dead.add(i)
+            print(f'inference worker {i} died (exit code {worker.exitcode})')
+            with self._lock:
+                lost = [req_id for req_id, index in self._running_on.items() if index == i]
+            self._fail_pending(lost, f'inference worker {i} died (exit code {worker.exitcode})')
+        if self._running and len(self._dead) == self.n_workers:
+            # Nobody is left to take the queued requests
+            self._fail_pending(list(self._pending), 'every inference worker died')
+
+    def _fail_pending(self, req_ids, reason):
+        for req_id in req_ids:
+            with self._lock:
+                entry = self._pending.pop(req_id, None)
+                self._running_on.pop(req_id, None)
+            if entry is None:
+                continue
+            future, shms = entry
+            for shm in shms:
+                release(shm, unlink=True)
+            future.set_exception(WorkerDied(reason))
+
+    def call(self, op, *arrays):
+        ''' submit(op, *arrays).result(), giving up after self.timeout seconds '''
+        return self.result(self.submit(op, *arrays))
+
+    def result(self, future):
+        ''' future.result(), abandoning the request after self.timeout seconds '''
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            with self._lock:
+                req_id = next((k for k, (f, _) in self._pending.items() if f is future), None)
+            self._fail_pending([req_id], 'timed out')
+            raise
+
+    def stats(self):
+        ''' The latest stats of every worker that answered a request '''
+        return list(self._stats.values())
+
+    # mirrors of core ----------------------------------------------------
+    def segmap(self, image):
+        return self.call('segmap', image)
+
+    def segmask(self, image):
+        return self.call('segmask', image)
+
+    def inpainted(self, image, segmap):
+        return self.call('inpainted', image, segmap)
+
+    def segmaps(self, images):
+        ''' segmap of every image, spread over the workers; yields in order '''
+        futures = [self.submit('segmap', image) for image in images]
+        for future in futures:
+            yield self.result(future)
+
+    def inpainteds(self, images, segmaps):
+        futures = [self.submit('inpainted', image, segmap) for image, segmap in zip(images, segmaps)]
+        for future in futures:
+            yield self.result(future)
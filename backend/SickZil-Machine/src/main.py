@@ -17,10 +17,39 @@ if __name__ == '__main__':
     current_dir = os.path.dirname(os.path.abspath(__file__))
     config_path = os.path.join(current_dir, "../resource/config.json")
     consts.load_config(config_path)
+    core.set_engine(consts.config.get('engine', 'tf'))
+    core.set_precision(
+        consts.config.get('precision', 'fp32'),
+        min_iou=consts.config.get('min_mask_iou', 0.98),
+        min_psnr=consts.config.get('min_inpaint_psnr', 35.0)
+    )
     core.set_limits(
         consts.config['seg_limit'],
         consts.config['compl_limit']
     )
+    core.set_tiling(
+        consts.config.get('tile_size', 0),
+        consts.config.get('tile_overlap', 64)
+    )
+    core.set_buckets(consts.config.get('shape_buckets', []))
+    core.load_limits(os.path.join(current_dir, "../resource/limits.json"))
+    if consts.config.get('memory_budget_mb'):
+        core.set_memory_budget(consts.config['memory_budget_mb'] * 2**20)
+    core.set_session_config(
+        consts.config.get('intra_op_threads', 0),
+        consts.config.get('inter_op_threads', 0),
+        core.parse_cpus(consts.config.get('cpu_affinity', '')),
+        consts.config.get('graph_optimizations', True)
+    )
+    core.set_graph_loading(
+        consts.config.get('optimize_graphs', False),
+        os.path.join(current_dir, "../resource/graph_cache")
+    )
+    core.set_roi(
+        consts.config.get('inpaint_roi', False),
+        consts.config.get('roi_margin', 32),
+        consts.config.get('roi_merge_gap', 16)
+    )
 
     app = QApplication(sys.argv)
 
@@ -0,0 +1,109 @@
+'''
+Accuracy gate for reduced precision (fp16/int8) SNET/CNET models.
+
+evaluate() runs fixture pages through fp32 and a reduced precision and
+reports the worst page's mask IoU (SNET) and inpaint PSNR (CNET, both
+precisions inpainting the same fp32 mask). The report is saved as json;
+check() only lets a precision through if its report is for the current
+model files and meets the thresholds.
+
+Usage (from src/):
+    python precision_gate.py --pages ../test/fixture/real_proj/images --precisions fp16 int8
+'''
+import os
+import json
+import argparse
+
+import numpy as np
+
+import engines
+
+REPORT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../resource/precision_report.json'))
+MIN_MASK_IOU = 0.98
+MIN_INPAINT_PSNR = 35.0
+
+def mask_iou(a, b):
+    a, b = a > 0, b > 0
+    union = np.count_nonzero(a | b)
+    return np.count_nonzero(a & b) / union if union else 1.0
+
+def psnr(a, b):
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+def run(engine, precision, pages, segmaps=None):
+    ''' (masks, inpainteds) of pages; inpaints use `segmaps` if given '''
+    import core
+    old = (core.engine, core.precision)
+    core.close_global_session()
+    core.set_engine(engine)
+    core.precision = precision  # evaluation is what unlocks it: no gate here
+    try:
+        masks = [core.segmap(page) for page in pages]
+        inpainteds = [core.inpainted(page, segmap)
+                      for page, segmap in zip(pages, segmaps or masks)]
+        return masks, inpainteds
+    finally:
+        core.close_global_session()
+        core.engine, core.precision = old
+
+def evaluate(pages, precision, engine='onnx'):
+    ref_masks, ref_inpainteds = run(engine, 'fp32', pages)
+    masks, inpainteds = run(engine, precision, pages, ref_masks)
+    return {
+        'engine': engine,
+        'pages': len(pages),
+        'mask_iou': min(mask_iou(a, b) for a, b in zip(ref_masks, masks)),
+        'inpaint_psnr': min(psnr(a, b) for a, b in zip(ref_inpainteds, inpainteds)),
+        'models': engines.model_fingerprint(engine, precision),
+    }
+
+def load_report(path=REPORT_PATH):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_report(report, path=REPORT_PATH):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, path)
+
+def check(precision, engine, path=REPORT_PATH, min_iou=MIN_MASK_IOU, min_psnr=MIN_INPAINT_PSNR):
+    ''' (ok, reason): may `precision` be used with `engine`? '''
+    if precision == 'fp32':
+        return True, 'full precision'
+    result = load_report(path).get(engine, {}).get(precision)
+    if result is None:
+        return False, 'no evaluation of %s/%s in %s' % (engine, precision, path)
+    if result['models'] != engines.model_fingerprint(engine, precision):
+        return False, 'the %s models changed since they were evaluated' % precision
+    if result['mask_iou'] < min_iou:
+        return False, 'mask IoU %.4f < %.4f' % (result['mask_iou'], min_iou)
+    if result['inpaint_psnr'] < min_psnr:
+        return False, 'inpaint PSNR %.2fdB < %.2fdB' % (result['inpaint_psnr'], min_psnr)
+    return True, 'mask IoU %.4f, inpaint PSNR %.2fdB' % (result['mask_iou'], result['inpaint_psnr'])
+
+if __name__ == '__main__':
+    import utils.futils as fu
+    import utils.imutils as iu
+    parser = argparse.ArgumentParser(description='Evaluate reduced precision SNET/CNET models')
+    parser.add_argument('--pages', default=os.path.join(os.path.dirname(__file__), '../test/fixture/real_proj/images'))
+    parser.add_argument('--precisions', nargs='+', default=['fp16', 'int8'])
+    parser.add_argument('--engine', default='onnx')
+    parser.add_argument('--report', default=REPORT_PATH)
+    parser.add_argument('--min-iou', type=float, default=MIN_MASK_IOU)
+    parser.add_argument('--min-psnr', type=float, default=MIN_INPAINT_PSNR)
+    args = parser.parse_args()
+
+    pages = [iu.channel3img(iu.imread(path)) for path in fu.children(args.pages) if iu.is_img_file(path)]
+    report = load_report(args.report)
+    for precision in args.precisions:
+        if not engines.available(args.engine, precision):
+            print('%s: models not found, run export_onnx.py --precisions %s' % (precision, precision))
+            continue
+        report.setdefault(args.engine, {})[precision] = evaluate(pages, precision, args.engine)
+        save_report(report, args.report)
+        ok, reason = check(precision, args.engine, args.report, args.min_iou, args.min_psnr)
+        print('%s: %s (%s)' % (precision, 'PASS' if ok else 'FAIL', reason))
@@ -43,6 +43,34 @@ def modulo_padded(img, modulo=16):
     elif len(img.shape) == 2:
         return np.pad(img, [(0,h_padding),(0,w_padding)], mode='reflect')
 
+def reflect_indices(n, length):
+    ''' Indices of `length` rows/cols reflected into 0~n-1, like np.pad(mode='reflect') '''
+    idxs = np.arange(length)
+    if n == 1:
+        return np.zeros_like(idxs)
+    period = 2 * (n - 1)
+    idxs = idxs % period
+    return np.where(idxs < n, idxs, period - idxs)
+
+def pad_into(dst, img, normalize=False):
+    '''
+    Reflect-pad img(h,w[,c]) to the shape of dst(H,W[,c]) by writing into dst.
+    Same result as np.pad(img, .., mode='reflect') but with no full-size temporary.
+    If normalize, img(0~255) is converted to dst's float dtype (0. ~ 1.) like
+    float32(img), in the same pass.
+    '''
+    h,w = img.shape[:2]
+    H,W = dst.shape[:2]
+    if normalize:
+        np.divide(img, 255, out=dst[:h,:w], dtype=dst.dtype)
+    else:
+        dst[:h,:w] = img
+    if H > h:
+        dst[h:H,:w] = dst[reflect_indices(h, H)[h:],:w]
+    if W > w:
+        dst[:,w:W] = dst[:,reflect_indices(w, W)[w:]]
+    return dst
+
 #---------------------------------------------------------------------------------
 def imread(fpath):
     '''
@@ -213,6 +241,58 @@ def decategorize(categorized, origin_map):
 
     return ret_img
 
+def categorized_lut(origin_map, n_classes):
+    ''' origin_map -> uint8 lookup table from class index to (first channel) value '''
+    return np.array([origin_map[tuple(to_categorical(c, n_classes))][0] * 255
+                     for c in range(n_classes)], dtype=np.uint8)
+
+def argmax_lut(categorized, lut, out=None):
+    '''
+    map_max_row + decategorize + uint8 in one pass, for single channel output:
+    (h,w,n_classes) class scores -> lut[argmax] (h,w) uint8, written into out if given.
+    '''
+    if categorized.shape[-1] == 2: # snet: one comparison instead of argmax
+        if out is None:
+            out = np.empty(categorized.shape[:-1], dtype=np.uint8)
+        np.greater(categorized[...,1], categorized[...,0], out=out.view(bool))
+        return np.take(lut, out, out=out, mode='clip')
+    return np.take(lut, categorized.argmax(axis=-1), out=out, mode='clip')
+
+rgb2wk_lut = categorized_lut(rgb2wk_map, 2)
+
+#---------------------------------------------------------------------------------
+# for roi inpainting
+def merge_boxes(boxes, gap=0):
+    ''' Union (y0,y1,x0,x1) boxes that overlap or are within gap pixels, until none do '''
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        for y0,y1,x0,x1 in boxes:
+            for k,(Y0,Y1,X0,X1) in enumerate(out):
+                if y0 <= Y1 + gap and Y0 <= y1 + gap and x0 <= X1 + gap and X0 <= x1 + gap:
+                    out[k] = (min(y0,Y0), max(y1,Y1), min(x0,X0), max(x1,X1))
+                    merged = True
+                    break
+            else:
+                out.append((y0,y1,x0,x1))
+        boxes = out
+    return boxes
+
+def mask_boxes(mask, margin=0, gap=0):
+    '''
+    (y0,y1,x0,x1) boxes around connected nonzero regions of mask(h,w),
+    grown by margin pixels (clipped to the image) and merged by merge_boxes.
+    '''
+    h,w = mask.shape[:2]
+    n,_,stats,_ = cv2.connectedComponentsWithStats(
+        (mask > 0).astype(np.uint8), connectivity=8)
+    boxes = [(max(0, y - margin), min(h, y + bh + margin),
+              max(0, x - margin), min(w, x + bw + margin))
+             for x,y,bw,bh,_ in stats[1:]] # 0 is the background
+    return merge_boxes(boxes, gap)
+
 
 if __name__ == '__main__':
     assert is_img_file('.') == False
@@ -1,7 +1,13 @@
 import os,sys
 sys.path.append( os.path.abspath('../src') )
 
+import json
+import numpy as np
+import tensorflow as tf
 import core
+import engines
+import utils.imutils as iu
+import pytest
 import cv2
 
 def test_segment_input_output_spec_check():
@@ -29,3 +35,271 @@ def test_inpainted_input_output_spec_check():
     #cv2.imshow('seg1',seg1); cv2.imshow('seg2',seg2);
     #cv2.imshow('ret1',ret1); cv2.imshow('ret2',ret2);
     #cv2.waitKey(0)
+
+#---------------------------------------------------------------------------------
+def test_tile_spans_cover_whole_length_with_overlap():
+    assert core.tile_spans(100, 128, 16) == [(0,100)]
+    spans = core.tile_spans(1000, 256, 32)
+    assert spans[0][0] == 0 and spans[-1][1] == 1000
+    for (s0,e0),(s1,e1) in zip(spans, spans[1:]):
+        assert e1 - s1 == 256
+        assert e0 - s1 >= 32 # overlapped
+
+def test_tiled_identity_net_reconstructs_input():
+    img = np.random.RandomState(0).rand(700,1000,3).astype(np.float32)
+    out = core.tiled(lambda tile: tile, [img], 256, 32)
+    assert out.dtype == img.dtype
+    assert np.allclose(out, img, atol=1e-5)
+
+def test_tiled_keeps_integer_dtype_and_gets_every_input():
+    img = np.random.RandomState(1).randint(0,256, (300,500,3)).astype(np.uint8)
+    mask = np.zeros_like(img)
+    out = core.tiled(lambda i,m: i + m, [img, mask], 128, 16)
+    assert out.dtype == np.uint8
+    assert (out == img).all()
+
+def test_segment_with_tiling_matches_whole_image_for_pixelwise_net():
+    img = np.random.RandomState(2).rand(300,450,3).astype(np.float32)
+    pixelwise = lambda bat: bat * 2
+    core.set_tiling(0)
+    whole = core.segment(pixelwise, img)
+    core.set_tiling(128, 16)
+    try:
+        tiled = core.segment(pixelwise, img)
+    finally:
+        core.set_tiling(0)
+    assert tiled.shape == whole.shape
+    assert np.allclose(tiled, whole, atol=1e-5)
+
+#---------------------------------------------------------------------------------
+def test_batched_groups_by_key_within_size_and_memory():
+    shapes = {0:(16,16), 1:(32,32), 2:(16,16), 3:(16,16), 4:(32,32)}
+    bats = core.batched(range(5), shapes.get, lambda i: 10, 2, 100)
+    assert sorted(map(sorted, bats)) == [[0,2],[1,4],[3]]
+    bats = core.batched(range(5), shapes.get, lambda i: 10, 8, 15)
+    assert all(len(b) == 1 for b in bats)
+
+def test_segment_batch_matches_segment_with_one_call_per_shape():
+    rs = np.random.RandomState(3)
+    inps = [rs.rand(h,w,3).astype(np.float32) 
+            for h,w in [(100,120),(97,113),(64,80),(100,120)]]
+    calls = []
+    def segnet(bat):
+        calls.append(bat.shape)
+        return bat * 2
+    outs = core.segment_batch(segnet, inps)
+    assert len(calls) == 2 # (112,128) x3, (64,80) x1
+    for inp, out in zip(inps, outs):
+        assert np.allclose(out, inp * 2)
+
+def test_inpaint_batch_matches_inpaint():
+    rs = np.random.RandomState(4)
+    imgs = [rs.randint(0,256,(h,w,3)).astype(np.uint8) for h,w in [(40,50),(40,50),(30,20)]]
+    masks = [np.zeros_like(img) for img in imgs]
+    cnet = lambda bat: bat + 1 # any pixelwise net
+    outs = core.inpaint_batch(cnet, imgs, masks)
+    for img, mask, out in zip(imgs, masks, outs):
+        assert (out == core.inpaint(cnet, img, mask)).all()
+
+#---------------------------------------------------------------------------------
+def test_buckets_pad_inputs_to_canonical_shapes_and_count_hits():
+    core.set_buckets([64, 128])
+    core.reset_bucket_stats()
+    try:
+        assert core.padded_shape(50, 100, 16) == (64, 128)
+        assert core.padded_shape(130, 20, 16) == (144, 64) # too big -> modulo
+        rs = np.random.RandomState(5)
+        inps = [rs.rand(50,100,3).astype(np.float32), 
+                rs.rand(60,70,3).astype(np.float32),
+                rs.rand(130,20,3).astype(np.float32)]
+        shapes = []
+        def segnet(bat):
+            shapes.append(bat.shape)
+            return bat * 2
+        outs = core.segment_batch(segnet, inps)
+        for inp, out in zip(inps, outs):
+            assert np.allclose(out, inp * 2)
+        assert sorted(shapes) == [(1,144,64,3), (2,64,128,3)]
+
+        stats = core.bucket_stats()
+        assert stats['hits'] == 2 and stats['misses'] == 1
+        assert stats['per_bucket'] == {'64x128': 2}
+        assert 0 < stats['padding_waste'] < 1
+    finally:
+        core.set_buckets([])
+        core.reset_bucket_stats()
+
+def test_padded_batch_reuses_bucket_buffers():
+    core.set_buckets([32])
+    try:
+        img = np.ones((20,20,3), np.uint8)
+        bat1 = core.padded_batch([(img, img)], 8)
+        bat2 = core.padded_batch([(img, img)], 8)
+        assert bat1.shape == (1,32,64,3)
+        assert bat1 is bat2
+    finally:
+        core.set_buckets([])
+
+#---------------------------------------------------------------------------------
+def test_segment_splits_on_oom_and_lowers_limit_in_memory():
+    def segnet(bat): 
+        if bat.shape[1] * bat.shape[2] > 100*100:
+            raise MemoryError()
+        return bat * 2
+    img = np.random.RandomState(6).rand(300,200,3).astype(np.float32)
+    try:
+        out = core.segment(segnet, img)
+        assert np.allclose(out, img * 2)
+        assert core.seg_pixel_limit() <= 300*200
+    finally:
+        core.reset_oom_limits()
+    assert core.seg_pixel_limit() == core.seg_limit
+
+def test_oom_limit_is_saved_and_reloaded_until_reprobed(tmp_path):
+    limits_file = tmp_path / 'limits.json'
+    limits_file.write_text(json.dumps({'seg_limit': 500*500, 'compl_limit': 400*400}))
+    old_limits = (core.seg_limit, core.compl_limit, core.limits_path)
+    core.load_limits(str(limits_file))
+    ooms = [1]
+    def segnet(bat):
+        if ooms[0]:
+            ooms[0] -= 1
+            raise MemoryError()
+        return bat
+    try:
+        core.segment(segnet, np.zeros((300,200,3), np.float32))
+        saved = json.loads(limits_file.read_text())
+        assert saved['seg_limit'] == 500*500 # configured limit kept
+        assert saved['oom_limits'] == {'seg': 300*200, 'compl': None}
+
+        core.reset_oom_limits() # next run
+        core.load_limits(str(limits_file))
+        assert core.seg_pixel_limit() == 300*200
+
+        small = np.zeros((16,16,3), np.float32)
+        for _ in range(core.reprobe_after):
+            core.segment(segnet, small)
+        assert core.seg_pixel_limit() == 500*500 # re-probed
+        assert json.loads(limits_file.read_text())['oom_limits']['seg'] is None
+    finally:
+        core.reset_oom_limits()
+        core.set_limits(*old_limits[:2])
+        core.limits_path = old_limits[2]
+
+def test_non_oom_errors_are_not_swallowed():
+    def segnet(bat): raise ValueError('bug')
+    with pytest.raises(ValueError):
+        core.segment(segnet, np.zeros((32,32,3), np.float32))
+
+def test_memory_budget_splits_before_running_the_net():
+    shapes = []
+    def segnet(bat):
+        shapes.append(bat.shape)
+        return bat
+    core.set_memory_budget(64*64 * core.seg_bytes_per_pixel)
+    try:
+        core.segment(segnet, np.zeros((128,128,3), np.float32))
+    finally:
+        core.set_memory_budget(None)
+    assert all(h*w < 64*64 for _,h,w,_ in shapes)
+
+def test_parse_cpus():
+    assert core.parse_cpus('0-3,6') == [0,1,2,3,6]
+    assert core.parse_cpus(' 2 , 5-5 ') == [2,5]
+    assert core.parse_cpus('') == []
+
+def test_session_config_from_settings():
+    old = (core.intra_op_threads, core.inter_op_threads, core.cpus, core.graph_optimizations)
+    try:
+        core.set_session_config(4, 2, [0,1], optimize=False)
+        config = engines.session_config(core.engine_settings())
+        assert config.intra_op_parallelism_threads == 4
+        assert config.inter_op_parallelism_threads == 2
+        assert config.graph_options.rewrite_options.disable_meta_optimizer
+        assert core.cpus == (0,1)
+    finally:
+        core.set_session_config(*old)
+
+def tiny_frozen_graph(path):
+    graph = tf.Graph()
+    with graph.as_default():
+        x = tf.compat.v1.placeholder(tf.float32, [None], name='INPUT')
+        tf.identity(x * 2.0, name='OUTPUT')
+        tf.identity(x + 1.0, name='unused')
+    path.write_bytes(graph.as_graph_def().SerializeToString())
+    return str(path)
+
+def test_optimized_graph_is_pruned_and_cached(tmp_path):
+    path = tiny_frozen_graph(tmp_path / 'net.pb')
+    cache_dir = str(tmp_path / 'cache')
+    names = {node.name for node in engines.load_graph_def(path, ['OUTPUT'], True, cache_dir).node}
+    assert 'OUTPUT' in names and 'unused' not in names
+    assert len(os.listdir(cache_dir)) == 1
+
+    old = (core.optimize_graphs, core.graph_cache_dir)
+    try:
+        core.set_graph_loading(True, cache_dir)
+        net = engines.TFEngine(path, 'INPUT:0', 'OUTPUT:0').load(core.engine_settings())
+        assert net.run([1., 2.]).tolist() == [2., 4.]
+        assert net.describe()['inputs'] == [('INPUT:0', [None], 'float32')]
+        net.close()
+        assert len(os.listdir(cache_dir)) == 1
+    finally:
+        core.set_graph_loading(*old)
+
+def test_segmap_loads_only_snet():
+    core.close_global_session()
+    core.set_engine('stub')
+    try:
+        core.segmap(np.zeros((32,32,3), np.uint8))
+        core.segmap(np.zeros((32,32,3), np.uint8))
+        assert core._snet is not None and core._cnet is None
+    finally:
+        core.close_global_session()
+        core.set_engine('tf')
+
+def test_segment_normalize_matches_float32_input():
+    img = np.random.randint(0, 256, (40,52,3), dtype=np.uint8)
+    net = lambda bat: bat * 2 # any pixelwise net
+    expected = core.segment(net, iu.float32(img))
+    assert np.array_equal(core.segment(net, img, normalize=True), expected)
+    assert np.array_equal(core.segment_batch(net, [img], normalize=True)[0], expected)
+
+def test_debug_checks_catch_out_of_range_input():
+    bad = np.full((16,16,3), 300.0)
+    net = lambda bat: bat.copy()
+    core.segment(net, bad, normalize=True) # unchecked by default
+    core.set_debug_checks(True)
+    try:
+        with pytest.raises(AssertionError):
+            core.segment(net, bad, normalize=True)
+    finally:
+        core.set_debug_checks(False)
+
+def test_inpaint_rois_only_changes_masked_pixels():
+    fed = []
+    def complnet(bat): # image|segmap side by side -> all 7s
+        fed.append(bat.shape)
+        return np.full((bat.shape[0], bat.shape[1], bat.shape[2] // 2, 3), 7, np.uint8)
+    img = np.random.randint(0, 256, (400,300,3), dtype=np.uint8)
+    mask = np.zeros_like(img)
+    mask[50:70, 40:90] = 255
+    mask[300:320, 200:260] = 255
+    core.set_roi(True, margin=16, merge_gap=8)
+    try:
+        ret, = core.inpaint_rois(complnet, [img], [mask])
+        assert np.array_equal(ret[mask == 0], img[mask == 0])
+        assert (ret[mask > 0] == 7).all()
+        assert sum(h * w // 2 for _, h, w, _ in fed) < img.shape[0] * img.shape[1] // 4
+
+        full = np.full_like(img, 255) # mostly masked: whole page at once
+        fed.clear()
+        ret, = core.inpaint_rois(complnet, [img], [full])
+        assert (ret == 7).all() and len(fed) == 1 and fed[0][1] == 400
+    finally:
+        core.set_roi(False)
+
+def test_cpu_affinity_is_ignored_without_sched_setaffinity(monkeypatch, capsys):
+    monkeypatch.delattr(os, 'sched_setaffinity', raising=False)
+    core.set_cpu_affinity([0])
+    assert 'not supported' in capsys.readouterr().out
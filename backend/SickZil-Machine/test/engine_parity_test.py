@@ -0,0 +1,55 @@
+import os,sys
+sys.path.append( os.path.abspath('../src') )
+
+import abc
+import subprocess
+import numpy as np
+import pytest
+import cv2
+
+import engines
+import precision_gate as pg
+
+PAGES = ['./fixture/real_proj/images/bw1.png', './fixture/real_proj/images/bgr1.png']
+# Engines may differ a little (kernels, fused ops); beyond this they disagree
+MASK_TOLERANCE = 0.005     # fraction of mask pixels
+INPAINT_TOLERANCE = 2.0    # mean absolute difference of uint8 pixels
+
+# (reference, candidate) as (engine, precision)
+PAIRS = [
+    (('tf', 'fp32'), ('onnx', 'fp32')),
+    (('stub', 'fp32'), ('stub', 'fp16')),
+    (('stub', 'fp32'), ('stub', 'int8')),
+]
+
+@pytest.mark.parametrize('ref,candidate', PAIRS, ids=lambda p: '%s-%s' % p)
+def test_engine_matches_reference(ref, candidate):
+    if not (engines.available(*ref) and engines.available(*candidate)):
+        pytest.skip('needs the %s and %s runtimes and model files' % (ref[0], candidate[0]))
+    pages = [cv2.imread(path) for path in PAGES]
+    ref_masks, ref_imgs = pg.run(*ref, pages)
+    # inpaint the reference masks, to compare inpainting and not the consequences of mask differences
+    masks, imgs = pg.run(*candidate, pages, ref_masks)
+    for ref_mask, ref_img, mask, img in zip(ref_masks, ref_imgs, masks, imgs):
+        assert np.mean(ref_mask != mask) <= MASK_TOLERANCE
+        assert np.mean(np.abs(ref_img.astype(np.int16) - img)) <= INPAINT_TOLERANCE
+
+def test_stub_engine_runs_the_whole_core_pipeline():
+    page = np.full((40,60,3), 255, np.uint8)
+    page[10:20, 10:30] = 0 # "text"
+    (mask,), (inpainted,) = pg.run('stub', 'fp32', [page])
+    assert mask.shape == page.shape and mask.dtype == np.uint8
+    assert (mask[10:20, 10:30] == 255).all() and mask.sum() == 255 * 3 * 10 * 20
+    assert (inpainted == 255).all()
+
+def test_engines_implement_the_interface():
+    assert issubclass(engines.Engine, abc.ABC)
+    with pytest.raises(TypeError):
+        engines.Engine()
+    for cls in engines.ENGINES.values():
+        assert issubclass(cls, engines.Engine) and not cls.__abstractmethods__
+
+def test_core_imports_no_runtime_until_a_net_loads():
+    code = ("import sys; sys.path.append('../src'); import core; "
+            "assert 'tensorflow' not in sys.modules and 'onnxruntime' not in sys.modules")
+    subprocess.check_call([sys.executable, '-c', code])
@@ -35,3 +35,43 @@ def test_imread_kor_win_path():
 def test_is_img_file__if_loadable_then_file_is_image():
     for path in fu.children('./private_fixtures/broken_imghdr/'):
         assert iu.is_img_file(path)
+
+import numpy as np
+@pytest.mark.parametrize('h,w,H,W', [(5,7,16,16), (37,50,512,64), (16,16,16,16)])
+def test_pad_into_is_same_as_reflect_np_pad(h,w,H,W):
+    img = np.random.rand(h,w,3)
+    expected = np.pad(img, [(0,H-h),(0,W-w),(0,0)], mode='reflect')
+    assert np.array_equal(iu.pad_into(np.empty((H,W,3)), img), expected)
+
+@pytest.mark.parametrize('origin_map', [
+    iu.rgb2wk_map,
+    {(1.,0.,0.): [0.,0.,0.], (0.,1.,0.): [1.,1.,1.], (0.,0.,1.): [.5,.5,.5]},
+])
+def test_argmax_lut_matches_map_max_row_decategorize(origin_map):
+    n_classes = len(origin_map)
+    scores = np.random.rand(37, 50, n_classes).astype(np.float32)
+    scores[0,0] = 0.5 # tie goes to the first class, like argmax
+    expected = iu.uint8(iu.decategorize(iu.map_max_row(scores), origin_map))[...,0]
+
+    lut = iu.categorized_lut(origin_map, n_classes)
+    assert np.array_equal(iu.argmax_lut(scores, lut), expected)
+    out = np.empty((37,50), np.uint8)
+    assert iu.argmax_lut(scores, lut, out) is out
+    assert np.array_equal(out, expected)
+
+@pytest.mark.parametrize('h,w,H,W', [(5,7,16,16), (37,50,64,64)])
+def test_pad_into_normalize_equals_float32_then_pad(h,w,H,W):
+    img = np.random.randint(0, 256, (h,w,3), dtype=np.uint8)
+    expected = np.pad(iu.float32(img), [(0,H-h),(0,W-w),(0,0)], mode='reflect')
+    dst = iu.pad_into(np.empty((H,W,3), np.float32), img, normalize=True)
+    assert dst.dtype == np.float32
+    assert np.array_equal(dst, expected)
+
+def test_mask_boxes_grow_clip_and_merge_nearby_regions():
+    mask = np.zeros((100,200), np.uint8)
+    mask[10:20, 10:20] = 255   # these two are 5px apart: merged
+    mask[10:20, 25:30] = 255
+    mask[80:90, 150:195] = 255 # far away
+    boxes = sorted(iu.mask_boxes(mask, margin=8, gap=0))
+    assert boxes == [(2,28, 2,38), (72,98, 142,200)]
+    assert iu.mask_boxes(np.zeros((10,10), np.uint8)) == []
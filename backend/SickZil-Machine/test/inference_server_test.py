@@ -0,0 +1,95 @@
+import os,sys
+sys.path.append( os.path.abspath('../src') )
+
+import numpy as np
+import pytest
+from inference_server import InferenceServer, to_shm, from_shm, release, split_cpus
+
+NUMPY_OPS = {'segmap':'numpy:negative', 'inpainted':'numpy:add'}
+
+def test_shm_roundtrip():
+    arr = np.arange(24, dtype=np.uint8).reshape(2,4,3)
+    shm, desc = to_shm(arr)
+    shm2, ret = from_shm(desc)
+    release(shm2)
+    release(shm, unlink=True)
+    assert ret.dtype == arr.dtype
+    assert np.array_equal(ret, arr)
+
+@pytest.fixture(scope='module')
+def server():
+    with InferenceServer(2, ops=NUMPY_OPS, init=None) as srv:
+        yield srv
+
+def test_server_mirrors_ops(server):
+    img = np.random.rand(32,48,3).astype(np.float32)
+    assert np.array_equal(server.segmap(img), -img)
+    assert np.array_equal(server.inpainted(img, img), img + img)
+
+def test_server_mirrors_batch_ops(server):
+    imgs = [np.full((8,8+i,3), i, np.int32) for i in range(5)]
+    assert [m.sum() for m in server.segmaps(imgs)] == [-img.sum() for img in imgs]
+    assert [m.shape for m in server.inpainteds(imgs, imgs)] == [img.shape for img in imgs]
+
+def test_server_keeps_request_order(server):
+    futures = [server.submit('segmap', np.full((16,16,3), i, np.int32))
+               for i in range(20)]
+    assert [int(f.result()[0,0,0]) for f in futures] == [-i for i in range(20)]
+
+def test_worker_error_is_raised(server):
+    with pytest.raises(RuntimeError, match='ValueError'):
+        server.inpainted(np.zeros((4,4,3)), np.zeros((5,5,3)))
+    # worker survives the error
+    assert server.segmap(np.ones((2,2,3))).sum() == -12
+
+def test_split_cpus():
+    assert split_cpus(range(8), 3) == [[0,1,2],[3,4,5],[6,7]]
+    assert split_cpus([0,1], 2) == [[0],[1]]
+
+def die(arr):
+    os._exit(3)  # like an OOM kill: no response is sent
+
+def nap(arr):
+    import time
+    time.sleep(float(arr))
+    return arr
+
+def test_dead_worker_fails_its_requests():
+    from inference_server import WorkerDied
+    ops = {'segmap':'numpy:negative', 'exit':'inference_server_test:die'}
+    with InferenceServer(1, ops=ops, init=None) as srv:
+        future = srv.submit('exit', np.array(3))
+        with pytest.raises(WorkerDied):
+            future.result(timeout=30)
+        # the input block was unlinked
+        assert not srv._pending
+        with pytest.raises(WorkerDied):
+            srv.segmap(np.ones((2,2,3)))
+
+def test_timeout_abandons_request():
+    from concurrent.futures import TimeoutError
+    ops = {'sleep':'inference_server_test:nap', 'segmap':'numpy:negative'}
+    with InferenceServer(1, ops=ops, init=None, timeout=0.2) as srv:
+        with pytest.raises(TimeoutError):
+            srv.call('sleep', np.array(1.0))
+        assert not srv._pending
+        # the late result is dropped, the next request still works
+        srv.timeout = 30
+        assert srv.segmap(np.ones((2,2,3))).sum() == -12
+
+def bucketed(arr):
+    import core
+    core.set_buckets([32])
+    core.padded_batch([(arr,)], 16)
+    return arr
+
+def test_server_collects_worker_stats():
+    import core
+    local_hits = core.bucket_stats()['hits']
+    ops = {'bucketed':'inference_server_test:bucketed'}
+    with InferenceServer(2, ops=ops, init=None) as srv:
+        for future in [srv.submit('bucketed', np.ones((20,20,3), np.uint8)) for _ in range(6)]:
+            future.result(timeout=30)
+        counts = core.merge_stats_counts(srv.stats())
+    assert core.bucket_stats(counts['buckets'])['hits'] == 6
+    assert core.bucket_stats()['hits'] == local_hits # nothing ran in this process
@@ -0,0 +1,48 @@
+import os,sys
+sys.path.append( os.path.abspath('../src') )
+
+import numpy as np
+import pytest
+
+import core
+import engines
+import precision_gate as pg
+
+def pages():
+    rng = np.random.RandomState(22)
+    return [rng.randint(0, 256, (48,64,3)).astype(np.uint8) for _ in range(3)]
+
+def test_mask_iou_and_psnr():
+    a = np.zeros((4,4), np.uint8); a[:2] = 255
+    b = np.zeros((4,4), np.uint8); b[:1] = 255
+    assert pg.mask_iou(a, b) == 0.5
+    assert pg.mask_iou(a*0, b*0) == 1.0
+    assert pg.psnr(a, a) == float('inf')
+    assert pg.psnr(np.zeros(4), np.full(4, 255)) == 0.0
+
+@pytest.fixture
+def stub_engine():
+    core.set_engine('stub')
+    yield
+    core.close_global_session()
+    core.set_engine('tf')
+    core.precision = 'fp32'
+
+def test_reduced_precision_needs_a_passing_evaluation(stub_engine, tmp_path):
+    report_path = str(tmp_path / 'report.json')
+    assert core.set_precision('int8', report_path) == 'fp32' # not evaluated yet
+
+    result = pg.evaluate(pages(), 'int8', engine='stub')
+    assert 0.9 < result['mask_iou'] < 1.0 # rounding flips a few pixels
+    assert result['inpaint_psnr'] == float('inf') # same mask in, same image out
+    pg.save_report({'stub': {'int8': result}}, report_path)
+
+    assert core.set_precision('int8', report_path, min_iou=0.9) == 'int8'
+    assert core.engine_settings()['precision'] == 'int8'
+    ok, reason = pg.check('int8', 'stub', report_path, min_iou=0.999)
+    assert not ok and 'IoU' in reason
+    assert core.set_precision('int8', report_path, min_iou=0.999) == 'fp32'
+
+def test_tf_engine_has_no_reduced_precision():
+    with pytest.raises(ValueError):
+        engines.TFEngine.for_net('snet', 'fp16')
@@ -3,19 +3,24 @@ import sys
 import csv
 import io
 import base64
-import uuid
-from flask import Flask, request, jsonify
+import json
+import queue
+import threading
+from contextlib import ExitStack, contextmanager
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from PIL import Image
 import numpy as np
 from dotenv import load_dotenv
-import tensorflow as tf
 # Import our existing manga translation modules
-from ocr import OCR
-from image_processing.text_segmentation import TextSegmentation
-from image_processing.text_bounding import TextBounding
-from translation.deepl import translate_deepl
+from models import registry
+from pipeline import process_page, process_pages, save_page, save_image
 from typesetting import overlay_translated_text
+import jobs
+import metrics
+from storage import UploadStore
+from derivatives import DerivativeCache, PRESETS, FORMATS, MAX_WIDTH
+from jobs import JobQueueFull
 
 # Load environment variables
 load_dotenv()
@@ -25,7 +30,7 @@ app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
 # Create required directories
-OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "output")
+OUTPUT_DIR = os.getenv("OUTPUT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "output"))
 UPLOAD_DIR = os.path.join(OUTPUT_DIR, "uploads")
 INPAINTED_DIR = os.path.join(OUTPUT_DIR, "inpainted")
 TEXT_ONLY_DIR = os.path.join(OUTPUT_DIR, "text_only")
@@ -33,17 +38,62 @@ BOXED_DIR = os.path.join(OUTPUT_DIR, "boxed")
 TRANSLATED_DIR = os.path.join(OUTPUT_DIR, "translated")
 CSV_DIR = os.path.join(OUTPUT_DIR, "csv")
 
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(INPAINTED_DIR, exist_ok=True)
-os.makedirs(TEXT_ONLY_DIR, exist_ok=True)
-os.makedirs(BOXED_DIR, exist_ok=True)
-os.makedirs(TRANSLATED_DIR, exist_ok=True)
-os.makedirs(CSV_DIR, exist_ok=True)
+_image_locks = {}
+_image_locks_lock = threading.Lock()
+
+# Seconds between keep-alive comments on idle /api/process/<id>/events streams
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", "15"))
+
+# Values read when /api/metrics is scraped
+def collect_metrics():
+    samples = [
+        ('manga_jobs_queued', 'gauge', 'Jobs waiting for a worker', {}, job_queue.pending()),
+        ('manga_models_ready', 'gauge', 'Whether the models are loaded', {}, int(registry.is_ready())),
+    ]
+    for name, seconds in registry.load_times.items():
+        samples.append(('manga_model_load_seconds', 'gauge', 'Time taken to load each model',
+                        {'model': name}, seconds))
+    return samples
+
+# Inference workers (INFERENCE_WORKERS) are spawned processes that re-import this
+# file as __mp_main__; only the server process creates the stores and starts the
+# job workers and model loading.
+if __name__ != '__mp_main__':
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    os.makedirs(INPAINTED_DIR, exist_ok=True)
+    os.makedirs(TEXT_ONLY_DIR, exist_ok=True)
+    os.makedirs(BOXED_DIR, exist_ok=True)
+    os.makedirs(TRANSLATED_DIR, exist_ok=True)
+    os.makedirs(CSV_DIR, exist_ok=True)
+
+    # Uploads are stored by content hash so identical pages share their results
+    upload_store = UploadStore(UPLOAD_DIR, os.path.join(OUTPUT_DIR, "uploads.sqlite3"))
+
+    # Thumbnails and previews generated on demand (DERIVATIVE_CACHE_MB bounds the disk use)
+    derivative_cache = DerivativeCache(
+        os.path.join(OUTPUT_DIR, "derivatives"),
+        max_bytes=int(os.getenv("DERIVATIVE_CACHE_MB", "512")) * 1024 * 1024
+    )
+
+    # Background workers for ?async=1 processing (JOB_WORKERS, JOB_QUEUE_SIZE)
+    job_queue = jobs.from_env()
+    job_queue.start()
+
+    # Load and warm up the models once per process (set PRELOAD_MODELS=0 to load lazily)
+    if os.getenv("PRELOAD_MODELS", "1") != "0":
+        registry.load_async()
+    else:
+        registry.load_lazily()
+
+    metrics.add_collector(collect_metrics)
 
 # Health check endpoint
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'ok'})
+    status = registry.status()
+    if registry.is_healthy():
+        return jsonify({'status': 'ok', 'models': status})
+    return jsonify({'status': status['state'], 'models': status}), 503
 
 # Upload manga image endpoint
 @app.route('/api/upload', methods=['POST'])
@@ -55,240 +105,496 @@ def upload_image():
     if image_file.filename == '':
         return jsonify({'error': 'No image selected'}), 400
     
-    # Generate unique filename
+    # Save the uploaded image under the hash of its content
     original_filename = image_file.filename
     file_ext = os.path.splitext(original_filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    upload_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
-    # Save the uploaded image
-    image_file.save(upload_path)
+    image_id, _, is_new = upload_store.save(image_file.stream, file_ext)
     
     return jsonify({
-        'message': 'Image uploaded successfully',
-        'image_id': os.path.splitext(unique_filename)[0],
+        'message': 'Image uploaded successfully' if is_new else 'Image already uploaded',
+        'image_id': image_id,
         'original_filename': original_filename
     })
-    
-def process_translation_to_csv(csv_file_path, ocr_results, bounding_boxes):
-    # Replace the CSV file if it already exists
-    with open(csv_file_path, "w", newline="", encoding="utf-8") as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerow(["Original Text", "Translated Text", "x", "y", "w", "h"])
-
-    # Initialize OCR
-    ocr = OCR()
-
-    # Process each cropped region for OCR and translation
-    with open(csv_file_path, "a", newline="", encoding="utf-8") as csv_file:
-        writer = csv.writer(csv_file)
-        for ocr_image, (x, y, w, h) in zip(ocr_results, bounding_boxes):
-            # Skip invalid bounding boxes
-            if w <= 0 or h <= 0:
-                print(f"Skipping invalid bounding box: x={x}, y={y}, w={w}, h={h}")
-                continue
 
-            # Convert numpy.ndarray to PIL.Image
-            if isinstance(ocr_image, np.ndarray):
-                ocr_image = Image.fromarray(ocr_image)
+# Delete image endpoint
+# Identical uploads share one image id, so artifacts are only removed with the last reference.
+@app.route('/api/images/<image_id>', methods=['DELETE'])
+def delete_image(image_id):
+    if find_upload(image_id) is None:
+        return jsonify({'error': 'Image not found'}), 404
 
-            # Extract text using OCR
-            original_text = ocr.extract_text(ocr_image)
+    def remove_files():
+        for directory in [UPLOAD_DIR, INPAINTED_DIR, TEXT_ONLY_DIR, BOXED_DIR, TRANSLATED_DIR, CSV_DIR]:
+            for f in os.listdir(directory):
+                if f.startswith(image_id):
+                    os.remove(os.path.join(directory, f))
+        derivative_cache.purge(image_id)
 
-            # Translate the text using DeepL
-            translated_text = translate_deepl(original_text)
+    # The files go under the store's lock (which uploads take too) and the image's
+    # lock (which processing holds), so neither sees them half removed
+    with image_lock(image_id):
+        remaining = upload_store.release(image_id, on_last=remove_files)
 
-            # Write the original and translated text, and bounding box to the CSV file
-            writer.writerow([original_text, str(translated_text), x, y, w, h])
-            print(f"Processed and added translation for bounding box {x}, {y}, {w}, {h} to CSV.")
-            
+    return jsonify({
+        'message': 'Image deleted' if remaining == 0 else 'Image reference released',
+        'references': remaining
+    })
+    
 def display_translated_image(img_path):
     img = Image.open(img_path)
     img.show()
 
+def read_translations(csv_file_path):
+    """Read the translations CSV into the list of dicts returned by the API."""
+    translations = []
+    with open(csv_file_path, "r", newline="", encoding="utf-8") as csv_file:
+        reader = csv.reader(csv_file)
+        next(reader)  # Skip header
+        for i, row in enumerate(reader):
+            if len(row) >= 6:  # Ensure we have enough columns
+                translations.append({
+                    'id': i,
+                    'original_text': row[0],
+                    'translated_text': row[1],
+                    'bbox': [int(row[2]), int(row[3]), int(row[4]), int(row[5])]
+                })
+    return translations
+
+def find_upload(image_id):
+    """Return the path of the uploaded image, or None if it doesn't exist."""
+    return upload_store.find(image_id)
+
+@contextmanager
+def image_lock(image_id):
+    """
+    Serialize the processing and deletion of one image id.
+    Locks are counted by their users and dropped once none is left.
+    """
+    with _image_locks_lock:
+        lock, users = _image_locks.get(image_id, (None, 0))
+        lock = lock or threading.Lock()
+        _image_locks[image_id] = (lock, users + 1)
+    try:
+        with lock:
+            yield
+    finally:
+        with _image_locks_lock:
+            users = _image_locks[image_id][1] - 1
+            if users:
+                _image_locks[image_id] = (lock, users)
+            else:
+                del _image_locks[image_id]
+
+def resized_path(image_id, img_path):
+    """Where the page is kept at the size it was processed, next to the untouched upload."""
+    return os.path.join(UPLOAD_DIR, f"{image_id}_resized{os.path.splitext(img_path)[1]}")
+
+def page_url(image_id, img_path):
+    """URL of the page the boxes and images of the result line up with."""
+    path = resized_path(image_id, img_path)
+    return f"/api/images/uploads/{os.path.basename(path if os.path.exists(path) else img_path)}"
+
+def processed_result(image_id, img_path):
+    """Return the response for an already processed image, or None."""
+    translated_img_path = os.path.join(TRANSLATED_DIR, f"{image_id}_translated.png")
+    csv_file_path = os.path.join(CSV_DIR, f"{image_id}_translations.csv")
+
+    # If both the translated image and CSV file exist, the image has been processed before
+    if not (os.path.exists(translated_img_path) and os.path.exists(csv_file_path)):
+        return None
+
+    translations = read_translations(csv_file_path)
+
+    # Find existing files
+    inpainted_files = [f for f in os.listdir(INPAINTED_DIR) if f.startswith(image_id)]
+    text_only_files = [f for f in os.listdir(TEXT_ONLY_DIR) if f.startswith(image_id)]
+    boxed_files = [f for f in os.listdir(BOXED_DIR) if f.startswith(image_id)]
+
+    # Return paths to existing processed files
+    return {
+        'message': 'Image already processed',
+        'original_image': page_url(image_id, img_path),
+        'inpainted_image': f"/api/images/inpainted/{inpainted_files[0]}" if inpainted_files else "",
+        'text_only_image': f"/api/images/text_only/{text_only_files[0]}" if text_only_files else "",
+        'boxed_image': f"/api/images/boxed/{boxed_files[0]}" if boxed_files else "",
+        'translated_image': f"/api/images/translated/{image_id}_translated.png",
+        'translations': translations,
+        'redirect_url': f"/view/{image_id}"
+    }
+
+def run_pipeline(image_id, img_path, job=None, events=None):
+    """
+    Run segmentation, inpainting, OCR, translation and typesetting for one page.
+    Stages pass images in memory; files are only written at the end.
+    If `job` is given, the current stage is reported on it as the pipeline advances.
+    If `events(name, data)` is given, it receives JSON-ready progress events
+    (see process_stream); the text-only and inpainted images are then written
+    as soon as they exist so their URLs can be sent.
+    """
+    report = job.report if job is not None else None
+    file_name = os.path.basename(img_path)
+    paths = page_paths(image_id, img_path)
+
+    page_events = None
+    if events is not None:
+        def page_events(name, data):
+            if name in ('text_only', 'inpainted'):
+                save_image(paths.pop(name), data)
+                data = {'image': f"/api/images/{name}/{file_name}"}
+            events(name, data)
+
+    with image_lock(image_id):
+        # An identical upload may have been processed while we waited
+        existing = processed_result(image_id, img_path)
+        if existing is not None:
+            return existing
+
+        with metrics.trace(f"Page {image_id}"):
+            # Process the image in memory
+            result = process_page(registry.segmenter().load(img_path), report, events=page_events)
+
+            # Encode every artifact to disk
+            save_page(result, paths)
+    
+    # Return response with paths to all processed images
+    return processed_response(image_id, img_path, result)
+
+def page_paths(image_id, img_path):
+    """Where save_page writes the artifacts of one page."""
+    file_name = os.path.basename(img_path)
+    return {
+        'image': resized_path(image_id, img_path),
+        'inpainted': os.path.join(INPAINTED_DIR, file_name),
+        'text_only': os.path.join(TEXT_ONLY_DIR, file_name),
+        'boxed': os.path.join(BOXED_DIR, file_name),
+        'translated': os.path.join(TRANSLATED_DIR, f"{image_id}_translated.png"),
+        'csv': os.path.join(CSV_DIR, f"{image_id}_translations.csv"),
+    }
+
+def processed_response(image_id, img_path, result):
+    """The response for a page just processed into `result` (a PageResult)."""
+    file_name = os.path.basename(img_path)
+    return {
+        'message': 'Image processed successfully',
+        'original_image': page_url(image_id, img_path),
+        'inpainted_image': f"/api/images/inpainted/{file_name}",
+        'text_only_image': f"/api/images/text_only/{file_name}",
+        'boxed_image': f"/api/images/boxed/{file_name}",
+        'translated_image': f"/api/images/translated/{image_id}_translated.png",
+        'translations': result.translations,
+        'redirect_url': f"/view/{image_id}"
+    }
+
+def run_chapter(pages, job=None):
+    """
+    run_pipeline for several pages, given as [(image_id, img_path)..].
+    The pages not processed yet go through process_pages together, so the
+    networks run on batches of pages. Returns {'pages': [result..]} in order.
+    """
+    report = job.report if job is not None else None
+    unique = dict(pages)
+    with ExitStack() as stack:
+        # Locks taken in one order, so chapters sharing pages can't deadlock
+        for image_id in sorted(unique):
+            stack.enter_context(image_lock(image_id))
+
+        results = {}
+        todo = []
+        for image_id, img_path in unique.items():
+            existing = processed_result(image_id, img_path)
+            if existing is None:
+                todo.append((image_id, img_path))
+            else:
+                results[image_id] = existing
+
+        if todo:
+            with metrics.trace(f"Chapter of {len(todo)} pages"):
+                images = [registry.segmenter().load(img_path) for _, img_path in todo]
+                for (image_id, img_path), result in zip(todo, process_pages(images, report)):
+                    save_page(result, page_paths(image_id, img_path))
+                    results[image_id] = processed_response(image_id, img_path, result)
+
+    return {'pages': [results[image_id] for image_id, _ in pages]}
+
 # Process manga image endpoint
+# With ?async=1 the page is queued and a job id is returned immediately.
 @app.route('/api/process/<image_id>', methods=['POST'])
 def process_image(image_id):
     # Locate the image
-    for ext in ['.jpg', '.jpeg', '.png']:
-        img_path = os.path.join(UPLOAD_DIR, f"{image_id}{ext}")
-        if os.path.exists(img_path):
-            break
-    else:
+    img_path = find_upload(image_id)
+    if img_path is None:
         return jsonify({'error': 'Image not found'}), 404
     
     # Check if this image has already been processed
-    translated_img_path = os.path.join(TRANSLATED_DIR, f"{image_id}_translated.png")
-    csv_file_path = os.path.join(CSV_DIR, f"{image_id}_translations.csv")
-    
-    # If both the translated image and CSV file exist, the image has been processed before
-    if os.path.exists(translated_img_path) and os.path.exists(csv_file_path):
-        # Read existing translations from CSV
-        translations = []
-        with open(csv_file_path, "r", newline="", encoding="utf-8") as csv_file:
-            reader = csv.reader(csv_file)
-            next(reader)  # Skip header
-            for i, row in enumerate(reader):
-                if len(row) >= 6:  # Ensure we have enough columns
-                    translations.append({
-                        'id': i,
-                        'original_text': row[0],
-                        'translated_text': row[1],
-                        'bbox': [int(row[2]), int(row[3]), int(row[4]), int(row[5])]
-                    })
-        
-        # Find existing files
-        inpainted_files = [f for f in os.listdir(INPAINTED_DIR) if f.startswith(image_id)]
-        text_only_files = [f for f in os.listdir(TEXT_ONLY_DIR) if f.startswith(image_id)]
-        boxed_files = [f for f in os.listdir(BOXED_DIR) if f.startswith(image_id)]
-        
-        # Return paths to existing processed files
+    result = processed_result(image_id, img_path)
+    metrics.CACHE.inc(cache='page', result='miss' if result is None else 'hit')
+    if result is not None:
+        return jsonify(result)
+
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        try:
+            job = job_queue.submit(run_pipeline, image_id, img_path)
+        except JobQueueFull as e:
+            return jsonify({'error': str(e)}), 503
         return jsonify({
-            'message': 'Image already processed',
-            'original_image': f"/api/images/uploads/{os.path.basename(img_path)}",
-            'inpainted_image': f"/api/images/inpainted/{inpainted_files[0]}" if inpainted_files else "",
-            'text_only_image': f"/api/images/text_only/{text_only_files[0]}" if text_only_files else "",
-            'boxed_image': f"/api/images/boxed/{boxed_files[0]}" if boxed_files else "",
-            'translated_image': f"/api/images/translated/{image_id}_translated.png",
-            'translations': translations,
-            'redirect_url': f"/view/{image_id}"
-        })
+            'message': 'Image queued for processing',
+            'job_id': job.id,
+            'status_url': f"/api/jobs/{job.id}",
+            'result_url': f"/api/jobs/{job.id}/result"
+        }), 202
     
     try:
-        # Initialize the TextSegmentation class
-        segmenter = TextSegmentation()
+        return jsonify(run_pipeline(image_id, img_path))
+    except Exception as e:
+        return jsonify({'error': f'Error processing image: {str(e)}'}), 500
 
-        # Process the image
-        inpainted_path, text_only_path = segmenter.segmentPage(img_path, INPAINTED_DIR, TEXT_ONLY_DIR)
+# Process several uploads (e.g. the pages of a chapter) as one job
+# Body: {"image_ids": [..]}. The job result is {"pages": [..]}, one
+# POST /api/process/<image_id> result per id, in order.
+@app.route('/api/chapters', methods=['POST'])
+def process_chapter():
+    data = request.json
+    image_ids = data.get('image_ids') if data else None
+    if not image_ids or not isinstance(image_ids, list):
+        return jsonify({'error': 'No image ids provided'}), 400
 
-        # Initialize the TextBounding class 
-        text_bounding = TextBounding()
+    pages = []
+    for image_id in image_ids:
+        img_path = find_upload(image_id)
+        if img_path is None:
+            return jsonify({'error': f'Image not found: {image_id}'}), 404
+        pages.append((image_id, img_path))
 
-        # Process the text-only image for OCR bounding
-        ocr_results = text_bounding.process_text_regions(text_only_path)
+    try:
+        job = job_queue.submit(run_chapter, pages)
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({
+        'message': 'Chapter queued for processing',
+        'job_id': job.id,
+        'status_url': f"/api/jobs/{job.id}",
+        'result_url': f"/api/jobs/{job.id}/result"
+    }), 202
 
-        # Draw and save boxes around detected text regions  
-        boxed_image_path = text_bounding.draw_boxes(text_only_path, BOXED_DIR)
+def sse(name, data):
+    """One server-sent event."""
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-        # Define the CSV output path
-        output_csv_file = os.path.join(CSV_DIR, f"{image_id}_translations.csv")
-        
-        # Process translations and save to CSV
-        bounding_boxes = text_bounding.detect_text_regions(text_only_path)
-        process_translation_to_csv(output_csv_file, ocr_results, bounding_boxes)
-        
-        # Read the translations we just created
-        translations = []
-        with open(output_csv_file, "r", newline="", encoding="utf-8") as csv_file:
-            reader = csv.reader(csv_file)
-            next(reader)  # Skip header
-            for i, row in enumerate(reader):
-                if len(row) >= 6:  # Ensure we have enough columns
-                    translations.append({
-                        'id': i,
-                        'original_text': row[0],
-                        'translated_text': row[1],
-                        'bbox': [int(row[2]), int(row[3]), int(row[4]), int(row[5])]
-                    })
-        
-        # Overlay translations on the inpainted image
-        translated_img_path = os.path.join(TRANSLATED_DIR, f"{image_id}_translated.png")
-        overlay_translated_text(inpainted_path, output_csv_file, translated_img_path)
-        
-        # Return response with paths to all processed images
-        return jsonify({
-            'message': 'Image processed successfully',
-            'original_image': f"/api/images/uploads/{os.path.basename(img_path)}",
-            'inpainted_image': f"/api/images/inpainted/{os.path.basename(inpainted_path)}",
-            'text_only_image': f"/api/images/text_only/{os.path.basename(text_only_path)}",
-            'boxed_image': f"/api/images/boxed/{os.path.basename(boxed_image_path)}",
-            'translated_image': f"/api/images/translated/{image_id}_translated.png",
-            'translations': translations,
-            'redirect_url': f"/view/{image_id}"
-        })
-        
+def stream_pipeline(image_id, img_path, events, job=None):
+    """
+    run_pipeline for a job, ending the event stream with 'done' or 'error'.
+    run_pipeline returns once every image the result links to is on disk, so
+    the viewer can load them as soon as 'done' arrives.
+    """
+    try:
+        result = run_pipeline(image_id, img_path, job, events)
     except Exception as e:
-        return jsonify({'error': f'Error processing image: {str(e)}'}), 500
+        events('error', {'error': f'Error processing image: {str(e)}'})
+        raise
+    events('done', result)
+    return result
+
+# Process manga image with live progress, as server-sent events:
+#   stage {stage}           - the pipeline entered a stage (segment, detect, translate, typeset)
+#   text_only / inpainted   - {image}: URL of the image, ready to display
+#   ocr {id, original_text, bbox} and translation {id, original_text, translated_text, bbox}
+#                           - one per bubble, as soon as it is read / translated
+#   done                    - the same result as POST /api/process/<image_id>
+#   error {error}
+# The page runs on the job queue, so it finishes even if the client goes away.
+@app.route('/api/process/<image_id>/events', methods=['GET'])
+def process_stream(image_id):
+    img_path = find_upload(image_id)
+    if img_path is None:
+        return jsonify({'error': 'Image not found'}), 404
+
+    result = processed_result(image_id, img_path)
+    metrics.CACHE.inc(cache='page', result='miss' if result is None else 'hit')
+    if result is not None:
+        return Response(sse('done', result), mimetype='text/event-stream')
+
+    events = queue.Queue()
+    try:
+        job_queue.submit(stream_pipeline, image_id, img_path, lambda name, data: events.put((name, data)))
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+
+    def generate():
+        yield sse('queued', {'queued': job_queue.pending()})
+        while True:
+            try:
+                name, data = events.get(timeout=SSE_KEEPALIVE)
+            except queue.Empty:
+                yield ": keep-alive\n\n"  # comment line, stops proxies from closing an idle stream
+                continue
+            yield sse(name, data)
+            if name in ('done', 'error'):
+                return
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Prometheus metrics endpoint (METRICS=0 disables it)
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Job status endpoint
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+# Job result endpoint
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job.status == jobs.FAILED:
+        return jsonify({'error': f'Error processing image: {job.error}'}), 500
+    if job.status != jobs.DONE:
+        return jsonify(job.to_dict()), 202
+    return jsonify(job.result)
 
 # Update translation endpoint
+# Identical uploads share one image id, so an edit applies to every upload of the
+# same page: the translations belong to the page, not to whoever uploaded it.
 @app.route('/api/translations/<image_id>', methods=['PATCH'])
 def update_translations(image_id):
     data = request.json
     if not data or 'translations' not in data:
         return jsonify({'error': 'No translation data provided'}), 400
     
-    csv_file_path = os.path.join(CSV_DIR, f"{image_id}_translations.csv")
-    if not os.path.exists(csv_file_path):
-        return jsonify({'error': 'Translation data not found'}), 404
+    # Under the image's lock, so processing or a delete doesn't interleave with the rewrite
+    with image_lock(image_id):
+        csv_file_path = os.path.join(CSV_DIR, f"{image_id}_translations.csv")
+        if not os.path.exists(csv_file_path):
+            return jsonify({'error': 'Translation data not found'}), 404
     
-    try:
-        # Read existing translations
-        translations = []
-        with open(csv_file_path, "r", newline="", encoding="utf-8") as csv_file:
-            reader = csv.reader(csv_file)
-            next(reader)  # Skip header
-            translations = list(reader)
+        try:
+            # Read existing translations
+            translations = []
+            with open(csv_file_path, "r", newline="", encoding="utf-8") as csv_file:
+                reader = csv.reader(csv_file)
+                next(reader)  # Skip header
+                translations = list(reader)
         
-        # Update translations from the request
-        for trans in data['translations']:
-            idx = trans.get('id')
-            if idx is not None and 0 <= idx < len(translations):
-                translations[idx][1] = trans.get('translated_text', translations[idx][1])
+            # Update translations from the request
+            for trans in data['translations']:
+                idx = trans.get('id')
+                if idx is not None and 0 <= idx < len(translations):
+                    translations[idx][1] = trans.get('translated_text', translations[idx][1])
         
-        # Write back to CSV
-        with open(csv_file_path, "w", newline="", encoding="utf-8") as csv_file:
-            writer = csv.writer(csv_file)
-            writer.writerow(["Original Text", "Translated Text", "x", "y", "w", "h"])
-            writer.writerows(translations)
+            # Write back to CSV
+            with open(csv_file_path, "w", newline="", encoding="utf-8") as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(["Original Text", "Translated Text", "x", "y", "w", "h"])
+                writer.writerows(translations)
         
-        # Find the inpainted image
-        inpainted_files = [f for f in os.listdir(INPAINTED_DIR) if f.startswith(image_id)]
-        if not inpainted_files:
-            return jsonify({'error': 'Inpainted image not found'}), 404
+            # Find the inpainted image
+            inpainted_files = [f for f in os.listdir(INPAINTED_DIR) if f.startswith(image_id)]
+            if not inpainted_files:
+                return jsonify({'error': 'Inpainted image not found'}), 404
         
-        inpainted_path = os.path.join(INPAINTED_DIR, inpainted_files[0])
+            inpainted_path = os.path.join(INPAINTED_DIR, inpainted_files[0])
         
-        # Re-overlay translations on the inpainted image
-        translated_img_path = os.path.join(TRANSLATED_DIR, f"{image_id}_translated.png")
-        overlay_translated_text(inpainted_path, csv_file_path, translated_img_path)
+            # Re-overlay translations on the inpainted image
+            translated_img_path = os.path.join(TRANSLATED_DIR, f"{image_id}_translated.png")
+            overlay_translated_text(inpainted_path, csv_file_path, translated_img_path)
         
-        return jsonify({
-            'message': 'Translations updated successfully',
-            'translated_image': f"/api/images/translated/{image_id}_translated.png"
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+            return jsonify({
+                'message': 'Translations updated successfully',
+                'translated_image': f"/api/images/translated/{image_id}_translated.png"
+            })
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
 
 # Serve images endpoints
+IMAGE_DIRS = {
+    'uploads': UPLOAD_DIR,
+    'inpainted': INPAINTED_DIR,
+    'text_only': TEXT_ONLY_DIR,
+    'boxed': BOXED_DIR,
+    'translated': TRANSLATED_DIR
+}
+# Artifacts that are written once per image id and never change afterwards
+IMMUTABLE_IMAGE_TYPES = {'inpainted', 'text_only', 'boxed'}
+
+def cached_file_response(image_type, path, mime_type):
+    """Conditional send_file response with the Cache-Control policy of `image_type`."""
+    response = send_file(path, mimetype=mime_type, conditional=True, etag=True)
+    if image_type in IMMUTABLE_IMAGE_TYPES:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        # Translations are re-rendered in place (PATCH /api/translations), so revalidate
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/images/<path:image_type>/<filename>', methods=['GET'])
 def serve_image(image_type, filename):
-    image_dirs = {
-        'uploads': UPLOAD_DIR,
-        'inpainted': INPAINTED_DIR,
-        'text_only': TEXT_ONLY_DIR,
-        'boxed': BOXED_DIR,
-        'translated': TRANSLATED_DIR
-    }
-    
-    if image_type not in image_dirs:
+    """
+    Stream the image file with ETag/Last-Modified and Range support.
+    `?format=json` returns the old base64 data URL wrapped in JSON instead.
+    """
+    if image_type not in IMAGE_DIRS:
         return jsonify({'error': 'Invalid image type'}), 400
     
-    image_path = os.path.join(image_dirs[image_type], filename)
+    image_path = os.path.join(IMAGE_DIRS[image_type], filename)
     
     if not os.path.exists(image_path):
         return jsonify({'error': 'Image not found'}), 404
     
-    # Read the image file and convert to base64
-    with open(image_path, 'rb') as img_file:
-        encoded_img = base64.b64encode(img_file.read()).decode('utf-8')
-    
     # Get image mimetype based on extension
     ext = os.path.splitext(filename)[1].lower()
     mime_type = 'image/jpeg' if ext in ['.jpg', '.jpeg'] else 'image/png'
-    
-    return jsonify({
-        'data': f"data:{mime_type};base64,{encoded_img}"
-    })
+
+    if request.args.get('format') == 'json':
+        # Read the image file and convert to base64
+        with open(image_path, 'rb') as img_file:
+            encoded_img = base64.b64encode(img_file.read()).decode('utf-8')
+        return jsonify({
+            'data': f"data:{mime_type};base64,{encoded_img}"
+        })
+
+    # send_file answers If-None-Match/If-Modified-Since with 304 and handles Range
+    return cached_file_response(image_type, image_path, mime_type)
+
+# Resized derivative endpoint (thumbnails and previews)
+# ?width=<px> or ?size=thumb|preview, ?format=webp|jpeg|png, ?quality=1-100
+@app.route('/api/derivatives/<path:image_type>/<filename>', methods=['GET'])
+def serve_derivative(image_type, filename):
+    if image_type not in IMAGE_DIRS:
+        return jsonify({'error': 'Invalid image type'}), 400
+
+    image_path = os.path.join(IMAGE_DIRS[image_type], filename)
+    if not os.path.exists(image_path):
+        return jsonify({'error': 'Image not found'}), 404
+
+    try:
+        size = request.args.get('size', 'preview')
+        width = int(request.args.get('width', PRESETS.get(size, 0)))
+        quality = int(request.args.get('quality', 80))
+    except ValueError:
+        return jsonify({'error': 'width and quality must be integers'}), 400
+    fmt = request.args.get('format', 'webp').lower()
+    if not 0 < width <= MAX_WIDTH:
+        return jsonify({'error': f'width must be between 1 and {MAX_WIDTH}'}), 400
+    if not 1 <= quality <= 100:
+        return jsonify({'error': 'quality must be between 1 and 100'}), 400
+    if fmt not in FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(FORMATS)}"}), 400
+
+    derivative_path, mime_type = derivative_cache.get(image_path, width, fmt, quality)
+    try:
+        return cached_file_response(image_type, derivative_path, mime_type)
+    finally:
+        # send_file has opened it by now, so it may be evicted or purged
+        derivative_cache.release(derivative_path)
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
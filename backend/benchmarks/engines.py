@@ -0,0 +1,54 @@
+"""
+Compare load time and per-page latency of the SNET/CNET engines.
+
+Usage (from backend/):
+    python -m benchmarks.engines --engines tf onnx --page test_panels/mushoku2.jpg
+"""
+import argparse
+import os
+import time
+
+from image_processing.text_segmentation import TextSegmentation
+
+import core
+import engines
+
+PANEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_panels")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--page", default=os.path.join(PANEL_DIR, sorted(os.listdir(PANEL_DIR))[0]))
+    parser.add_argument("--engines", nargs="+", default=["tf", "onnx", "stub"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    segmenter = TextSegmentation()
+    page = segmenter.resized(segmenter.load(args.page))
+    print(f"page {args.page} {page.shape[1]}x{page.shape[0]}")
+
+    for name in args.engines:
+        if not engines.available(name):
+            print(f"{name:>5}: not available (runtime or model files missing)")
+            continue
+        core.close_global_session()
+        core.set_engine(name)
+        start = time.perf_counter()
+        core.init_global_session()
+        load = time.perf_counter() - start
+        core.warmup()
+        segmap_times, inpaint_times = [], []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            segmap = core.segmap(page)
+            segmap_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            core.inpainted(page, segmap)
+            inpaint_times.append(time.perf_counter() - start)
+        print(f"{name:>5}: load {load:6.2f}s  segmap {min(segmap_times) * 1000:8.1f}ms"
+              f"  inpainted {min(inpaint_times) * 1000:8.1f}ms")
+    core.close_global_session()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compare per-crop vs batched MangaOCR throughput on CPU.
+
+Usage (from backend/):
+    python -m benchmarks.ocr_batch --crops 20 --batch-sizes 1 4 8 16
+"""
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+import PIL.Image
+import torch
+
+from ocr import OCR
+
+PANEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_panels")
+
+
+def sample_crops(n, seed=0):
+    """Cut `n` bubble-sized crops out of the test panels."""
+    rng = random.Random(seed)
+    panels = [np.array(PIL.Image.open(os.path.join(PANEL_DIR, name)).convert("RGB"))
+              for name in sorted(os.listdir(PANEL_DIR))]
+    crops = []
+    for _ in range(n):
+        panel = rng.choice(panels)
+        h, w = panel.shape[:2]
+        ch, cw = rng.randint(40, min(300, h)), rng.randint(30, min(200, w))
+        y, x = rng.randint(0, h - ch), rng.randint(0, w - cw)
+        crops.append(panel[y:y + ch, x:x + cw])
+    return crops
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--crops", type=int, default=20)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    torch.set_grad_enabled(False)
+    ocr = OCR()
+    ocr.warmup()
+    crops = sample_crops(args.crops)
+
+    def best_of(func):
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    per_crop = best_of(lambda: [ocr.extract_text(PIL.Image.fromarray(crop)) for crop in crops])
+    print(f"per-crop      : {per_crop:7.3f}s  {args.crops / per_crop:6.2f} crops/s")
+    for batch_size in args.batch_sizes:
+        batched = best_of(lambda: ocr.extract_text_batch(crops, batch_size))
+        print(f"batch size {batch_size:<3}: {batched:7.3f}s  {args.crops / batched:6.2f} crops/s"
+              f"  ({per_crop / batched:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
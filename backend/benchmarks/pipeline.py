@@ -0,0 +1,221 @@
+"""
+End-to-end benchmark of the page pipeline on synthetic pages.
+
+Times every stage (segment, detect, ocr, translate, typeset) and the whole
+of process_page, with the real models or stand-ins (--models stub: stub
+SNET/CNET engine, StubOCR and the fake translator, no model files or API
+key needed). Each size runs in a fresh process that loads the models, so
+its peak_rss_mb is its own. Results go to a JSON file; --compare prints the
+change from an earlier one.
+
+Usage (from backend/):
+    python -m benchmarks.pipeline --models stub --sizes small medium --pages 5 --output bench.json
+    python -m benchmarks.pipeline --models stub --output new.json --compare bench.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+import numpy as np
+
+from benchmarks.synthetic import SIZES, parse_size, synthetic_page
+
+STAGES = ["segment", "detect", "ocr", "translate", "typeset"]
+# Lower is better for everything compared but pages_per_s
+HIGHER_IS_BETTER = {"pages_per_s"}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS), None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def summarize(times, pages):
+    times_ms = np.array(times) * 1000
+    return {
+        "total_s": round(float(times_ms.sum()) / 1000, 4),
+        "mean_ms": round(float(times_ms.mean()), 2),
+        "p50_ms": round(float(np.percentile(times_ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(times_ms, 95)), 2),
+        "pages_per_s": round(pages / float(times_ms.sum() / 1000), 3),
+    }
+
+
+def use_models(kind):
+    """Pick the models before anything reads the settings (they are read at import time)."""
+    if kind == "stub":
+        os.environ["SEGMENT_ENGINE"] = "stub"
+        os.environ["SEGMENT_PRECISION"] = "fp32"
+        os.environ["OCR_ENGINE"] = "stub"
+        os.environ["TRANSLATOR"] = "fake"
+    os.environ.setdefault("TRANSLATION_CACHE", "off")  # every run translates for real
+
+
+def run_stages(page, font_path):
+    """process_page split into its stages, returning {stage: seconds}."""
+    import cv2
+    from PIL import Image
+
+    from models import registry
+    from translation.service import get_service
+    from typesetting import render_translated_text
+
+    times = {}
+
+    def timed(name, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        times[name] = time.perf_counter() - start
+        return result
+
+    _, inpainted, text_only = timed("segment", registry.segmenter().segment_image, page)
+    analysis = timed("detect", registry.text_bounding().analyze, text_only)
+    texts = timed("ocr", registry.ocr().extract_text_batch, analysis.crops)
+    translated = timed("translate", get_service().translate_batch, texts)
+    regions = [{'original_text': text, 'translated_text': str(result), 'bbox': list(box)}
+               for text, result, box in zip(texts, translated, analysis.boxes)]
+
+    def typeset():
+        img = Image.fromarray(cv2.cvtColor(inpainted, cv2.COLOR_BGR2RGB))
+        return render_translated_text(img, regions, font_path)
+    timed("typeset", typeset)
+    return times, len(regions)
+
+
+def bench_size(size, pages, font_path):
+    from pipeline import process_page
+
+    width, height = parse_size(size)
+    docs = [synthetic_page(width, height, seed=i) for i in range(pages)]
+    stage_times = {stage: [] for stage in STAGES}
+    pipeline_times = []
+    regions = 0
+    for page in docs:
+        times, n = run_stages(page, font_path)
+        regions += n
+        for stage in STAGES:
+            stage_times[stage].append(times[stage])
+    for page in docs:
+        start = time.perf_counter()
+        process_page(page, font_path=font_path)
+        pipeline_times.append(time.perf_counter() - start)
+    return {
+        "width": width,
+        "height": height,
+        "pages": pages,
+        "regions_per_page": round(regions / pages, 1),
+        "stages": {stage: summarize(stage_times[stage], pages) for stage in STAGES},
+        "pipeline": summarize(pipeline_times, pages),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_size(models, size, pages, font_path):
+    """Load the models and bench_size, in a process of its own (see main)."""
+    use_models(models)
+    from models import registry
+    import core
+
+    start = time.perf_counter()
+    registry.load(warmup=True)
+    load_s = time.perf_counter() - start
+    result = bench_size(size, pages, font_path)
+    result["load_s"] = round(load_s, 3)
+    return result, core.engine, core.precision
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def metrics(report):
+    """Flatten a report into {'size/stage/metric': value} for comparing."""
+    flat = {}
+    for size, result in report["sizes"].items():
+        for stage, summary in list(result["stages"].items()) + [("pipeline", result["pipeline"])]:
+            for key in ("p50_ms", "p95_ms", "pages_per_s"):
+                flat[f"{size}/{stage}/{key}"] = summary[key]
+        if result["peak_rss_mb"] is not None:
+            flat[f"{size}/peak_rss_mb"] = result["peak_rss_mb"]
+    return flat
+
+
+def compare(old, new):
+    """Print every metric of `new` next to `old` with the relative change (+ = better)."""
+    old_metrics, new_metrics = metrics(old), metrics(new)
+    for key, value in new_metrics.items():
+        before = old_metrics.get(key)
+        if not before:
+            print(f"{key:<40} {value:>10}")
+            continue
+        change = (value - before) / before
+        better = change if key.split("/")[-1] in HIGHER_IS_BETTER else -change
+        print(f"{key:<40} {before:>10} -> {value:>10}  {better:+7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--models", choices=["real", "stub"], default="stub")
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"],
+                        help=f"WxH or any of {', '.join(SIZES)}")
+    parser.add_argument("--pages", type=int, default=5, help="pages per size")
+    parser.add_argument("--font", help="TrueType font the typeset stage draws with (default: Pillow's built-in font)")
+    parser.add_argument("--output", default="pipeline_benchmark.json")
+    parser.add_argument("--compare", help="an earlier --output file to compare with")
+    args = parser.parse_args()
+
+    report = {
+        "models": args.models,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "sizes": {},
+    }
+    # A fresh process per size: ru_maxrss only grows, so sizes sharing a
+    # process would report the peak of the largest one run so far
+    spawn = multiprocessing.get_context("spawn")
+    for size in args.sizes:
+        print(f"Benchmarking {args.pages} {size} pages")
+        with ProcessPoolExecutor(1, mp_context=spawn) as pool:
+            result, report["engine"], report["precision"] = pool.submit(
+                run_size, args.models, size, args.pages, args.font).result()
+        report["sizes"][size] = result
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {args.output}")
+    for size, result in report["sizes"].items():
+        print(f"{size} ({result['width']}x{result['height']}, {result['regions_per_page']} regions/page,"
+              f" models loaded in {result['load_s']}s)")
+        for stage, summary in list(result["stages"].items()) + [("pipeline", result["pipeline"])]:
+            print(f"  {stage:<10} p50 {summary['p50_ms']:9.1f}ms  p95 {summary['p95_ms']:9.1f}ms"
+                  f"  {summary['pages_per_s']:8.2f} pages/s")
+        if result["peak_rss_mb"] is not None:
+            print(f"  peak RSS {result['peak_rss_mb']} MiB")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
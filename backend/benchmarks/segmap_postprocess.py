@@ -0,0 +1,60 @@
+"""
+Compare the old and the fused (argmax + lookup table) SNET post-processing.
+
+Usage (from backend/):
+    python -m benchmarks.segmap_postprocess --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "SickZil-Machine/src"))
+
+import core
+import utils.fp as fp
+import utils.imutils as iu
+
+SIZES = {
+    "1000x700": (1000, 700),
+    "4K": (2160, 3840),
+}
+
+old_segmap_output = fp.pipe(iu.map_max_row, core.decategorize, iu.uint8)
+
+
+def class_scores(h, w, seed=0):
+    """Softmax-like SNET output: two class scores per pixel."""
+    text = np.random.default_rng(seed).random((h, w, 1), dtype=np.float32)
+    return np.concatenate([1 - text, text], axis=-1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    def best_of(func):
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    for name, (h, w) in SIZES.items():
+        seg = class_scores(h, w)
+        out = np.empty((h, w), np.uint8)
+        assert np.array_equal(old_segmap_output(seg)[..., 0], core.segmask_output(seg))
+
+        old = best_of(lambda: old_segmap_output(seg))
+        fused = best_of(lambda: core.segmap_output(seg))
+        into = best_of(lambda: core.segmask_output(seg, out))
+        print(f"{name:>9}: old {old * 1000:8.1f}ms  fused segmap {fused * 1000:7.1f}ms ({old / fused:5.1f}x)"
+              f"  segmask into buffer {into * 1000:7.1f}ms ({old / into:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Synthetic manga-like pages for benchmarks: panels, speech bubbles with
+vertical lines of glyph strokes, screentone and hatching.
+
+Pages are generated from a seed, so every run (and every machine) gets the
+same pixels. Usage (from backend/):
+    python -m benchmarks.synthetic --size 1400x2000 --output page.png
+"""
+import argparse
+
+import cv2
+import numpy as np
+
+SIZES = {
+    "small": (800, 1200),
+    "medium": (1400, 2000),
+    "a4": (2480, 3508),  # A4 at 300 dpi, a typical raw scan
+}
+
+
+def parse_size(text):
+    """'medium' or '1400x2000' -> (width, height)"""
+    if text in SIZES:
+        return SIZES[text]
+    w, h = text.lower().split("x")
+    return int(w), int(h)
+
+
+def _panels(rng, w, h, margin):
+    """Split the page into 2-4 rows of 1-2 panels, as (x0, y0, x1, y1)."""
+    rows = rng.integers(2, 5)
+    cuts = np.sort(rng.uniform(0.2, 0.8, rows - 1)) if rows > 2 else np.array([0.5])
+    ys = [margin] + [int(margin + c * (h - 2 * margin)) for c in cuts] + [h - margin]
+    panels = []
+    for y0, y1 in zip(ys, ys[1:]):
+        if rng.random() < 0.5:
+            x = int(rng.uniform(0.35, 0.65) * w)
+            panels += [(margin, y0, x - margin // 2, y1 - margin), (x + margin // 2, y0, w - margin, y1 - margin)]
+        else:
+            panels.append((margin, y0, w - margin, y1 - margin))
+    return panels
+
+
+def _screentone(page, box, pitch):
+    x0, y0, x1, y1 = box
+    radius = max(1, pitch // 4)
+    for y in range(y0 + pitch // 2, y1, pitch):
+        for x in range(x0 + pitch // 2 + (y // pitch % 2) * pitch // 2, x1, pitch):
+            cv2.circle(page, (x, y), radius, 0, -1)
+
+
+def _hatching(page, box, gap):
+    x0, y0, x1, y1 = box
+    w, h = x1 - x0, y1 - y0
+    region = np.full((h, w), 255, np.uint8)  # drawn apart so the lines are clipped to the box
+    for d in range(0, w + h, gap):
+        cv2.line(region, (d, 0), (d - h, h), 0, 1)
+    np.minimum(page[y0:y1, x0:x1], region, out=page[y0:y1, x0:x1])
+
+
+def _bubble(page, rng, center, axes, glyph):
+    """White ellipse with a black outline, filled with columns of glyph-like strokes."""
+    cv2.ellipse(page, center, axes, 0, 0, 360, 255, -1)
+    cv2.ellipse(page, center, axes, 0, 0, 360, 0, max(2, glyph // 8))
+    cx, cy = center
+    ax, ay = axes
+    columns = max(1, int(ax * 1.2 // (glyph * 1.4)))
+    stroke = max(1, glyph // 8)
+    for c in range(columns):
+        x = int(cx + (columns / 2 - c - 0.5) * glyph * 1.4)
+        # column height follows the ellipse so the text stays inside
+        half = ay * np.sqrt(max(0.0, 1 - ((x - cx) / ax) ** 2)) * 0.7
+        for y in range(int(cy - half), int(cy + half) - glyph, int(glyph * 1.1)):
+            for _ in range(rng.integers(2, 5)):
+                p0 = rng.integers(0, glyph, 2)
+                p1 = rng.integers(0, glyph, 2)
+                cv2.line(page, (x + p0[0] - glyph // 2, y + p0[1]), (x + p1[0] - glyph // 2, y + p1[1]), 0, stroke)
+
+
+def synthetic_page(width, height, seed=0):
+    """A BGR uint8 manga-like page of the given size."""
+    rng = np.random.default_rng(seed)
+    page = np.full((height, width), 255, np.uint8)
+    scale = width / 1000
+    margin = max(8, int(30 * scale))
+    for box in _panels(rng, width, height, margin):
+        x0, y0, x1, y1 = box
+        if x1 - x0 < 4 * margin or y1 - y0 < 4 * margin:
+            continue
+        cv2.rectangle(page, (x0, y0), (x1, y1), 0, max(2, int(3 * scale)))
+        inner = (x0 + margin // 2, y0 + margin // 2, x1 - margin // 2, y1 - margin // 2)
+        fx0, fy0 = rng.integers(inner[0], (inner[0] + inner[2]) // 2), rng.integers(inner[1], (inner[1] + inner[3]) // 2)
+        fill = (int(fx0), int(fy0), inner[2], inner[3])
+        if rng.random() < 0.5:
+            _screentone(page, fill, max(4, int(8 * scale)))
+        else:
+            _hatching(page, fill, max(4, int(10 * scale)))
+        for _ in range(rng.integers(1, 3)):
+            ax = int(rng.uniform(0.12, 0.25) * (x1 - x0))
+            ay = int(min(ax * rng.uniform(1.2, 1.8), (y1 - y0) * 0.4))
+            if ax < margin or ay < margin:
+                continue
+            center = (int(rng.integers(x0 + ax, x1 - ax + 1)), int(rng.integers(y0 + ay, y1 - ay + 1)))
+            _bubble(page, rng, center, (ax, ay), max(8, int(22 * scale)))
+    return cv2.cvtColor(page, cv2.COLOR_GRAY2BGR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", default="medium", help=f"WxH or one of {', '.join(SIZES)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="synthetic_page.png")
+    args = parser.parse_args()
+    cv2.imwrite(args.output, synthetic_page(*parse_size(args.size), seed=args.seed))
+    print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Sweep TF intra/inter-op thread counts for SNET+CNET on a reference page.
+
+Usage (from backend/):
+    python -m benchmarks.tf_threads --intra 1 2 4 8 --inter 1 2 --page test_panels/mushoku2.jpg
+"""
+import argparse
+import itertools
+import os
+import time
+
+from image_processing.text_segmentation import TextSegmentation
+
+import core
+import imgio
+
+PANEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_panels")
+
+
+def main():
+    # CPUs this process may run on (sched_getaffinity is Linux only)
+    cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--page", default=os.path.join(PANEL_DIR, sorted(os.listdir(PANEL_DIR))[0]))
+    parser.add_argument("--intra", type=int, nargs="+",
+                        default=sorted({1, 2, 4, max(1, cpu_count // 2), cpu_count}))
+    parser.add_argument("--inter", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--no-graph-optimizations", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    segmenter = TextSegmentation()
+    page = segmenter.resized(segmenter.load(args.page))
+    print(f"page {args.page} {page.shape[1]}x{page.shape[0]}, {cpu_count} cpus")
+
+    results = []
+    for intra, inter in itertools.product(args.intra, args.inter):
+        core.close_global_session()
+        core.set_session_config(intra, inter, core.cpus, not args.no_graph_optimizations)
+        core.warmup()
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            segmap = imgio.mask2segmap(imgio.segmap2mask(core.segmap(page)))
+            core.inpainted(page, segmap)
+            times.append(time.perf_counter() - start)
+        results.append((min(times), intra, inter))
+        print(f"intra {intra:<3} inter {inter:<3}: {min(times):7.3f}s/page")
+
+    best, intra, inter = min(results)
+    print(f"best: SEGMENT_INTRA_OP_THREADS={intra} SEGMENT_INTER_OP_THREADS={inter} ({best:.3f}s/page)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import threading
+
+from PIL import Image
+
+# Named widths the frontend can ask for instead of a number
+PRESETS = {
+    'thumb': 240,
+    'preview': 800,
+}
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', '.webp'),
+    'jpeg': ('JPEG', 'image/jpeg', '.jpg'),
+    'png': ('PNG', 'image/png', '.png'),
+}
+MAX_WIDTH = 4096
+
+
+class DerivativeCache:
+    """
+    Width-bounded copies of artifact images, generated on first request and
+    kept on disk. The cache key includes the source's mtime and size, so a
+    re-rendered source (e.g. an edited translation) gets fresh derivatives.
+    Least recently used files are evicted once the total exceeds `max_bytes`,
+    except those handed out by get() and not release()d yet.
+    """
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pinned = {}  # file name -> get()s not released yet
+        self._purged = set()  # pinned files to remove once released
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, src_path, width, fmt='webp', quality=80):
+        """
+        Return (path, mimetype) of the derivative, creating it if needed.
+        The file stays until release(path) is called, once it is open for sending.
+        """
+        pil_format, mime_type, ext = FORMATS[fmt]
+        stat = os.stat(src_path)
+        key = hashlib.sha1(
+            f"{os.path.abspath(src_path)}|{stat.st_mtime_ns}|{stat.st_size}|{width}|{fmt}|{quality}".encode()
+        ).hexdigest()
+        # Named after the source so purge() can find an image's derivatives
+        stem = os.path.splitext(os.path.basename(src_path))[0]
+        name = f"{stem}.{key}{ext}"
+        path = os.path.join(self.cache_dir, name)
+
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path)  # mark as recently used
+                self._pin(name)
+                return path, mime_type
+
+        tmp_path = f"{path}.{threading.get_ident()}.part"
+        with Image.open(src_path) as img:
+            if img.width > width:
+                img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+            if pil_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            img.save(tmp_path, pil_format, quality=quality)
+        with self._lock:
+            os.replace(tmp_path, path)
+            self._pin(name)
+            self._evict()
+        return path, mime_type
+
+    def release(self, path):
+        """`path` (from get()) is open for sending and may be evicted again."""
+        name = os.path.basename(path)
+        with self._lock:
+            self._pinned[name] -= 1
+            if self._pinned[name]:
+                return
+            del self._pinned[name]
+            if name in self._purged:
+                self._purged.discard(name)
+                os.remove(path)
+
+    def purge(self, prefix):
+        """Remove the derivatives of every source whose file name starts with `prefix`."""
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if not name.startswith(prefix) or name.endswith('.part'):
+                    continue
+                if name in self._pinned:
+                    self._purged.add(name)
+                else:
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def _pin(self, name):
+        self._pinned[name] = self._pinned.get(name, 0) + 1
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.part'):
+                continue
+            stat = os.stat(os.path.join(self.cache_dir, name))
+            total += stat.st_size
+            if name not in self._pinned:
+                entries.append((stat.st_mtime, stat.st_size, name))
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.cache_dir, name))
+            total -= size
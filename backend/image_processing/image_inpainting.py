@@ -1,6 +1,5 @@
 import os
 import sys
-import tensorflow as tf
 import numpy as np
 
 # Add SickZil-Machine to the Python path
@@ -10,12 +9,16 @@ import core
 import imgio
 
 class ImageInpainter:
-    def __init__(self):
-        pass
+    def __init__(self, net=core):
+        self.net = net
 
     def inpaint(self, originalImage, maskImage):
         """Generate the inpainted image."""
-        return core.inpainted(originalImage, maskImage)
+        return self.net.inpainted(originalImage, maskImage)
+
+    def inpaint_many(self, originalImages, maskImages):
+        """inpaint for several images at once (batched by the net)."""
+        return list(self.net.inpainteds(originalImages, maskImages))
 
     def save_image(self, outputPath, fileName, image):
         """Save the image to the specified path."""
@@ -3,13 +3,63 @@ import cv2
 import tempfile
 from tqdm import tqdm
 
+import metrics
+
+class PageAnalysis:
+    """
+    Text regions of one page, detected once and shared by every later stage.
+    `boxes` and `crops` are index-aligned and in manga reading order.
+    """
+    def __init__(self, img_path, image, boxes, crops):
+        self.img_path = img_path
+        self.image = image
+        self.boxes = boxes
+        self.crops = crops
+        self._boxed = None
+
+    @property
+    def boxed(self):
+        """Copy of the page with the detected boxes drawn on it."""
+        if self._boxed is None:
+            self._boxed = self.image.copy()
+            for (x, y, w, h) in self.boxes:
+                cv2.rectangle(self._boxed, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        return self._boxed
+
+    def save_boxed(self, output_dir, file_name=None):
+        """Save the boxed preview and return its path. `file_name` is required for in-memory pages."""
+        boxed_image_path = os.path.join(output_dir, file_name or os.path.basename(self.img_path))
+        cv2.imwrite(boxed_image_path, self.boxed)
+        print(f"Image with bounding boxes saved to {boxed_image_path}")
+        return boxed_image_path
+
+
 class TextBounding:
     def __init__(self):
         pass
 
-    def detect_text_regions(self, img_path, contour_size=0.01):
-        """Detect text regions and return bounding boxes in manga reading order (right-to-left, top-to-bottom)."""
-        img = cv2.imread(img_path)
+    def analyze(self, img, contour_size=0.01):
+        """
+        Decode the page and detect its text regions once, returning a PageAnalysis.
+        `img` is the path to the text-only image or the BGR image itself.
+        """
+        img_path = None
+        if isinstance(img, str):
+            img_path, img = img, cv2.imread(img)
+        with metrics.span('detect'):
+            bounding_boxes = self.detect_text_regions(img, contour_size)
+        with metrics.span('crop'):
+            crops = self.crop_regions(img, bounding_boxes)
+        metrics.BUBBLES.inc(len(bounding_boxes))
+        return PageAnalysis(img_path, img, bounding_boxes, crops)
+
+    def detect_text_regions(self, img, contour_size=0.01):
+        """
+        Detect text regions and return bounding boxes in manga reading order (right-to-left, top-to-bottom).
+        `img` is a BGR image or the path to one.
+        """
+        if isinstance(img, str):
+            img = cv2.imread(img)
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
         # Edge detection and thresholding
@@ -70,20 +120,8 @@ class TextBounding:
 
     def process_text_regions(self, img_path):
         """Detect and process text regions without saving cropped regions."""
-        img = cv2.imread(img_path)
-        bounding_boxes = self.detect_text_regions(img_path)
-        cropped_images = self.crop_regions(img, bounding_boxes)
-        return cropped_images
+        return self.analyze(img_path).crops
 
     def draw_boxes(self, img_path, output_dir):
         """Draw bounding boxes on the image and save it."""
-        img = cv2.imread(img_path)
-        bounding_boxes = self.detect_text_regions(img_path)
-
-        for (x, y, w, h) in bounding_boxes:
-            cv2.rectangle(img, (x, y), (x + w, y + h), (0, 255, 0), 2)
-
-        boxed_image_path = os.path.join(output_dir, os.path.basename(img_path))
-        cv2.imwrite(boxed_image_path, img)
-        print(f"Image with bounding boxes saved to {boxed_image_path}")
-        return boxed_image_path
+        return self.analyze(img_path).save_boxed(output_dir)
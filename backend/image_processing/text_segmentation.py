@@ -2,7 +2,6 @@ import os
 import sys
 import cv2
 from .image_inpainting import ImageInpainter
-import tensorflow as tf
 # Add SickZil-Machine to the Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), "../SickZil-Machine/src"))
 
@@ -10,37 +9,181 @@ import core
 import imgio
 import utils.fp as fp
 
+import metrics
+
+# Pages taller than this are scaled down before segmentation (0 keeps native resolution)
+MAX_HEIGHT = int(os.getenv("SEGMENT_MAX_HEIGHT", "1000"))
+# Run SickZil-Machine on overlapping tiles of this size (0 disables tiling)
+TILE_SIZE = int(os.getenv("SEGMENT_TILE_SIZE", "0"))
+TILE_OVERLAP = int(os.getenv("SEGMENT_TILE_OVERLAP", "64"))
+# Comma separated input sizes (multiples of 16) to pad SNET/CNET inputs up to, e.g. "512,768,1024"
+SHAPE_BUCKETS = [int(size) for size in os.getenv("SEGMENT_SHAPE_BUCKETS", "").split(",") if size.strip()]
+# Where the pixel limits SNET/CNET run in one piece are kept; limits lowered after an
+# out-of-memory error are saved here too, until re-probed ("" = don't persist them)
+LIMITS_PATH = os.getenv("SEGMENT_LIMITS_PATH", os.path.join(os.path.dirname(__file__), "..", "..", "output", "sickzil_limits.json"))
+# Split pages up front to stay within this much memory for the nets (0 = only split after an OOM)
+MEMORY_BUDGET_MB = int(os.getenv("SEGMENT_MEMORY_BUDGET_MB", "0"))
+# Runs SNET/CNET: "tf" (frozen graphs), "onnx" (ONNX Runtime, see SickZil-Machine/src/export_onnx.py) or "stub"
+ENGINE = os.getenv("SEGMENT_ENGINE", "tf")
+# "fp16"/"int8" models (onnx engine) are only used if SickZil-Machine/src/precision_gate.py
+# measured them at or above these thresholds; otherwise fp32 is used
+PRECISION = os.getenv("SEGMENT_PRECISION", "fp32")
+MIN_MASK_IOU = float(os.getenv("SEGMENT_MIN_MASK_IOU", "0.98"))
+MIN_INPAINT_PSNR = float(os.getenv("SEGMENT_MIN_INPAINT_PSNR", "35"))
+# Engine thread pools (0 = let the runtime decide), CPUs to pin the nets to (e.g. "0-3")
+# and whether the runtime's graph optimizer runs
+INTRA_OP_THREADS = int(os.getenv("SEGMENT_INTRA_OP_THREADS", "0"))
+INTER_OP_THREADS = int(os.getenv("SEGMENT_INTER_OP_THREADS", "0"))
+CPU_AFFINITY = core.parse_cpus(os.getenv("SEGMENT_CPU_AFFINITY", ""))
+GRAPH_OPTIMIZATIONS = os.getenv("SEGMENT_GRAPH_OPTIMIZATIONS", "1") != "0"
+# Load SNET/CNET pruned to their input->output subgraph, cached in GRAPH_CACHE_DIR
+OPTIMIZE_GRAPHS = os.getenv("SEGMENT_OPTIMIZE_GRAPHS", "0") == "1"
+GRAPH_CACHE_DIR = os.getenv("SEGMENT_GRAPH_CACHE_DIR", os.path.join(os.path.dirname(__file__), "..", "..", "output", "graph_cache"))
+# Check converted net inputs are within 0~1 (costs a full scan per page)
+DEBUG_CHECKS = os.getenv("SEGMENT_DEBUG_CHECKS", "0") == "1"
+# Inpaint only boxes around the text (grown by ROI_MARGIN px, merged when closer than ROI_MERGE_GAP)
+INPAINT_ROI = os.getenv("SEGMENT_INPAINT_ROI", "0") == "1"
+ROI_MARGIN = int(os.getenv("SEGMENT_ROI_MARGIN", "32"))
+ROI_MERGE_GAP = int(os.getenv("SEGMENT_ROI_MERGE_GAP", "16"))
+
+
+def configure_core(tile_size=TILE_SIZE, tile_overlap=TILE_OVERLAP, shape_buckets=SHAPE_BUCKETS,
+                   cpu_ids=CPU_AFFINITY):
+    """Apply the tiling, bucket, memory and session settings to SickZil-Machine's core."""
+    if tile_size:
+        core.set_tiling(tile_size, tile_overlap)
+    if shape_buckets:
+        core.set_buckets(shape_buckets)
+    if LIMITS_PATH:
+        os.makedirs(os.path.dirname(os.path.abspath(LIMITS_PATH)), exist_ok=True)
+        core.load_limits(LIMITS_PATH)
+    if MEMORY_BUDGET_MB:
+        core.set_memory_budget(MEMORY_BUDGET_MB * 2**20)
+    core.set_engine(ENGINE)
+    core.set_precision(PRECISION, min_iou=MIN_MASK_IOU, min_psnr=MIN_INPAINT_PSNR)
+    core.set_session_config(INTRA_OP_THREADS, INTER_OP_THREADS, cpu_ids, GRAPH_OPTIMIZATIONS)
+    core.set_graph_loading(OPTIMIZE_GRAPHS, GRAPH_CACHE_DIR)
+    core.set_debug_checks(DEBUG_CHECKS)
+    core.set_roi(INPAINT_ROI, ROI_MARGIN, ROI_MERGE_GAP)
+
+
+def init_inference_worker():
+    """Entry point of each inference server process: configure core and warm it up."""
+    configure_core(cpu_ids=())  # the server pins each worker to its share of CPU_AFFINITY
+    core.warmup()
+
 
 class TextSegmentation:
-    def __init__(self):
-        self.inpainter = ImageInpainter()
+    def __init__(self, max_height=MAX_HEIGHT, tile_size=TILE_SIZE, tile_overlap=TILE_OVERLAP,
+                 shape_buckets=SHAPE_BUCKETS, net=core):
+        # `net` runs segmap/inpainted: core itself or an InferenceServer mirroring it
+        self.net = net
+        self.inpainter = ImageInpainter(net)
+        self.max_height = max_height
+        configure_core(tile_size, tile_overlap, shape_buckets)
 
     def imgpath2mask(self, imgpath):
         """Generate a mask from the image path using SickZil-Machine."""
         return fp.go(
             imgpath,
             lambda path: imgio.load(path, imgio.NDARR),
-            core.segmap,
+            self.net.segmap,
             imgio.segmap2mask,
         )
 
-    def resize(self, imgPath):
-        """
-        Resize the image to have a height of 1000px to ensure compatibility 
-        with SickZil-Machine, which struggles with high-resolution images.
-        """
+    def img2segmap(self, img):
+        """Generate the (bgr, black background) text segmap of an in-memory image."""
+        return self.net.segmap(img)
+
+    def load(self, imgPath):
+        """Load the image as a 3-channel BGR ndarray."""
         # Check if file exists
         if not os.path.exists(imgPath):
             raise FileNotFoundError(f"Image file not found: {imgPath}")
-        
-        img = cv2.imread(imgPath)
+
+        img = imgio.load(imgPath, imgio.IMAGE)
         if img is None:
             raise ValueError(f"Failed to load image: {imgPath}. The file might be corrupted or in an unsupported format.")
-        
-        size = 1000
-        if img.shape[0] > size:
+        return img
+
+    def resized(self, img, size=None):
+        """
+        Return the image scaled to a height of `size`px (default: max_height) if it is
+        taller, to ensure compatibility with SickZil-Machine, which struggles with
+        high-resolution images. Not needed when tiling is enabled.
+        """
+        size = self.max_height if size is None else size
+        if size and img.shape[0] > size:
             img = cv2.resize(img, (int(size * img.shape[1] / img.shape[0]), size), interpolation=cv2.INTER_AREA)
-            cv2.imwrite(imgPath, img)
+        return img
+
+    def resize(self, imgPath):
+        """
+        Resize the image to have a height of 1000px to ensure compatibility 
+        with SickZil-Machine, which struggles with high-resolution images.
+        """
+        img = self.load(imgPath)
+        resized = self.resized(img)
+        if resized is not img:
+            cv2.imwrite(imgPath, resized)
+
+    def segment_image(self, img, on_ready=None):
+        """
+        In-memory segmentation and inpainting of a BGR image.
+        Returns (image, inpainted, text_only) ndarrays, where `image` is the
+        (possibly resized) input that the other two line up with.
+        `on_ready(name, image)` is called with 'text_only' and then 'inpainted'
+        as soon as each one exists.
+        """
+        with metrics.span('resize'):
+            originalImage = self.resized(img)
+
+        print(f"Generating mask using SickZil-Machine")
+        with metrics.span('segmap'):
+            maskImage = self.img2segmap(originalImage)
+
+        # Generate text-only output
+        print(f"Creating text-only image")
+        textOnlyImage = self.text_only(originalImage, maskImage)
+        if on_ready is not None:
+            on_ready('text_only', textOnlyImage)
+
+        # Generate inpainted output
+        print(f"Inpainting image")
+        with metrics.span('inpaint'):
+            inpaintedImage = self.inpainter.inpaint(originalImage, maskImage)
+        if on_ready is not None:
+            on_ready('inpainted', inpaintedImage)
+
+        return originalImage, inpaintedImage, textOnlyImage
+
+    def segment_images(self, imgs):
+        """
+        segment_image for several pages (e.g. a chapter). The nets get all the
+        pages at once: core batches pages of the same padded size into one run
+        and an inference server spreads them over its workers.
+        Returns [(image, inpainted, text_only)..] in the order of `imgs`.
+        """
+        with metrics.span('resize'):
+            originalImages = [self.resized(img) for img in imgs]
+
+        print(f"Generating masks of {len(imgs)} pages using SickZil-Machine")
+        with metrics.span('segmap'):
+            maskImages = list(self.net.segmaps(originalImages))
+        textOnlyImages = [self.text_only(img, mask) for img, mask in zip(originalImages, maskImages)]
+
+        print(f"Inpainting {len(imgs)} pages")
+        with metrics.span('inpaint'):
+            inpaintedImages = self.inpainter.inpaint_many(originalImages, maskImages)
+
+        return list(zip(originalImages, inpaintedImages, textOnlyImages))
+
+    @staticmethod
+    def text_only(img, mask):
+        """The text pixels of `img` on a white background."""
+        textOnlyImage = cv2.bitwise_and(img, mask)
+        textOnlyImage[mask == 0] = 255
+        return textOnlyImage
 
     def segmentPage(self, imgPath, outputInpaintedPath, outputTextOnlyPath):
         """
@@ -56,27 +199,17 @@ class TextSegmentation:
             
             if not os.path.exists(outputTextOnlyPath):
                 os.makedirs(outputTextOnlyPath, exist_ok=True)
-        
-            # Resize the image
-            print(f"Resizing image: {imgPath}")
-            self.resize(imgPath)
 
             # Process with SickZil-Machine
             fileName = os.path.basename(imgPath)
             print(f"Loading image for processing: {imgPath}")
-            originalImage = imgio.load(imgPath, imgio.IMAGE)  # Original image
-            
-            print(f"Generating mask using SickZil-Machine")
-            maskImage = imgio.mask2segmap(self.imgpath2mask(imgPath))  # Mask image
-
-            # Generate inpainted output
-            print(f"Inpainting image")
-            inpaintedImage = self.inpainter.inpaint(originalImage, maskImage)
+            loadedImage = self.load(imgPath)
+            originalImage, inpaintedImage, textOnlyImage = self.segment_image(loadedImage)
 
-            # Generate text-only output
-            print(f"Creating text-only image")
-            textOnlyImage = cv2.bitwise_and(originalImage, maskImage)  # Text-only image
-            textOnlyImage[maskImage == 0] = 255  # Set background to white
+            # Keep the upload in line with the outputs
+            if originalImage is not loadedImage:
+                print(f"Resized image: {imgPath}")
+                cv2.imwrite(imgPath, originalImage)
 
             # Save results
             print(f"Saving processed images")
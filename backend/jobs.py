@@ -0,0 +1,150 @@
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at its limit."""
+    pass
+
+
+class Job:
+    def __init__(self, func, args=(), kwargs=None):
+        self.id = str(uuid.uuid4())
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.status = PENDING
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def report(self, stage):
+        """Record the pipeline stage the job is currently in."""
+        self.stage = stage
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Bounded in-process job queue drained by a fixed pool of worker threads.
+
+    Submitting never blocks: when `max_queued` jobs are already waiting,
+    `submit` raises JobQueueFull so the caller can reject the request.
+    """
+    def __init__(self, workers=2, max_queued=16, keep_finished=256):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = {}
+        self._finished = []
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopping = False
+
+    def start(self):
+        """Start the worker threads (idempotent)."""
+        if self._threads:
+            return
+        self._stopping = False
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, wait=True):
+        """Ask the workers to exit once the jobs already queued are drained."""
+        self._stopping = True
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue `func(*args, job=<Job>, **kwargs)` and return the Job immediately.
+        The function receives the job so it can report its current stage.
+        """
+        job = Job(func, args, kwargs)
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.id]
+            raise JobQueueFull(f"Job queue is full ({self.max_queued} jobs waiting)")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def join(self):
+        """Block until every queued job has finished."""
+        self._queue.join()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job):
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = job.func(*job.args, job=job, **job.kwargs)
+            job.status = DONE
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = FAILED
+        job.finished_at = time.time()
+        self._forget_old(job)
+
+    def _forget_old(self, job):
+        # Keep only the most recent finished jobs so the table can't grow forever
+        with self._lock:
+            self._finished.append(job.id)
+            while len(self._finished) > self.keep_finished:
+                self._jobs.pop(self._finished.pop(0), None)
+
+
+def from_env():
+    """Build a JobQueue configured by JOB_WORKERS / JOB_QUEUE_SIZE."""
+    return JobQueue(
+        workers=int(os.getenv("JOB_WORKERS", "2")),
+        max_queued=int(os.getenv("JOB_QUEUE_SIZE", "16")),
+    )
@@ -0,0 +1,211 @@
+"""
+Lightweight instrumentation: stage timing spans, counters and histograms,
+rendered in the Prometheus text format by /api/metrics.
+
+    with metrics.trace(f"page {image_id}"):   # logs the page's stage timings at the end
+        with metrics.span('segmap'):
+            ...
+        metrics.BUBBLES.inc(len(boxes))
+
+With METRICS=0 spans, traces and counters do nothing.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+
+enabled = os.getenv("METRICS", "1") != "0"
+
+# Upper bounds (seconds) of the stage latency histogram buckets
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_metrics = OrderedDict()
+_collectors = []
+_local = threading.local()
+_noop = nullcontext()
+
+
+def set_enabled(on):
+    global enabled
+    enabled = on
+
+
+def _label_str(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not enabled:
+            return
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_label_str(self.labels, key)} {_number(value)}"
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [count per bucket.., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not enabled:
+            return
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def count(self, **labels):
+        counts = self._values.get(tuple(labels[name] for name in self.labels))
+        return counts[-2] if counts else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in items:
+            for bound, count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket{_label_str(self.labels, key, [('le', _number(bound))])} {count}"
+            yield f"{self.name}_bucket{_label_str(self.labels, key, [('le', '+Inf')])} {counts[-2]}"
+            yield f"{self.name}_sum{_label_str(self.labels, key)} {_number(counts[-1])}"
+            yield f"{self.name}_count{_label_str(self.labels, key)} {counts[-2]}"
+
+
+def _register(metric):
+    assert metric.name not in _metrics, metric.name
+    _metrics[metric.name] = metric
+    return metric
+
+
+def counter(name, help, labels=()):
+    return _register(Counter(name, help, labels))
+
+
+def histogram(name, help, labels=(), buckets=STAGE_BUCKETS):
+    return _register(Histogram(name, help, labels, buckets))
+
+
+def add_collector(func):
+    """
+    Register `func() -> [(name, kind, help, {labels}, value)..]`, called on
+    every render for values that live elsewhere (queue lengths, model state).
+    """
+    _collectors.append(func)
+
+
+STAGE_SECONDS = histogram("manga_stage_seconds", "Time spent in each pipeline stage", ["stage"])
+PAGES = counter("manga_pages_total", "Pages run through the pipeline", ["status"])
+BUBBLES = counter("manga_bubbles_total", "Text regions detected")
+CACHE = counter("manga_cache_requests_total", "Cache lookups", ["cache", "result"])
+
+
+#---------------------------------------------------------------------------------
+class _Span:
+    __slots__ = ('stage', 'start')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, stage=self.stage)
+        spans = getattr(_local, 'spans', None)
+        if spans is not None:
+            spans.append((self.stage, elapsed))
+
+
+def span(stage):
+    """Context manager timing one pipeline stage (shared no-op when disabled)."""
+    return _Span(stage) if enabled else _noop
+
+
+class _Trace:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.outer = getattr(_local, 'spans', None)
+        _local.spans = []
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        elapsed = time.perf_counter() - self.start
+        spans, _local.spans = _local.spans, self.outer
+        if self.outer is not None:
+            self.outer.extend(spans)
+        stages = ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in spans)
+        status = "failed after" if exc_type is not None else "took"
+        print(f"{self.name} {status} {elapsed:.3f}s ({stages})")
+
+
+def trace(name):
+    """Collect the spans run by this thread inside the block and log them on exit."""
+    return _Trace(name) if enabled else _noop
+
+
+#---------------------------------------------------------------------------------
+def render():
+    """Every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics.values():
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    seen = set()
+    for collect in _collectors:
+        for name, kind, help, labels, value in collect():
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{_label_str(labels, labels.values())} {_number(value)}")
+    return "\n".join(lines) + "\n"
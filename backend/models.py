@@ -0,0 +1,176 @@
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import wait
+
+import numpy as np
+
+# Add SickZil-Machine to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "SickZil-Machine/src"))
+
+import core
+from inference_server import InferenceServer
+from image_processing.text_segmentation import TextSegmentation, CPU_AFFINITY
+from image_processing.text_bounding import TextBounding
+
+NOT_LOADED = 'not_loaded'
+LOADING = 'loading'
+READY = 'ready'
+ERROR = 'error'
+LAZY = 'lazy'  # PRELOAD_MODELS=0: each model loads on first use
+
+# Run SNET/CNET in this many worker processes, each with its own session (0 = in process)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+# Seconds a request waits for an inference worker before giving up
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "300"))
+# OCR model: manga_ocr (default) or stub (no model, for benchmarks and offline runs)
+OCR_ENGINE = os.getenv("OCR_ENGINE", "manga_ocr")
+
+
+class StubOCR:
+    """Stand-in for OCR that reads nothing: each crop becomes a made-up line sized like it."""
+    def warmup(self):
+        pass
+
+    def extract_text_batch(self, images, max_batch_size=None):
+        texts = []
+        for image in images:
+            h, w = np.asarray(image).shape[:2]
+            texts.append("テキスト" * max(1, h * w // 4000))
+        return texts
+
+    def extract_text(self, image):
+        return self.extract_text_batch([image])[0]
+
+
+class ModelRegistry:
+    """
+    Process-wide holder of the heavy models (MangaOCR, SNET, CNET).
+
+    Models are loaded once, warmed up with a dummy inference and then
+    shared by every request. Accessors load lazily if `load` wasn't called.
+    """
+    def __init__(self):
+        self.state = NOT_LOADED
+        self.error = None
+        self.load_times = {}
+        self._lock = threading.RLock()
+        self._ocr = None
+        self._segmenter = None
+        self._text_bounding = None
+        self._inference_server = None
+
+    def load(self, warmup=True):
+        """Load every model (and warm them up). Safe to call more than once."""
+        with self._lock:
+            if self.state == READY:
+                return
+            self.state = LOADING
+            try:
+                if INFERENCE_WORKERS:
+                    self._timed('sickzil', self.inference_server)
+                    if warmup:
+                        self._timed('sickzil_warmup', self._wait_for_workers)
+                else:
+                    self._timed('sickzil', self._init_sickzil)
+                    if warmup:
+                        self._timed('sickzil_warmup', core.warmup)
+                self._timed('manga_ocr', self.ocr)
+                if warmup:
+                    self._timed('manga_ocr_warmup', self._ocr.warmup)
+                self.state = READY
+            except Exception as e:
+                traceback.print_exc()
+                self.error = str(e)
+                self.state = ERROR
+                raise
+
+    def load_async(self, warmup=True):
+        """Load the models in a background thread so the server can start answering."""
+        def run():
+            try:
+                self.load(warmup)
+            except Exception:
+                pass  # Already recorded in self.error
+        thread = threading.Thread(target=run, name="model-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def load_lazily(self):
+        """Serve without loading anything up front; the accessors load on first use."""
+        with self._lock:
+            if self.state == NOT_LOADED:
+                self.state = LAZY
+
+    def _timed(self, name, func):
+        start = time.perf_counter()
+        func()
+        self.load_times[name] = round(time.perf_counter() - start, 3)
+        print(f"Loaded {name} in {self.load_times[name]}s")
+
+    def _init_sickzil(self):
+        self.segmenter()  # applies the session settings before the session exists
+        core.init_global_session()
+
+    def _wait_for_workers(self):
+        # Workers warm up before taking requests, so this returns once they answer
+        dummy = np.zeros((64, 64, 3), dtype=np.uint8)
+        wait([self._inference_server.submit('segmap', dummy) for _ in range(INFERENCE_WORKERS)])
+
+    def inference_server(self):
+        """The multi-process SNET/CNET server, or None when INFERENCE_WORKERS is 0."""
+        with self._lock:
+            if self._inference_server is None and INFERENCE_WORKERS:
+                self._inference_server = InferenceServer(
+                    INFERENCE_WORKERS, init='image_processing.text_segmentation:init_inference_worker',
+                    cpus=CPU_AFFINITY, timeout=INFERENCE_TIMEOUT,
+                ).start()
+            return self._inference_server
+
+    def ocr(self):
+        with self._lock:
+            if self._ocr is None and OCR_ENGINE == "stub":
+                self._ocr = StubOCR()
+            elif self._ocr is None:
+                from ocr import OCR  # imports torch: only when OCR is used
+                self._ocr = OCR()
+            return self._ocr
+
+    def segmenter(self):
+        with self._lock:
+            if self._segmenter is None:
+                self._segmenter = TextSegmentation(net=self.inference_server() or core)
+            return self._segmenter
+
+    def text_bounding(self):
+        with self._lock:
+            if self._text_bounding is None:
+                self._text_bounding = TextBounding()
+            return self._text_bounding
+
+    def is_ready(self):
+        return self.state == READY
+
+    def is_healthy(self):
+        """Whether requests can be served: models loaded, or loaded when first needed."""
+        return self.state in (READY, LAZY)
+
+    def status(self):
+        # With INFERENCE_WORKERS the nets (and their counters) live in the workers
+        server = self._inference_server
+        counts = core.merge_stats_counts(server.stats()) if server else core.stats_counts()
+        return {
+            'state': self.state,
+            'error': self.error,
+            'load_times': self.load_times,
+            'engine': core.engine,
+            'precision': core.precision,
+            'net_load_times': core.load_times,
+            'shape_buckets': core.bucket_stats(counts['buckets']),
+            'roi_inpainting': core.roi_stats(counts['roi']),
+        }
+
+
+registry = ModelRegistry()
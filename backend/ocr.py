@@ -1,9 +1,51 @@
+import os
 from manga_ocr import MangaOcr
+from manga_ocr.ocr import post_process
+import numpy as np
 import PIL.Image
+import torch
+
+# Upper bound on crops per encoder/decoder pass in extract_text_batch
+MAX_BATCH_SIZE = int(os.getenv("OCR_MAX_BATCH_SIZE", "8"))
 
 class OCR:
-    def __init__(self):
-        self.mocr = MangaOcr()
+    def __init__(self, mocr=None, max_batch_size=MAX_BATCH_SIZE):
+        # Pass an existing MangaOcr to share one loaded model between instances
+        self.mocr = mocr if mocr is not None else MangaOcr()
+        self.max_batch_size = max_batch_size
+
+    def warmup(self):
+        """Run one dummy inference so the first real crop doesn't pay for it."""
+        self.mocr(PIL.Image.new("RGB", (64, 64), "white"))
+
+    def _to_pil(self, image):
+        if isinstance(image, str):
+            return PIL.Image.open(image)
+        if isinstance(image, np.ndarray):
+            return PIL.Image.fromarray(image)
+        if isinstance(image, PIL.Image.Image):
+            return image
+        raise ValueError("Invalid input type for extract_text_batch. Expected str, ndarray or PIL.Image.")
+
+    def extract_text_batch(self, images, max_batch_size=None):
+        """
+        Extract text from several crops, running the model once per batch.
+        The processor resizes every crop to the encoder's input size, so crops
+        of any shape can share a batch. Results keep the order of `images`
+        (the manga reading order produced by TextBounding).
+        """
+        batch_size = max(1, max_batch_size or self.max_batch_size)
+        mocr = self.mocr
+        texts = []
+        for start in range(0, len(images), batch_size):
+            batch = [self._to_pil(img).convert("L").convert("RGB")
+                     for img in images[start:start + batch_size]]
+            pixel_values = mocr.processor(batch, return_tensors="pt").pixel_values
+            with torch.no_grad():
+                ids = mocr.model.generate(pixel_values.to(mocr.model.device), max_length=300).cpu()
+            decoded = mocr.tokenizer.batch_decode(ids, skip_special_tokens=True)
+            texts.extend(post_process(text) for text in decoded)
+        return texts
 
     def extract_text(self, image):
         """Extract text from an image using MangaOCR."""
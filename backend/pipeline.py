@@ -0,0 +1,223 @@
+import csv
+import os
+
+import cv2
+from PIL import Image
+
+import metrics
+from models import registry
+from translation.service import get_service
+from typesetting import render_translated_text
+
+import imgio  # on the path once models is imported
+
+CSV_HEADER = ["Original Text", "Translated Text", "x", "y", "w", "h"]
+
+
+def read_regions(crops, boxes, events=None):
+    """
+    OCR the crops of a page, skipping invalid boxes.
+    Returns (texts, bboxes) in reading order. With `events`, each region is
+    passed to events('ocr', ...) once its OCR batch is done.
+    """
+    # Skip invalid bounding boxes
+    regions = []
+    for crop, (x, y, w, h) in zip(crops, boxes):
+        if w <= 0 or h <= 0:
+            print(f"Skipping invalid bounding box: x={x}, y={y}, w={w}, h={h}")
+            continue
+        regions.append((crop, [x, y, w, h]))
+
+    # Extract text of all crops in batches (keeps reading order)
+    crops = [crop for crop, _ in regions]
+    ocr = registry.ocr()
+    with metrics.span('ocr'):
+        if events is None:
+            original_texts = ocr.extract_text_batch(crops)
+        else:
+            # One call per model batch, so each batch's texts can be sent right away
+            batch_size = getattr(ocr, 'max_batch_size', None) or max(1, len(crops))
+            original_texts = []
+            for start in range(0, len(crops), batch_size):
+                texts = ocr.extract_text_batch(crops[start:start + batch_size])
+                for i, text in enumerate(texts, start):
+                    events('ocr', {'id': i, 'original_text': text, 'bbox': regions[i][1]})
+                original_texts.extend(texts)
+    return original_texts, [bbox for _, bbox in regions]
+
+
+def region_records(original_texts, translated_texts, bboxes):
+    return [
+        {'original_text': original_text, 'translated_text': str(translated_text), 'bbox': bbox}
+        for original_text, translated_text, bbox in zip(original_texts, translated_texts, bboxes)
+    ]
+
+
+def translate_regions(crops, boxes, events=None):
+    """
+    OCR and translate the crops of a page.
+    Returns region records {'original_text', 'translated_text', 'bbox'} in reading order.
+    With `events`, each region is passed to events('ocr', ...) once its OCR batch
+    is done and to events('translation', ...) once translated.
+    """
+    original_texts, bboxes = read_regions(crops, boxes, events)
+
+    # Translate every text of the page in one batched request
+    with metrics.span('translate'):
+        translated_texts = get_service().translate_batch(original_texts)
+
+    records = region_records(original_texts, translated_texts, bboxes)
+    if events is not None:
+        for i, record in enumerate(records):
+            events('translation', dict(record, id=i))
+    return records
+
+
+def write_translations_csv(csv_file_path, regions):
+    """Write region records to the translations CSV (replacing it if it exists)."""
+    with open(csv_file_path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(CSV_HEADER)
+        for region in regions:
+            writer.writerow([region['original_text'], region['translated_text']] + list(region['bbox']))
+
+
+class PageResult:
+    """Every in-memory artifact of one processed page."""
+    def __init__(self, image, resized, inpainted, text_only, analysis, regions, translated):
+        self.image = image          # BGR input, resized to what the nets processed
+        self.resized = resized      # True if `image` differs in size from the loaded page
+        self.inpainted = inpainted  # BGR
+        self.text_only = text_only  # BGR
+        self.analysis = analysis    # PageAnalysis of text_only
+        self.regions = regions      # region records
+        self.translated = translated  # PIL RGB image
+
+    @property
+    def translations(self):
+        """Region records numbered like the API's `translations` list."""
+        return [dict(region, id=i) for i, region in enumerate(self.regions)]
+
+
+def _typeset(inpainted, regions, font_path):
+    with metrics.span('overlay'):
+        translated = Image.fromarray(cv2.cvtColor(inpainted, cv2.COLOR_BGR2RGB))
+        return render_translated_text(translated, regions, font_path)
+
+
+def process_page(image, report=None, font_path="arial.ttf", events=None):
+    """
+    Run the whole pipeline on a BGR ndarray without touching the disk.
+    `report(stage)` is called before each stage if given.
+    `events(name, data)` is given intermediate results as they are produced:
+    'stage' {'stage'}, 'text_only' and 'inpainted' (BGR ndarrays), 'ocr' and
+    'translation' (region records with their 'id').
+    """
+    def stage(name):
+        if report is not None:
+            report(name)
+        if events is not None:
+            events('stage', {'stage': name})
+
+    try:
+        stage('segment')
+        resized, inpainted, text_only = registry.segmenter().segment_image(image, events)
+
+        stage('detect')
+        analysis = registry.text_bounding().analyze(text_only)
+
+        stage('translate')
+        regions = translate_regions(analysis.crops, analysis.boxes, events)
+
+        stage('typeset')
+        translated = _typeset(inpainted, regions, font_path)
+    except Exception:
+        metrics.PAGES.inc(status='failed')
+        raise
+    metrics.PAGES.inc(status='done')
+
+    return PageResult(resized, resized.shape != image.shape, inpainted, text_only,
+                      analysis, regions, translated)
+
+
+def process_pages(images, report=None, font_path="arial.ttf"):
+    """
+    process_page for several pages, e.g. a chapter. Segmentation and
+    inpainting run over all pages at once, so SNET/CNET get batches of pages
+    (or every inference worker gets one), and all texts are translated with
+    as few requests as possible. Returns a PageResult per image.
+    """
+    def stage(name):
+        if report is not None:
+            report(name)
+
+    try:
+        stage('segment')
+        segmented = registry.segmenter().segment_images(images)
+
+        stage('detect')
+        analyses = [registry.text_bounding().analyze(text_only) for _, _, text_only in segmented]
+
+        stage('translate')
+        read = [read_regions(analysis.crops, analysis.boxes) for analysis in analyses]
+        with metrics.span('translate'):
+            translated_pages = get_service().translate_chapter([texts for texts, _ in read])
+        page_regions = [region_records(texts, translated, bboxes)
+                        for (texts, bboxes), translated in zip(read, translated_pages)]
+
+        stage('typeset')
+        results = []
+        for image, (resized, inpainted, text_only), analysis, regions in zip(
+                images, segmented, analyses, page_regions):
+            results.append(PageResult(resized, resized.shape != image.shape, inpainted, text_only,
+                                      analysis, regions, _typeset(inpainted, regions, font_path)))
+    except Exception:
+        metrics.PAGES.inc(len(images), status='failed')
+        raise
+    metrics.PAGES.inc(len(images), status='done')
+    return results
+
+
+def _replace_file(path, write):
+    """write(tmp_path), then rename it over `path` so readers never see a partial file."""
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{ext}"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _save_translated(path, img):
+    # Written last: its existence marks the page as processed
+    _replace_file(path, img.save)
+    print(f"Translated image saved to {path}")
+
+
+def _encode(func, *args):
+    with metrics.span('encode'):
+        func(*args)
+
+
+def save_image(path, img):
+    """Encode one BGR artifact to `path` right away (before the rest of the page is saved)."""
+    _encode(imgio.save, path, img)
+
+
+def save_page(result, paths):
+    """
+    Encode the artifacts of `result` to disk.
+    `paths` maps any of 'image', 'inpainted', 'text_only', 'boxed', 'translated'
+    and 'csv' to output files; missing keys are not written. 'image' receives
+    the resized page, and only if the nets processed a resized copy.
+    """
+    if 'csv' in paths:
+        write_translations_csv(paths['csv'], result.regions)
+    if 'image' in paths and result.resized:
+        _encode(cv2.imwrite, paths['image'], result.image)
+    if 'inpainted' in paths:
+        _encode(imgio.save, paths['inpainted'], result.inpainted)
+    if 'text_only' in paths:
+        _encode(imgio.save, paths['text_only'], result.text_only)
+    if 'boxed' in paths:
+        _encode(cv2.imwrite, paths['boxed'], result.analysis.boxed)
+    if 'translated' in paths:
+        _encode(_save_translated, paths['translated'], result.translated)
@@ -0,0 +1,85 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+
+CHUNK_SIZE = 1 << 16
+
+
+class UploadStore:
+    """
+    Content-addressed upload storage.
+
+    Uploads are hashed (sha256) while they are streamed to disk and stored
+    as `<hash><ext>`, so identical pages share one image id and therefore
+    every artifact processed from it. A reference count per image id,
+    kept in SQLite, tells when the last owner released it.
+    """
+    def __init__(self, upload_dir, db_path):
+        self.upload_dir = upload_dir
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS refs (image_id TEXT PRIMARY KEY, count INTEGER)")
+        self._db.commit()
+
+    def find(self, image_id):
+        """Return the path of the stored upload, or None."""
+        for ext in ['.jpg', '.jpeg', '.png']:
+            path = os.path.join(self.upload_dir, f"{image_id}{ext}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def save(self, stream, file_ext):
+        """
+        Store the file-like `stream` and return (image_id, path, is_new).
+        An identical earlier upload is reused and gains one reference.
+        """
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.upload_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    tmp_file.write(chunk)
+            image_id = digest.hexdigest()
+
+            with self._lock:
+                path = self.find(image_id)
+                is_new = path is None
+                if is_new:
+                    path = os.path.join(self.upload_dir, f"{image_id}{file_ext.lower()}")
+                    os.replace(tmp_path, path)
+                self._db.execute(
+                    "INSERT INTO refs VALUES (?, 1)"
+                    " ON CONFLICT(image_id) DO UPDATE SET count = count + 1", (image_id,))
+                self._db.commit()
+            return image_id, path, is_new
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def refs(self, image_id):
+        with self._lock:
+            row = self._db.execute("SELECT count FROM refs WHERE image_id = ?", (image_id,)).fetchone()
+            return row[0] if row else 0
+
+    def release(self, image_id, on_last=None):
+        """
+        Drop one reference and return how many remain (0 means safe to delete).
+        `on_last()` is called when none remain, still holding the lock, so an
+        identical upload arriving meanwhile is stored again rather than
+        gaining a reference to files that are being removed.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT count FROM refs WHERE image_id = ?", (image_id,)).fetchone()
+            remaining = max(0, (row[0] if row else 0) - 1)
+            if remaining:
+                self._db.execute("UPDATE refs SET count = ? WHERE image_id = ?", (remaining, image_id))
+            else:
+                self._db.execute("DELETE FROM refs WHERE image_id = ?", (image_id,))
+            self._db.commit()
+            if not remaining and on_last is not None:
+                on_last()
+            return remaining
@@ -0,0 +1,86 @@
+import os,sys
+sys.path.append( os.path.join(os.path.dirname(os.path.abspath(__file__)), '..') )
+
+import functools
+import io
+import json
+import threading
+
+import cv2
+import pytest
+
+import app
+import pipeline
+from benchmarks.synthetic import synthetic_page
+
+@pytest.fixture
+def client(monkeypatch):
+    # Pillow's built-in font: arial.ttf isn't installed everywhere
+    monkeypatch.setattr(app, 'process_page', functools.partial(pipeline.process_page, font_path=None))
+    yield app.app.test_client()
+    app.job_queue.join()
+
+def upload(client, seed):
+    png = cv2.imencode('.png', synthetic_page(400, 560, seed=seed))[1].tobytes()
+    response = client.post('/api/upload', data={'image': (io.BytesIO(png), 'page.png')},
+                           content_type='multipart/form-data')
+    return response.get_json()['image_id']
+
+def parse_events(text):
+    events = []
+    for block in text.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n') if not line.startswith(':'))
+        if lines:
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+def test_events_arrive_in_pipeline_order(client):
+    image_id = upload(client, seed=11)
+    events = parse_events(client.get(f'/api/process/{image_id}/events').get_data(as_text=True))
+    names = [name for name, _ in events]
+    assert names[0] == 'queued' and names[-1] == 'done'
+    assert [data['stage'] for name, data in events if name == 'stage'] == ['segment', 'detect', 'translate', 'typeset']
+
+    def first(name):
+        return names.index(name)
+    def last(name):
+        return len(names) - 1 - names[::-1].index(name)
+    assert first('stage') < first('text_only') < first('inpainted') < first('ocr')
+    assert last('ocr') < first('translation') and last('translation') < first('done')
+
+    done = events[-1][1]
+    translations = [data for name, data in events if name == 'translation']
+    assert [t['id'] for t in translations] == list(range(len(done['translations'])))
+    assert client.get(done['inpainted_image']).status_code == 200
+
+    # Already processed: the result right away
+    again = parse_events(client.get(f'/api/process/{image_id}/events').get_data(as_text=True))
+    assert [name for name, _ in again] == ['done']
+
+def test_failed_page_ends_with_an_error_event(client, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError('segmentation exploded')
+    monkeypatch.setattr(app, 'process_page', broken)
+    image_id = upload(client, seed=12)
+    events = parse_events(client.get(f'/api/process/{image_id}/events').get_data(as_text=True))
+    assert [name for name, _ in events] == ['queued', 'error']
+    assert 'segmentation exploded' in events[-1][1]['error']
+
+def test_page_finishes_after_the_client_disconnects(client, monkeypatch):
+    release = threading.Event()
+    process_page = app.process_page
+    def slow(*args, **kwargs):
+        release.wait(10)
+        return process_page(*args, **kwargs)
+    monkeypatch.setattr(app, 'process_page', slow)
+    image_id = upload(client, seed=13)
+
+    response = client.get(f'/api/process/{image_id}/events', buffered=False)
+    stream = iter(response.response)
+    assert b'event: queued' in next(stream)
+    response.close()
+    release.set()
+    app.job_queue.join()
+
+    events = parse_events(client.get(f'/api/process/{image_id}/events').get_data(as_text=True))
+    assert [name for name, _ in events] == ['done']
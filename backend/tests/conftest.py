@@ -0,0 +1,15 @@
+import os
+import tempfile
+
+# Stand-in models and translator: the tests need no model files or API key.
+# Set before any test imports models (settings are read at import time).
+os.environ.setdefault("SEGMENT_ENGINE", "stub")
+os.environ.setdefault("SEGMENT_PRECISION", "fp32")
+os.environ.setdefault("OCR_ENGINE", "stub")
+os.environ.setdefault("TRANSLATOR", "fake")
+os.environ.setdefault("TRANSLATION_CACHE", "off")
+os.environ.setdefault("SEGMENT_LIMITS_PATH", "")
+
+# The app writes its uploads and results here, removed when the test run ends
+_output_dir = tempfile.TemporaryDirectory()
+os.environ.setdefault("OUTPUT_DIR", _output_dir.name)
@@ -0,0 +1,68 @@
+import os,sys
+sys.path.append( os.path.join(os.path.dirname(os.path.abspath(__file__)), '..') )
+
+import pytest
+from PIL import Image
+
+import derivatives
+from derivatives import DerivativeCache
+
+@pytest.fixture
+def cache(tmp_path):
+    return DerivativeCache(str(tmp_path / 'derivatives'))
+
+def page(tmp_path, name, color=(200, 10, 10), size=(1000, 1400)):
+    path = str(tmp_path / name)
+    Image.new('RGB', size, color).save(path)
+    return path
+
+def cached(cache):
+    return sorted(os.listdir(cache.cache_dir))
+
+def test_second_get_is_a_hit(cache, tmp_path, monkeypatch):
+    src = page(tmp_path, 'abc.png')
+    path, mime_type = cache.get(src, 240)
+    cache.release(path)
+    assert mime_type == 'image/webp'
+    with Image.open(path) as img:
+        assert img.size == (240, 336)
+
+    monkeypatch.setattr(derivatives.Image, 'open', lambda *args: pytest.fail('re-encoded'))
+    assert cache.get(src, 240) == (path, mime_type)
+    cache.release(path)
+
+def test_edited_source_gets_a_new_derivative(cache, tmp_path):
+    src = page(tmp_path, 'abc.png')
+    old_path, _ = cache.get(src, 240)
+    cache.release(old_path)
+    page(tmp_path, 'abc.png', color=(0, 0, 0), size=(1000, 1000))
+    new_path, _ = cache.get(src, 240)
+    cache.release(new_path)
+    assert new_path != old_path
+    with Image.open(new_path) as img:
+        assert img.size == (240, 240)
+
+def test_least_recently_used_evicted_but_not_files_being_served(cache, tmp_path):
+    first, _ = cache.get(page(tmp_path, 'a.png'), 240)
+    cache.release(first)
+    served, _ = cache.get(page(tmp_path, 'b.png'), 240)  # not released yet
+    cache.max_bytes = os.path.getsize(first) + os.path.getsize(served) - 1
+    third, _ = cache.get(page(tmp_path, 'c.png'), 240)
+    assert not os.path.exists(first)
+    assert os.path.exists(served) and os.path.exists(third)
+
+    cache.release(third)
+    cache.release(served)
+    last, _ = cache.get(page(tmp_path, 'd.png'), 240)
+    cache.release(last)
+    assert not os.path.exists(served)
+
+def test_purge_removes_an_images_derivatives(cache, tmp_path):
+    for name in ['abc.png', 'abc_inpainted.png', 'xyz.png']:
+        cache.release(cache.get(page(tmp_path, name), 240)[0])
+    serving, _ = cache.get(page(tmp_path, 'abc_translated.png'), 240)
+
+    cache.purge('abc')
+    assert [name.split('.')[0] for name in cached(cache)] == ['abc_translated', 'xyz']
+    cache.release(serving)  # removed once sent
+    assert [name.split('.')[0] for name in cached(cache)] == ['xyz']
@@ -0,0 +1,58 @@
+import os,sys
+sys.path.append( os.path.join(os.path.dirname(os.path.abspath(__file__)), '..') )
+
+import threading
+
+import pytest
+import jobs
+from jobs import JobQueue, JobQueueFull
+
+@pytest.fixture
+def job_queue():
+    job_queue = JobQueue(workers=2, max_queued=4)
+    job_queue.start()
+    yield job_queue
+    job_queue.stop()
+
+def test_runs_jobs_and_reports_stages(job_queue):
+    def work(x, job=None, scale=1):
+        job.report('working')
+        return x * scale
+    job = job_queue.submit(work, 21, scale=2)
+    job_queue.join()
+    assert job_queue.get(job.id) is job
+    assert job.status == jobs.DONE and job.result == 42 and job.stage == 'working'
+    assert job.to_dict()['status'] == jobs.DONE
+
+def test_failed_jobs_keep_their_error(job_queue):
+    def fail(job=None):
+        raise ValueError('broken page')
+    job = job_queue.submit(fail)
+    job_queue.join()
+    assert job.status == jobs.FAILED and job.error == 'broken page'
+
+def test_full_queue_rejects_jobs():
+    job_queue = JobQueue(workers=1, max_queued=2) # not started: nothing drains the queue
+    job_queue.submit(lambda job=None: None)
+    job_queue.submit(lambda job=None: None)
+    assert job_queue.pending() == 2
+    with pytest.raises(JobQueueFull):
+        job_queue.submit(lambda job=None: None)
+    job_queue.start()
+    job_queue.stop()
+    assert job_queue.pending() == 0
+
+def test_only_recent_finished_jobs_are_kept():
+    job_queue = JobQueue(workers=1, max_queued=8, keep_finished=2)
+    job_queue.start()
+    done = [job_queue.submit(lambda job=None: None) for _ in range(3)]
+    job_queue.stop()
+    assert job_queue.get(done[0].id) is None
+    assert all(job_queue.get(job.id) is job for job in done[1:])
+
+def test_workers_run_jobs_concurrently(job_queue):
+    both_running = threading.Barrier(2, timeout=10)
+    for _ in range(2):
+        job_queue.submit(lambda job=None: both_running.wait())
+    job_queue.join()
+    assert not both_running.broken
@@ -0,0 +1,76 @@
+import os,sys
+sys.path.append( os.path.join(os.path.dirname(os.path.abspath(__file__)), '..') )
+
+from collections import OrderedDict
+
+import pytest
+import metrics
+from metrics import Counter, Histogram
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, 'enabled', True)
+    monkeypatch.setattr(metrics, '_metrics', OrderedDict())
+    monkeypatch.setattr(metrics, '_collectors', [])
+
+def test_counter_keeps_a_value_per_label_set():
+    pages = Counter('pages_total', 'Pages', ['status'])
+    pages.inc(status='ok')
+    pages.inc(2, status='ok')
+    pages.inc(status='error')
+    assert pages.value(status='ok') == 3
+    assert pages.value(status='missing') == 0
+    assert list(pages.samples()) == ['pages_total{status="error"} 1', 'pages_total{status="ok"} 3']
+
+def test_label_values_are_escaped():
+    counter = Counter('c', 'C', ['path'])
+    counter.inc(path='a"b\\c\nd')
+    assert list(counter.samples()) == ['c{path="a\\"b\\\\c\\nd"} 1']
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count():
+    seconds = Histogram('stage_seconds', 'Stage time', ['stage'], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        seconds.observe(value, stage='ocr')
+    assert seconds.count(stage='ocr') == 4
+    assert list(seconds.samples()) == [
+        'stage_seconds_bucket{stage="ocr",le="0.1"} 1',
+        'stage_seconds_bucket{stage="ocr",le="1"} 3',
+        'stage_seconds_bucket{stage="ocr",le="+Inf"} 4',
+        'stage_seconds_sum{stage="ocr"} 4.05',
+        'stage_seconds_count{stage="ocr"} 4',
+    ]
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    monkeypatch.setattr(metrics, 'enabled', False)
+    counter = Counter('c', 'C')
+    counter.inc()
+    assert counter.value() == 0
+    assert metrics.span('ocr') is metrics.span('detect')
+
+def test_render_text_format_with_collectors_and_non_finite_values():
+    metrics.counter('bubbles_total', 'Bubbles').inc(5)
+    metrics.add_collector(lambda: [
+        ('queue_length', 'gauge', 'Jobs waiting', {'queue': 'pages'}, 2),
+        ('queue_length', 'gauge', 'Jobs waiting', {'queue': 'chapters'}, 0.5),
+        ('ratio', 'gauge', 'Ratio', {}, float('nan')),
+        ('limit', 'gauge', 'Limit', {}, float('inf')),
+        ('floor', 'gauge', 'Floor', {}, float('-inf')),
+    ])
+    assert metrics.render() == (
+        '# HELP bubbles_total Bubbles\n'
+        '# TYPE bubbles_total counter\n'
+        'bubbles_total 5\n'
+        '# HELP queue_length Jobs waiting\n'
+        '# TYPE queue_length gauge\n'
+        'queue_length{queue="pages"} 2\n'
+        'queue_length{queue="chapters"} 0.5\n'
+        '# HELP ratio Ratio\n'
+        '# TYPE ratio gauge\n'
+        'ratio NaN\n'
+        '# HELP limit Limit\n'
+        '# TYPE limit gauge\n'
+        'limit +Inf\n'
+        '# HELP floor Floor\n'
+        '# TYPE floor gauge\n'
+        'floor -Inf\n'
+    )
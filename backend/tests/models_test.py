@@ -0,0 +1,20 @@
+import os,sys
+sys.path.append( os.path.join(os.path.dirname(os.path.abspath(__file__)), '..') )
+
+from models import ModelRegistry, NOT_LOADED, LAZY, READY
+
+def test_lazy_registry_is_healthy_before_loading():
+    registry = ModelRegistry()
+    assert registry.state == NOT_LOADED
+    assert not registry.is_healthy()
+
+    registry.load_lazily()
+    assert registry.state == LAZY
+    assert registry.is_healthy()
+    assert not registry.is_ready()
+
+def test_lazy_does_not_override_loaded_state():
+    registry = ModelRegistry()
+    registry.state = READY
+    registry.load_lazily()
+    assert registry.state == READY
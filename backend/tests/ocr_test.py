@@ -0,0 +1,53 @@
+import os,sys
+sys.path.append( os.path.join(os.path.dirname(os.path.abspath(__file__)), '..') )
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('manga_ocr')
+from manga_ocr.ocr import post_process
+from ocr import OCR
+
+TEXTS = 'あいうえおかきくけこさしすせそ'
+
+class FakeMangaOcr:
+    """Reads back the gray level each crop is filled with as one kana, recording batch sizes."""
+    def __init__(self):
+        self.batches = []
+        self.model = SimpleNamespace(device='cpu', generate=self.generate)
+        self.tokenizer = SimpleNamespace(batch_decode=self.batch_decode)
+
+    def processor(self, images, return_tensors):
+        self.batches.append(len(images))
+        return SimpleNamespace(pixel_values=torch.tensor([img.getpixel((0, 0))[0] for img in images]))
+
+    def generate(self, pixel_values, max_length):
+        return pixel_values.unsqueeze(1)
+
+    def batch_decode(self, ids, skip_special_tokens):
+        return [TEXTS[int(row[0])] for row in ids]
+
+def crops(count):
+    # Different shapes, as crops of a page are
+    return [np.full((20 + 3*i, 40 - i, 3), i, np.uint8) for i in range(count)]
+
+@pytest.mark.parametrize('count, batch_size, batches', [
+    (7, 3, [3, 3, 1]),
+    (6, 3, [3, 3]),
+    (2, 8, [2]),
+    (0, 4, []),
+])
+def test_batches_keep_reading_order(count, batch_size, batches):
+    mocr = FakeMangaOcr()
+    texts = OCR(mocr, max_batch_size=batch_size).extract_text_batch(crops(count))
+    assert texts == [post_process(TEXTS[i]) for i in range(count)]
+    assert mocr.batches == batches
+
+def test_call_overrides_batch_size():
+    mocr = FakeMangaOcr()
+    texts = OCR(mocr, max_batch_size=8).extract_text_batch(crops(5), max_batch_size=2)
+    assert len(texts) == 5
+    assert mocr.batches == [2, 2, 1]
@@ -0,0 +1,23 @@
+import os,sys
+sys.path.append( os.path.join(os.path.dirname(os.path.abspath(__file__)), '..') )
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_page
+from pipeline import process_page, process_pages
+
+def test_chapter_matches_page_by_page():
+    pages = [synthetic_page(500, 700, seed=i) for i in range(3)]
+    chapter = process_pages(pages, font_path=None)
+    assert len(chapter) == len(pages)
+    for page, batched in zip(pages, chapter):
+        single = process_page(page, font_path=None)
+        assert np.array_equal(batched.text_only, single.text_only)
+        assert np.array_equal(batched.inpainted, single.inpainted)
+        assert batched.regions == single.regions
+        assert np.array_equal(np.asarray(batched.translated), np.asarray(single.translated))
+
+def test_chapter_reports_its_stages():
+    stages = []
+    process_pages([synthetic_page(300, 400)], stages.append, font_path=None)
+    assert stages == ['segment', 'detect', 'translate', 'typeset']
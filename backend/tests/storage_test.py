@@ -0,0 +1,66 @@
+import os,sys
+sys.path.append( os.path.join(os.path.dirname(os.path.abspath(__file__)), '..') )
+
+import hashlib
+import io
+import threading
+
+import pytest
+from storage import UploadStore
+
+PAGE = b'\x89PNG page bytes'
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path), str(tmp_path / 'uploads.sqlite3'))
+
+def test_id_is_hash_of_stored_bytes(store):
+    image_id, path, is_new = store.save(io.BytesIO(PAGE), '.PNG')
+    assert is_new
+    assert image_id == hashlib.sha256(PAGE).hexdigest()
+    assert path.endswith(f'{image_id}.png')
+    with open(path, 'rb') as f:
+        assert hashlib.sha256(f.read()).hexdigest() == image_id
+    assert store.find(image_id) == path
+
+def test_identical_uploads_share_one_id(store):
+    first = store.save(io.BytesIO(PAGE), '.png')
+    second = store.save(io.BytesIO(PAGE), '.jpg')
+    assert second[:2] == first[:2]
+    assert not second[2]
+    assert store.refs(first[0]) == 2
+    assert [f for f in os.listdir(store.upload_dir) if not f.endswith('.sqlite3')] == [os.path.basename(first[1])]
+
+def test_files_removed_only_with_last_reference(store):
+    image_id, path, _ = store.save(io.BytesIO(PAGE), '.png')
+    store.save(io.BytesIO(PAGE), '.png')
+    removed = []
+    on_last = lambda: removed.append(image_id) or os.remove(path)
+    assert store.release(image_id, on_last=on_last) == 1
+    assert removed == []
+    assert store.release(image_id, on_last=on_last) == 0
+    assert removed == [image_id]
+    assert store.find(image_id) is None
+    assert store.refs(image_id) == 0
+
+def test_upload_during_release_is_stored_again(store):
+    image_id, path, _ = store.save(io.BytesIO(PAGE), '.png')
+    removing = threading.Event()
+    uploaded = []
+
+    def on_last():
+        # An identical upload arrives while the files are being removed
+        removing.set()
+        uploader.join(0.2)
+        assert uploader.is_alive()  # it waits for the store lock
+        os.remove(path)
+
+    uploader = threading.Thread(
+        target=lambda: removing.wait() and uploaded.append(store.save(io.BytesIO(PAGE), '.png')))
+    uploader.start()
+    store.release(image_id, on_last=on_last)
+    uploader.join()
+
+    assert uploaded[0][2]  # new upload, not a reference to the removed file
+    assert os.path.exists(uploaded[0][1])
+    assert store.refs(image_id) == 1
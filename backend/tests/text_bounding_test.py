@@ -0,0 +1,55 @@
+import os,sys
+sys.path.append( os.path.join(os.path.dirname(os.path.abspath(__file__)), '..') )
+
+import numpy as np
+import pytest
+
+import pipeline
+from benchmarks.synthetic import synthetic_page
+from image_processing.text_bounding import PageAnalysis, TextBounding
+
+class ShapeOCR:
+    """Reads each crop as its shape, so texts can be matched back to boxes."""
+    def __init__(self):
+        self.crops = []
+        self.max_batch_size = 2
+
+    def extract_text_batch(self, images, max_batch_size=None):
+        self.crops.extend(images)
+        return [f"{h}x{w}" for h, w in (np.asarray(image).shape[:2] for image in images)]
+
+@pytest.fixture
+def analysis():
+    analysis = TextBounding().analyze(synthetic_page(600, 900, seed=3))
+    assert len(analysis.boxes) >= 2
+    return analysis
+
+def test_crops_and_boxed_page_follow_the_boxes(analysis):
+    image = analysis.image.copy()
+    assert len(analysis.crops) == len(analysis.boxes)
+    for crop, (x, y, w, h) in zip(analysis.crops, analysis.boxes):
+        assert np.array_equal(crop, image[y:y + h, x:x + w])
+        assert analysis.boxed[y, x].tolist() == [0, 255, 0]
+        assert analysis.boxed[y + h, x + w].tolist() == [0, 255, 0]
+    assert np.array_equal(analysis.image, image)  # drawn on a copy
+
+@pytest.mark.parametrize('streamed', [False, True])
+def test_invalid_boxes_skipped_for_ocr_and_records(analysis, monkeypatch, streamed):
+    boxes = list(analysis.boxes)
+    boxes.insert(1, (10, 10, 0, 5))
+    boxes.append((20, 20, 5, 0))
+    page = PageAnalysis(None, analysis.image, boxes, TextBounding().crop_regions(analysis.image, boxes))
+    ocr = ShapeOCR()
+    monkeypatch.setattr(pipeline.registry, 'ocr', lambda: ocr)
+    events = []
+
+    records = pipeline.translate_regions(page.crops, page.boxes,
+                                         (lambda *event: events.append(event)) if streamed else None)
+    assert len(ocr.crops) == len(records) == len(analysis.boxes)
+    for crop, record, (x, y, w, h) in zip(ocr.crops, records, analysis.boxes):
+        assert record['bbox'] == [x, y, w, h]
+        assert record['original_text'] == f"{h}x{w}"
+        assert np.array_equal(crop, analysis.image[y:y + h, x:x + w])
+    if streamed:
+        ocr_events = [data for kind, data in events if kind == 'ocr']
+        assert [(e['id'], e['bbox']) for e in ocr_events] == [(i, r['bbox']) for i, r in enumerate(records)]
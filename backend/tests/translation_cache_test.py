@@ -0,0 +1,63 @@
+import os,sys
+sys.path.append( os.path.join(os.path.dirname(os.path.abspath(__file__)), '..') )
+
+import pytest
+from translation.cache import TranslationCache, normalize
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = TranslationCache(str(tmp_path / 'cache.sqlite3'), memory_size=2, max_entries=3)
+    yield cache
+    cache.close()
+
+def used_at(cache, text):
+    return cache._db.execute("SELECT used_at FROM translations WHERE source = ?",
+                             (normalize(text),)).fetchone()[0]
+
+def test_normalize():
+    assert normalize('  ａｂｃ \n def ') == 'abc def'
+
+def test_memory_and_disk_hits(cache):
+    assert cache.get('こんにちは', 'EN', 'deepl') is None
+    cache.put('こんにちは', 'EN', 'deepl', 'Hello')
+    assert cache.get(' こんにちは ', 'EN', 'deepl') == 'Hello'
+    assert cache.get('こんにちは', 'DE', 'deepl') is None
+    assert cache.stats()['memory_hits'] == 1
+
+    reopened = TranslationCache(cache.path)
+    assert reopened.get('こんにちは', 'EN', 'deepl') == 'Hello'
+    assert reopened.stats() == {'hits': 1, 'memory_hits': 0, 'misses': 0, 'entries': 1, 'memory_entries': 1}
+    reopened.close()
+
+def test_ttl_expires_entries():
+    cache = TranslationCache(ttl=-1)
+    cache.put('a', 'EN', 'fake', 'A')
+    assert cache.get('a', 'EN', 'fake') is None
+    assert cache.stats()['entries'] == 0
+
+def test_row_count_is_tracked_and_table_trimmed(cache):
+    for text in 'abcde':
+        cache.put(text, 'EN', 'fake', text.upper())
+    cache.put('e', 'EN', 'fake', 'E2') # replacing doesn't add a row
+    count = cache._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+    assert count == cache.stats()['entries'] == 3
+    assert cache.get('a', 'EN', 'fake') is None # least recently used went first
+    assert cache.get('e', 'EN', 'fake') == 'E2'
+
+def test_memory_hits_reach_sqlite_in_batches(tmp_path):
+    cache = TranslationCache(str(tmp_path / 'cache.sqlite3'), max_entries=3,
+                             touch_interval=3600, touch_batch=2)
+    for text in 'abc':
+        cache.put(text, 'EN', 'fake', text.upper())
+    before = used_at(cache, 'a')
+    cache.get('a', 'EN', 'fake')
+    assert used_at(cache, 'a') == before # not written yet
+    cache.get('b', 'EN', 'fake')
+    assert used_at(cache, 'a') > before # batch of 2 written
+
+    # A pending use counts when evicting: 'c' goes, not the recently read 'a'
+    cache.get('a', 'EN', 'fake')
+    cache.put('d', 'EN', 'fake', 'D')
+    sources = {row[0] for row in cache._db.execute("SELECT source FROM translations")}
+    assert sources == {'a', 'b', 'd'}
+    cache.close()
@@ -0,0 +1,77 @@
+import os,sys
+sys.path.append( os.path.join(os.path.dirname(os.path.abspath(__file__)), '..') )
+
+import threading
+
+from translation import service
+from translation.cache import TranslationCache
+from translation.service import FakeBackend, RateLimited, TranslationService
+
+class FlakyBackend(FakeBackend):
+    """Rate limited on the first `failures` calls."""
+    def __init__(self, failures, error=RateLimited):
+        super().__init__()
+        self.failures = failures
+        self.error = error
+
+    def translate_batch(self, texts, target_lang):
+        if self.failures:
+            self.failures -= 1
+            raise self.error('slow down')
+        return super().translate_batch(texts, target_lang)
+
+def test_batches_and_keeps_order():
+    backend = FakeBackend()
+    texts = [f't{i}' for i in range(5)]
+    assert TranslationService(backend, 'EN', max_batch_size=2).translate_batch(texts) == \
+        [f'[EN] t{i}' for i in range(5)]
+    assert backend.calls == [['t0', 't1'], ['t2', 't3'], ['t4']]
+
+def test_repeated_and_empty_texts_are_sent_once():
+    backend = FakeBackend()
+    result = TranslationService(backend, 'EN').translate_batch(['a', '', 'ａ ', '  ', 'b', 'a'])
+    assert result == ['[EN] a', '', '[EN] a', '', '[EN] b', '[EN] a']
+    assert backend.calls == [['a', 'b']]
+
+def test_retries_rate_limits_with_backoff(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(service.time, 'sleep', sleeps.append)
+    backend = FlakyBackend(failures=3)
+    svc = TranslationService(backend, 'EN', max_retries=5, backoff=1.0, max_backoff=3.0)
+    assert svc.translate_batch(['a']) == ['[EN] a']
+    assert sleeps == [1.0, 2.0, 3.0]
+
+def test_failed_translations_fall_back_to_the_original(monkeypatch):
+    monkeypatch.setattr(service.time, 'sleep', lambda s: None)
+    cache = TranslationCache()
+    svc = TranslationService(FlakyBackend(failures=3), 'EN', max_retries=2, cache=cache)
+    assert svc.translate_batch(['a', 'b']) == ['a', 'b']
+    assert cache.get('a', 'EN', 'fake') is None # not cached
+    svc = TranslationService(FlakyBackend(failures=1, error=ValueError), 'EN', cache=cache)
+    assert svc.translate_batch(['a']) == ['a'] # other errors aren't retried
+
+def test_cached_texts_are_not_sent_again():
+    backend = FakeBackend()
+    svc = TranslationService(backend, 'EN', cache=TranslationCache())
+    svc.translate_batch(['a', 'b'])
+    assert svc.translate_batch(['b', 'c', 'a']) == ['[EN] b', '[EN] c', '[EN] a']
+    assert backend.calls == [['a', 'b'], ['c']]
+
+def test_chapter_is_split_back_into_pages():
+    backend = FakeBackend()
+    svc = TranslationService(backend, 'EN')
+    assert svc.translate_chapter([['a', 'b'], [], ['a', 'c']]) == \
+        [['[EN] a', '[EN] b'], [], ['[EN] a', '[EN] c']]
+    assert backend.calls == [['a', 'b', 'c']]
+
+def test_get_service_creates_one_service(monkeypatch):
+    monkeypatch.setattr(service, '_service', None)
+    monkeypatch.setenv('TRANSLATOR', 'fake')
+    monkeypatch.setenv('TRANSLATION_CACHE', 'off')
+    services = []
+    threads = [threading.Thread(target=lambda: services.append(service.get_service())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(services) == 8 and all(svc is services[0] for svc in services)
@@ -0,0 +1,151 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize(text):
+    """Cache key form of a source text: NFKC, trimmed, whitespace collapsed."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+
+class TranslationCache:
+    """
+    Two-tier translation memory: an in-memory LRU in front of a SQLite table.
+
+    Entries are keyed by (backend, target language, normalized source text).
+    Entries older than `ttl` seconds are treated as misses (ttl=None keeps
+    them forever) and the SQLite table is trimmed to `max_entries` rows by
+    least recent use. Uses served from memory are written to SQLite in
+    batches, every `touch_interval` seconds or `touch_batch` entries.
+    """
+    def __init__(self, path=":memory:", memory_size=4096, max_entries=200000, ttl=None,
+                 touch_interval=30.0, touch_batch=256):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.touch_interval = touch_interval
+        self.touch_batch = touch_batch
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._touched = {}  # key -> used_at of memory hits not yet in SQLite
+        self._touched_at = time.monotonic()
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " backend TEXT, target_lang TEXT, source TEXT, translation TEXT,"
+            " created_at REAL, used_at REAL,"
+            " PRIMARY KEY (backend, target_lang, source))")
+        self._db.execute("CREATE INDEX IF NOT EXISTS translations_used_at ON translations (used_at)")
+        self._db.commit()
+        self._count = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def _expired(self, created_at, now):
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def get(self, text, target_lang, backend):
+        """Return the cached translation or None."""
+        key = (backend, target_lang, normalize(text))
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[1], now):
+                self._memory.move_to_end(key)
+                self._touch(key, now)
+                self.hits += 1
+                self.memory_hits += 1
+                return entry[0]
+            self._memory.pop(key, None)
+
+            row = self._db.execute(
+                "SELECT translation, created_at FROM translations"
+                " WHERE backend = ? AND target_lang = ? AND source = ?", key).fetchone()
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    self._db.execute(
+                        "DELETE FROM translations WHERE backend = ? AND target_lang = ? AND source = ?", key)
+                    self._db.commit()
+                    self._count -= 1
+                self.misses += 1
+                return None
+            self._db.execute(
+                "UPDATE translations SET used_at = ?"
+                " WHERE backend = ? AND target_lang = ? AND source = ?", (now,) + key)
+            self._db.commit()
+            self._remember(key, row[0], row[1])
+            self.hits += 1
+            return row[0]
+
+    def put(self, text, target_lang, backend, translation):
+        key = (backend, target_lang, normalize(text))
+        now = time.time()
+        with self._lock:
+            updated = self._db.execute(
+                "UPDATE translations SET translation = ?, created_at = ?, used_at = ?"
+                " WHERE backend = ? AND target_lang = ? AND source = ?",
+                (translation, now, now) + key).rowcount
+            if not updated:
+                self._db.execute("INSERT INTO translations VALUES (?, ?, ?, ?, ?, ?)",
+                                 key + (translation, now, now))
+                self._count += 1
+            self._touched.pop(key, None)
+            self._evict()
+            self._db.commit()
+            self._remember(key, translation, now)
+
+    def _remember(self, key, translation, created_at):
+        self._memory[key] = (translation, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _touch(self, key, now):
+        self._touched[key] = now
+        if (len(self._touched) >= self.touch_batch
+                or time.monotonic() - self._touched_at >= self.touch_interval):
+            self._flush_touched()
+            self._db.commit()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany(
+                "UPDATE translations SET used_at = ?"
+                " WHERE backend = ? AND target_lang = ? AND source = ?",
+                [(used_at,) + key for key, used_at in self._touched.items()])
+            self._touched.clear()
+        self._touched_at = time.monotonic()
+
+    def _evict(self):
+        # The row count is kept up to date instead of counted on every put
+        if self._count > self.max_entries:
+            self._flush_touched()  # evict by the latest uses
+            deleted = self._db.execute(
+                "DELETE FROM translations WHERE rowid IN ("
+                " SELECT rowid FROM translations ORDER BY used_at LIMIT ?)",
+                (self._count - self.max_entries,)).rowcount
+            self._count -= deleted
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'memory_hits': self.memory_hits,
+                'misses': self.misses,
+                'entries': self._count,
+                'memory_entries': len(self._memory),
+            }
+
+    def close(self):
+        with self._lock:
+            self._flush_touched()
+            self._db.commit()
+            self._db.close()
@@ -20,3 +20,11 @@ def translate_deepl(text):
         print(f"Translation error: {str(e)}")
         # Return original text if translation fails
         return text
+
+def translate_deepl_batch(texts, target_lang='EN-US'):
+    """
+    Translate a list of texts with a single DeepL request.
+    Errors are raised so the caller can decide whether to retry.
+    """
+    results = translator.translate_text(list(texts), target_lang=target_lang)
+    return [str(result) for result in results]
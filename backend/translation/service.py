@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from translation.cache import TranslationCache, normalize
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "..", "output", "translation_cache.sqlite3")
+
+
+class RateLimited(Exception):
+    """Raised by a backend when the translation API asks us to slow down."""
+    pass
+
+
+class DeepLBackend:
+    name = 'deepl'
+
+    def __init__(self):
+        # Imported lazily: translation.deepl needs DEEPL_KEY at import time
+        import deepl
+        from translation import deepl as deepl_translation
+        self._deepl = deepl
+        self._translate = deepl_translation.translate_deepl_batch
+
+    def translate_batch(self, texts, target_lang):
+        try:
+            return self._translate(texts, target_lang)
+        except self._deepl.TooManyRequestsException as e:
+            raise RateLimited(str(e))
+
+
+class FakeBackend:
+    """Offline translator for tests and local runs: tags each text with the language."""
+    name = 'fake'
+
+    def __init__(self):
+        self.calls = []
+
+    def translate_batch(self, texts, target_lang):
+        self.calls.append(list(texts))
+        return [f"[{target_lang}] {text}" for text in texts]
+
+
+BACKENDS = {
+    'deepl': DeepLBackend,
+    'fake': FakeBackend,
+}
+
+
+class TranslationService:
+    """
+    Translates whole pages (or chapters) with one batched backend call per
+    chunk instead of one request per bubble.
+    """
+    def __init__(self, backend, target_lang='EN-US', max_batch_size=50,
+                 max_retries=5, backoff=1.0, max_backoff=30.0, cache=None):
+        self.backend = backend
+        self.cache = cache
+        self.target_lang = target_lang
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def _call_with_retry(self, texts):
+        delay = self.backoff
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.backend.translate_batch(texts, self.target_lang)
+            except RateLimited as e:
+                if attempt == self.max_retries:
+                    raise
+                print(f"Translation rate limited ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+
+    def translate_batch(self, texts):
+        """
+        Translate a list of texts, preserving order.
+        Empty texts are not sent and come back as ''. Cached texts are
+        answered from the cache and repeated texts are sent only once.
+        If the backend fails, the original texts are returned (and not
+        cached), like translate_deepl does.
+        """
+        translated = [''] * len(texts)
+        # normalized source -> indices in `texts` still waiting for a translation
+        todo = OrderedDict()
+        for i, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            if self.cache is not None:
+                cached = self.cache.get(text, self.target_lang, self.backend.name)
+                metrics.CACHE.inc(cache='translation', result='miss' if cached is None else 'hit')
+                if cached is not None:
+                    translated[i] = cached
+                    continue
+            todo.setdefault(normalize(text), []).append(i)
+
+        groups = list(todo.values())
+        for start in range(0, len(groups), self.max_batch_size):
+            chunk = groups[start:start + self.max_batch_size]
+            sources = [texts[indices[0]] for indices in chunk]
+            try:
+                results = self._call_with_retry(sources)
+            except Exception as e:
+                print(f"Translation error: {str(e)}")
+                # Return original text if translation fails
+                for indices in chunk:
+                    for i in indices:
+                        translated[i] = texts[i]
+                continue
+            for indices, source, result in zip(chunk, sources, results):
+                if self.cache is not None:
+                    self.cache.put(source, self.target_lang, self.backend.name, result)
+                for i in indices:
+                    translated[i] = result
+        return translated
+
+    def translate_pages(self, pages, workers=4):
+        """Translate several pages (lists of texts) concurrently."""
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            return list(pool.map(self.translate_batch, pages))
+
+    def translate_chapter(self, pages):
+        """Translate several pages with as few backend calls as possible."""
+        flat = [text for page in pages for text in page]
+        translated = self.translate_batch(flat)
+        result, start = [], 0
+        for page in pages:
+            result.append(translated[start:start + len(page)])
+            start += len(page)
+        return result
+
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_service():
+    """
+    Shared TranslationService using the TRANSLATOR backend (deepl or fake)
+    and the persistent translation cache (TRANSLATION_CACHE=off disables it).
+    """
+    global _service
+    if _service is not None:
+        return _service
+    with _service_lock:
+        if _service is not None:  # created while we waited
+            return _service
+        backend = BACKENDS[os.getenv("TRANSLATOR", "deepl")]()
+        cache = None
+        cache_path = os.getenv("TRANSLATION_CACHE", CACHE_PATH)
+        if cache_path != "off":
+            ttl = os.getenv("TRANSLATION_CACHE_TTL")
+            cache = TranslationCache(
+                cache_path,
+                memory_size=int(os.getenv("TRANSLATION_CACHE_MEMORY_SIZE", "4096")),
+                max_entries=int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "200000")),
+                ttl=float(ttl) if ttl else None,
+            )
+        _service = TranslationService(backend, target_lang=os.getenv("TARGET_LANG", "EN-US"), cache=cache)
+    return _service
@@ -29,7 +29,7 @@ import {
   IconZoomReset,
   IconMaximize
 } from '@tabler/icons-react';
-import { getImage, updateTranslations } from '../services/api';
+import { getImage, getImagePreview, updateTranslations } from '../services/api';
 
 interface Translation {
   id: number;
@@ -62,6 +62,26 @@ export function Editor() {
   const [inpaintedImageUrl, setInpaintedImageUrl] = useState<string | null>(null);
   const [textOnlyImageUrl, setTextOnlyImageUrl] = useState<string | null>(null);
   const [boxedImageUrl, setBoxedImageUrl] = useState<string | null>(null);
+  const imageUrlsRef = useRef<Record<string, string>>({});
+
+  // Object URLs stay allocated until revoked: free the previous image of a tab when replacing it
+  const showImage = (tab: string, url: string, setUrl: (url: string) => void) => {
+    const previous = imageUrlsRef.current[tab];
+    if (previous?.startsWith('blob:')) {
+      URL.revokeObjectURL(previous);
+    }
+    imageUrlsRef.current[tab] = url;
+    setUrl(url);
+  };
+
+  // Free the images when leaving the page
+  useEffect(() => () => {
+    Object.values(imageUrlsRef.current).forEach(url => {
+      if (url.startsWith('blob:')) {
+        URL.revokeObjectURL(url);
+      }
+    });
+  }, []);
   
   // Zoom functionality
   const [zoomLevel, setZoomLevel] = useState(100);
@@ -85,16 +105,16 @@ export function Editor() {
     setIsLoading(true);
     try {
       const [translatedResp, originalResp, inpaintedResp, textOnlyResp] = await Promise.all([
-        getImage('translated', data.translated_image.split('/').pop() || ''),
-        getImage('uploads', data.original_image.split('/').pop() || ''),
-        getImage('inpainted', data.inpainted_image.split('/').pop() || ''),
-        getImage('text_only', data.text_only_image.split('/').pop() || '')
+        getImagePreview('translated', data.translated_image.split('/').pop() || ''),
+        getImagePreview('uploads', data.original_image.split('/').pop() || ''),
+        getImagePreview('inpainted', data.inpainted_image.split('/').pop() || ''),
+        getImagePreview('text_only', data.text_only_image.split('/').pop() || '')
       ]);
       
-      setTranslatedImageUrl(translatedResp.data);
-      setOriginalImageUrl(originalResp.data);
-      setInpaintedImageUrl(inpaintedResp.data);
-      setTextOnlyImageUrl(textOnlyResp.data);
+      showImage('translated', translatedResp.data, setTranslatedImageUrl);
+      showImage('original', originalResp.data, setOriginalImageUrl);
+      showImage('inpainted', inpaintedResp.data, setInpaintedImageUrl);
+      showImage('textOnly', textOnlyResp.data, setTextOnlyImageUrl);
     } catch (error) {
       console.error('Error fetching images:', error);
     } finally {
@@ -151,8 +171,8 @@ export function Editor() {
       const response = await updateTranslations(imageId, translationsToUpdate);
       
       // Update the translated image
-      const updatedTranslatedImage = await getImage('translated', response.translated_image.split('/').pop() || '');
-      setTranslatedImageUrl(updatedTranslatedImage.data);
+      const updatedTranslatedImage = await getImagePreview('translated', response.translated_image.split('/').pop() || '');
+      showImage('translated', updatedTranslatedImage.data, setTranslatedImageUrl);
       
       // Switch to the translated image tab
       setActiveTab('translated');
@@ -163,15 +183,20 @@ export function Editor() {
     }
   };
 
-  const handleDownload = () => {
-    if (!translatedImageUrl) return;
-    
+  // The tabs show previews: download the full-resolution page
+  const handleDownload = async () => {
+    if (!data) return;
+
+    const fullImage = await getImage('translated', data.translated_image.split('/').pop() || '');
     const link = document.createElement('a');
-    link.href = translatedImageUrl;
+    link.href = fullImage.data;
     link.download = `translated_manga_${imageId}.png`;
     document.body.appendChild(link);
     link.click();
     document.body.removeChild(link);
+    if (fullImage.data.startsWith('blob:')) {
+      URL.revokeObjectURL(fullImage.data);
+    }
   };
 
   // Zoom handlers
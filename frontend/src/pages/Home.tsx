@@ -31,14 +31,41 @@ import {
   IconZoomIn,
   IconZoomReset
 } from '@tabler/icons-react';
-import { uploadImage, processImage } from '../services/api';
+import { uploadImage, processImageStream, getImage, type ProcessEvent } from '../services/api';
+
+const STAGE_LABELS: Record<string, string> = {
+  segment: 'Finding text...',
+  detect: 'Locating speech bubbles...',
+  translate: 'Reading and translating...',
+  typeset: 'Typesetting...',
+};
 
 export function Home() {
   const [file, setFile] = useState<FileWithPath | null>(null);
   const [preview, setPreview] = useState<string | null>(null);
   const [isUploading, setIsUploading] = useState(false);
   const [isProcessing, setIsProcessing] = useState(false);
+  const [progress, setProgress] = useState<string | null>(null);
   const navigate = useNavigate();
+  const previewUrlRef = useRef<string | null>(null);
+  const streamRef = useRef<AbortController | null>(null);
+
+  // Object URLs stay allocated until revoked: free the previous preview when replacing it
+  const showPreview = (url: string | null) => {
+    if (previewUrlRef.current?.startsWith('blob:')) {
+      URL.revokeObjectURL(previewUrlRef.current);
+    }
+    previewUrlRef.current = url;
+    setPreview(url);
+  };
+
+  // Stop listening to the progress stream and free the preview when leaving the page
+  useEffect(() => () => {
+    streamRef.current?.abort();
+    if (previewUrlRef.current?.startsWith('blob:')) {
+      URL.revokeObjectURL(previewUrlRef.current);
+    }
+  }, []);
 
   // Preview image zoom functionality
   const [zoomLevel, setZoomLevel] = useState(100);
@@ -84,7 +111,7 @@ export function Home() {
 
   const handleDrop = (files: FileWithPath[]) => {
     setFile(files[0]);
-    setPreview(URL.createObjectURL(files[0]));
+    showPreview(URL.createObjectURL(files[0]));
   };
 
   const handleUpload = async () => {
@@ -96,8 +123,28 @@ export function Home() {
       setIsUploading(false);
       
       setIsProcessing(true);
-      const processedData = await processImage(response.image_id);
+      let bubbles = 0;
+      const stream = new AbortController();
+      streamRef.current = stream;
+      const processedData = await processImageStream(response.image_id, async (event: ProcessEvent) => {
+        if (event.type === 'stage') {
+          setProgress(STAGE_LABELS[event.stage]);
+        } else if (event.type === 'inpainted') {
+          // Show the cleaned page while the text is still being translated
+          const [imageType, filename] = event.image.split('/').slice(-2);
+          const { data } = await getImage(imageType, filename);
+          if (stream.signal.aborted) {
+            URL.revokeObjectURL(data);
+          } else {
+            showPreview(data);
+          }
+        } else if (event.type === 'translation') {
+          bubbles += 1;
+          setProgress(`Translated ${bubbles} bubble${bubbles === 1 ? '' : 's'}...`);
+        }
+      }, stream.signal);
       setIsProcessing(false);
+      setProgress(null);
       
       // Check if the backend provided a redirect URL, otherwise use the default editor path
       if (processedData.redirect_url) {
@@ -109,6 +156,7 @@ export function Home() {
       console.error('Error uploading/processing image:', error);
       setIsUploading(false);
       setIsProcessing(false);
+      setProgress(null);
     }
   };
 
@@ -178,7 +226,7 @@ export function Home() {
 
           {preview && (
             <Box pos="relative" mb="md" mt="md">
-              <LoadingOverlay visible={isUploading || isProcessing} />
+              <LoadingOverlay visible={isUploading || (isProcessing && !progress)} />
               <Box 
                 ref={previewContainerRef}
                 className="image-viewer dark:bg-gray-800" 
@@ -235,6 +283,9 @@ export function Home() {
               }
             </Button>
           </Group>
+          {isProcessing && progress && (
+            <Text size="sm" c="dimmed" ta="center" mt="xs">{progress}</Text>
+          )}
         </Card>
       </Flex>
 
@@ -24,7 +24,7 @@ import {
   IconZoomReset,
   IconMaximize 
 } from '@tabler/icons-react';
-import { getImage, processImage } from '../services/api';
+import { getImage, getImagePreview, processImage } from '../services/api';
 
 interface Translation {
   id: number;
@@ -48,7 +48,25 @@ export function View() {
   const navigate = useNavigate();
   const [isLoading, setIsLoading] = useState(true);
   const [translatedImageUrl, setTranslatedImageUrl] = useState<string | null>(null);
+  const [isFullImage, setIsFullImage] = useState(false);
   const [isNavigating, setIsNavigating] = useState(false);
+  const imageUrlRef = useRef<string | null>(null);
+
+  // Object URLs stay allocated until revoked: free the previous image when replacing it
+  const showImage = (url: string | null) => {
+    if (imageUrlRef.current?.startsWith('blob:')) {
+      URL.revokeObjectURL(imageUrlRef.current);
+    }
+    imageUrlRef.current = url;
+    setTranslatedImageUrl(url);
+  };
+
+  // Free the image when leaving the page
+  useEffect(() => () => {
+    if (imageUrlRef.current?.startsWith('blob:')) {
+      URL.revokeObjectURL(imageUrlRef.current);
+    }
+  }, []);
   
   // Zoom functionality
   const [zoomLevel, setZoomLevel] = useState(100);
@@ -90,9 +108,16 @@ export function View() {
     if (!imageId) return;
 
     setIsLoading(true);
+    setIsFullImage(false);
+    const filename = `${imageId}_translated.png`;
     try {
-      const translatedResp = await getImage('translated', `${imageId}_translated.png`);
-      setTranslatedImageUrl(translatedResp.data);
+      // Show the small preview first, then swap in the full image once it has loaded
+      const previewResp = await getImagePreview('translated', filename);
+      showImage(previewResp.data);
+      setIsLoading(false);
+      const translatedResp = await getImage('translated', filename);
+      showImage(translatedResp.data);
+      setIsFullImage(true);
     } catch (error) {
       console.error('Error fetching translated image:', error);
     } finally {
@@ -163,7 +188,7 @@ export function View() {
   }, [isFullscreen]);
 
   const handleDownload = () => {
-    if (!translatedImageUrl) return;
+    if (!translatedImageUrl || !isFullImage) return;
     
     const link = document.createElement('a');
     link.href = translatedImageUrl;
@@ -218,7 +243,7 @@ export function View() {
             <Button 
               leftSection={<IconDownload size={16} />}
               onClick={handleDownload}
-              disabled={!translatedImageUrl || isNavigating}
+              disabled={!translatedImageUrl || !isFullImage || isNavigating}
               color="indigo"
             >
               Download Translated Image
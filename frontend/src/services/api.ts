@@ -27,6 +27,107 @@ export const processImage = async (imageId: string) => {
   return response.data;
 };
 
+export const processImageAsync = async (imageId: string) => {
+  const response = await api.post(`/process/${imageId}`, null, { params: { async: 1 } });
+  return response.data;
+};
+
+export interface Translation {
+  id: number;
+  original_text: string;
+  translated_text: string;
+  bbox: [number, number, number, number];
+}
+
+// Response of POST /process/<id> (and the 'done' event of the stream)
+export interface ProcessResult {
+  message: string;
+  original_image: string;
+  inpainted_image: string;
+  text_only_image: string;
+  boxed_image: string;
+  translated_image: string;
+  translations: Translation[];
+  redirect_url: string;
+}
+
+export type ProcessEvent =
+  | { type: 'queued'; queued: number }
+  | { type: 'stage'; stage: 'segment' | 'detect' | 'translate' | 'typeset' }
+  | { type: 'text_only' | 'inpainted'; image: string }
+  | { type: 'ocr'; id: number; original_text: string; bbox: [number, number, number, number] }
+  | { type: 'translation'; id: number; original_text: string; translated_text: string; bbox: [number, number, number, number] };
+
+const PROCESS_EVENTS = ['queued', 'stage', 'text_only', 'inpainted', 'ocr', 'translation'] as const;
+const JOB_POLL_INTERVAL = 1000;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Queue the image and poll its job until it is done. Unlike EventSource, axios
+// keeps the HTTP status, so a missing image or a full queue reports the server's error.
+const processImagePolling = async (imageId: string, signal?: AbortSignal): Promise<ProcessResult> => {
+  try {
+    const queued = await processImageAsync(imageId);
+    if (!queued.job_id) {
+      return queued;  // already processed
+    }
+    for (;;) {
+      signal?.throwIfAborted();
+      const job = await getJob(queued.job_id);
+      if (job.status === 'done' || job.status === 'failed') {
+        return await getJobResult(queued.job_id);
+      }
+      await sleep(JOB_POLL_INTERVAL);
+    }
+  } catch (error) {
+    if (axios.isAxiosError(error) && error.response?.data?.error) {
+      throw new Error(error.response.data.error);
+    }
+    throw error;
+  }
+};
+
+// Process an image while receiving its intermediate results (server-sent events).
+// Resolves with the same data as processImage once the page is done. If the stream
+// can't be opened or drops, the page is finished through the job API instead.
+export const processImageStream = (imageId: string, onEvent: (event: ProcessEvent) => void, signal?: AbortSignal) =>
+  new Promise<ProcessResult>((resolve, reject) => {
+    const source = new EventSource(`${API_URL}/process/${imageId}/events`);
+    signal?.addEventListener('abort', () => {
+      source.close();
+      reject(signal.reason);
+    });
+    PROCESS_EVENTS.forEach((type) => {
+      source.addEventListener(type, (e) => {
+        onEvent({ type, ...JSON.parse((e as MessageEvent).data) });
+      });
+    });
+    source.addEventListener('done', (e) => {
+      source.close();
+      resolve(JSON.parse((e as MessageEvent).data));
+    });
+    source.addEventListener('error', (e) => {
+      source.close();
+      // Our own 'error' events carry a message; connection failures don't
+      const data = (e as MessageEvent).data;
+      if (data) {
+        reject(new Error(JSON.parse(data).error));
+      } else if (!signal?.aborted) {
+        processImagePolling(imageId, signal).then(resolve, reject);
+      }
+    });
+  });
+
+export const getJob = async (jobId: string) => {
+  const response = await api.get(`/jobs/${jobId}`);
+  return response.data;
+};
+
+export const getJobResult = async (jobId: string) => {
+  const response = await api.get(`/jobs/${jobId}/result`);
+  return response.data;
+};
+
 export const updateTranslations = async (imageId: string, translations: Array<{id: number, translated_text: string}>) => {
   const response = await api.patch(`/translations/${imageId}`, { translations });
   return response.data;
@@ -34,8 +135,9 @@ export const updateTranslations = async (imageId: string, translations: Array<{i
 
 export const getImage = async (imageType: string, filename: string) => {
   try {
-    const response = await api.get(`/images/${imageType}/${filename}`);
-    return response.data;
+    // Fetch the raw image so the browser can cache it (ETag / Cache-Control)
+    const response = await api.get(`/images/${imageType}/${filename}`, { responseType: 'blob' });
+    return { data: URL.createObjectURL(response.data) };
   } catch (error) {
     console.error(`Error fetching image (${imageType}/${filename}):`, error);
     // Return a placeholder data URL for failed images
@@ -43,4 +145,19 @@ export const getImage = async (imageType: string, filename: string) => {
   }
 };
 
+export const getImagePreview = async (imageType: string, filename: string, size: 'thumb' | 'preview' = 'preview') => {
+  try {
+    const response = await api.get(`/derivatives/${imageType}/${filename}`, { params: { size }, responseType: 'blob' });
+    return { data: URL.createObjectURL(response.data) };
+  } catch (error) {
+    console.error(`Error fetching preview (${imageType}/${filename}):`, error);
+    return { data: 'https://placehold.co/600x400?text=Image+Not+Found' };
+  }
+};
+
+export const deleteImage = async (imageId: string) => {
+  const response = await api.delete(`/images/${imageId}`);
+  return response.data;
+};
+
 export default api; 
\ No newline at end of file